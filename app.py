@@ -4,59 +4,35 @@ import pandas as pd
 from datetime import timedelta, datetime
 import secrets
 import os
-from database import get_stock_db_connection, get_orders_db_connection
-from strategies.min_increase import get_min_increase_stocks
-from strategies.bullish_reversal import get_bullish_reversal_stocks
-from strategies.double_bottom import get_double_bottom_stocks
+from database import get_stock_db_connection, get_orders_db_connection, get_stock_db_stats, \
+    start_stock_db_fetch, STOCK_DB_FETCH
+import orders_db
+import stock_browser
+import stock_search
+import portfolio
+import strategy_cache
+import strategy_jobs
+from strategy_cache import cached_strategy, get_strategy_cache_stats
+from strategies.registry import ALL_STRATEGIES, get_strategies, get_strategy, run_strategies, matches_by_stock
+from strategies.panel import get_panel_stats
 
 # ... (Previous imports remain)
 
 # ... (Previous code remains)
 
 def init_db():
-    conn = get_orders_db_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            # Check if Postgres or SQLite
-            is_postgres = 'psycopg2' in str(type(conn))
-            
-            if is_postgres:
-                # Postgres Syntax
-                cur.execute('''
-                    CREATE TABLE IF NOT EXISTS orders (
-                        id SERIAL PRIMARY KEY,
-                        username TEXT,
-                        sc_code TEXT,
-                        sc_name TEXT,
-                        quantity INTEGER,
-                        order_date TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-            else:
-                # SQLite Syntax
-                cur.execute('''
-                    CREATE TABLE IF NOT EXISTS orders (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT,
-                        sc_code TEXT,
-                        sc_name TEXT,
-                        quantity INTEGER,
-                        order_date TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-            conn.commit()
-            cur.close()
-        except Exception as e:
-            print(f"Error initializing DB: {e}")
-        finally:
-            conn.close()
+    try:
+        orders_db.init_orders_table()
+    except Exception as e:
+        print(f"Error initializing DB: {e}")
 
 # Initialize DB on startup (create table if needed)
 init_db()
 
+# Bring the stock DB up to date in the background; requests wait only if there is none yet
+if STOCK_DB_FETCH:
+    start_stock_db_fetch()
+
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here_change_in_production' # For development
 app.permanent_session_lifetime = timedelta(minutes=5)
@@ -119,155 +95,131 @@ def index():
     sc_name_filter = request.args.get('sc_name', '').strip()
     sc_group_filter = request.args.get('sc_group', '').strip()
     date_filter = request.args.get('date', '').strip()
-    
-    # Pagination
+    date_to_filter = request.args.get('date_to', '').strip()
+
+    # Pagination: keyset cursors from the Previous/Next links, page for display
     page = request.args.get('page', 1, type=int)
-    per_page = 18
-    
+    after = request.args.get('after')
+    before = request.args.get('before')
+
     conn = get_stock_db_connection()
     if not conn:
         return "Database Error", 500
 
+    filters = stock_browser.StockFilters(sc_code_filter, sc_name_filter, sc_group_filter, date_filter, date_to_filter)
     try:
-        # Build SQL Query
-        where_clauses = ["1=1"]
-        params = []
-        
-        if sc_code_filter:
-            where_clauses.append("CAST(SC_CODE AS TEXT) LIKE ?")
-            params.append(f"%{sc_code_filter}%")
-        
-        if sc_name_filter:
-            where_clauses.append("SC_NAME LIKE ?")
-            params.append(f"%{sc_name_filter}%")
-            
-        if sc_group_filter:
-            groups = [g.strip() for g in sc_group_filter.split(',') if g.strip()]
-            if groups:
-                placeholders = ','.join(['?'] * len(groups))
-                where_clauses.append(f"UPPER(SC_GROUP) IN ({placeholders})")
-                params.extend([g.upper() for g in groups])
-                
-        if date_filter:
-             # Assuming Date is stored as 'YYYY-MM-DD ...' string or similar. 
-             # We use DATE() function to normalize.
-             where_clauses.append("DATE(Date) = ?")
-             params.append(date_filter)
-
-        where_sql = " AND ".join(where_clauses)
-        
-        # Get Total Count
-        count_sql = f"SELECT COUNT(*) FROM stocks WHERE {where_sql}"
-        cursor = conn.cursor()
-        cursor.execute(count_sql, params)
-        total_records = cursor.fetchone()[0]
-        
-        total_pages = (total_records + per_page - 1) // per_page
-        page = max(1, min(page, total_pages)) if total_pages > 0 else 1
-        
-        start_idx = (page - 1) * per_page
-        
-        # Get Data
-        data_sql = f"SELECT * FROM stocks WHERE {where_sql} LIMIT ? OFFSET ?"
-        # We need to create a new params list for the data query because it has extra args
-        data_params = params + [per_page, start_idx]
-        
-        cursor.execute(data_sql, data_params)
-        rows = cursor.fetchall()
-        
-        # Convert to list of dicts
-        data = [dict(row) for row in rows]
-        
-        # We also need columns for the header. If no data, we might need to fetch schema
-        if rows:
-            columns = rows[0].keys()
-        else:
-            # Fallback to get columns if empty result
-            cursor.execute("SELECT * FROM stocks LIMIT 0")
-            columns = [description[0] for description in cursor.description]
-
+        result = stock_browser.fetch_page(conn, filters, after=after, before=before, page=page)
     except Exception as e:
         print(f"Error querying database: {e}")
-        data = []
-        columns = []
-        total_records = 0
-        total_pages = 0
+        result = {"data": [], "columns": [], "page": 1, "total_records": 0, "total_pages": 0,
+                  "approximate": False, "has_prev": False, "has_next": False,
+                  "first_cursor": None, "last_cursor": None}
     finally:
         conn.close()
 
-    return render_template('index.html', 
-                         data=data, 
-                         columns=columns,
+    return render_template('index.html',
                          sc_code=sc_code_filter,
                          sc_name=sc_name_filter,
                          sc_group=sc_group_filter,
                          date=date_filter,
-                         page=page,
-                         total_pages=total_pages,
-                         total_records=total_records)
+                         date_to=date_to_filter,
+                         **result)
+
+def strategy_params(args):
+    """Params of every strategy by query arg, parsed and bounded by its schema (for the forms)."""
+    return {param.arg: param.parse(args.get(param.arg))
+            for strategy in get_strategies().values() for param in strategy.params}
+
+def strategy_run(selected_strategy, args):
+    """(run params, compute) for the selected strategy (or 'all' of them), (None, None) if unknown."""
+    if selected_strategy == ALL_STRATEGIES:
+        runs = [(strategy, strategy.parse_params(args)) for strategy in get_strategies().values()]
+        run_params = {f"{strategy.name}.{name}": value for strategy, params in runs for name, value in params.items()}
+        return run_params, lambda: matches_by_stock(run_strategies(runs))
+    strategy = get_strategy(selected_strategy)
+    if strategy is None:
+        return None, None
+    run_params = strategy.parse_params(args)
+    return run_params, lambda: strategy.run(run_params)
 
 @app.route('/strategies', methods=['GET', 'POST'])
 @login_required
 def strategies():
     selected_strategy = request.args.get('strategy')
     strategy_results = []
-    
-    # Default parameters for strategies
-    params = {
-        'days': 5, # for min_increase
-        'min_days': 10,
-        'max_days': 60,
-        'tolerance': 3.0,
-        'lookback': 90,
-        'prominence': 5.0
-    }
-    
-    # Update params from request
-    for key in params:
-        if request.args.get(key):
+    job = None
+    params = strategy_params(request.args)
+
+    # Results are cached per data version of the stock DB (strategy_cache). A run
+    # that is not cached yet goes to a background job; the page polls it and reloads.
+    # A failed run is shown as such until it is retried (retry=1).
+    run_params, compute = strategy_run(selected_strategy, request.args)
+    if compute:
+        cached = strategy_cache.lookup(selected_strategy, run_params)
+        if cached is not None:
+            strategy_results = cached
+        elif strategy_jobs.STRATEGY_JOBS and request.args.get('sync') != '1':
             try:
-                params[key] = float(request.args.get(key)) if '.' in request.args.get(key) else int(request.args.get(key))
-            except ValueError:
-                pass
-
-    if selected_strategy == 'min_increase':
-        strategy_results = get_min_increase_stocks(params['days'])
-    elif selected_strategy == 'bullish_reversal':
-         strategy_results = get_bullish_reversal_stocks()
-    elif selected_strategy == 'double_bottom':
-        strategy_results = get_double_bottom_stocks(
-            min_days=params['min_days'], 
-            max_days=params['max_days'], 
-            tolerance_pct=params['tolerance'], 
-            lookback_days=params['lookback'], 
-            peak_prominence_pct=params['prominence']
-        )
+                job = strategy_jobs.submit(selected_strategy, run_params, compute,
+                                           retry=request.args.get('retry') == '1')
+            except strategy_jobs.JobQueueFull:
+                flash("The screeners are busy, please try again in a moment.", "error")
+            if job is not None and job.state == strategy_jobs.DONE:
+                strategy_results = job.result
+                job = None
+        else:
+            strategy_results = cached_strategy(selected_strategy, run_params, compute)
+
+    screeners = get_strategies()
+    # Run-all view: stocks found per strategy
+    match_counts = {name: sum(name in stock['Matches'] for stock in strategy_results) for name in screeners} \
+        if selected_strategy == ALL_STRATEGIES else {}
 
     return render_template('strategies.html', 
                          strategy=selected_strategy, 
                          results=strategy_results,
-                         params=params)
+                         params=params,
+                         screeners=screeners,
+                         match_counts=match_counts,
+                         job=job.to_dict() if job else None,
+                         retry_url=url_for('strategies', **dict(request.args.to_dict(), retry='1')))
+
+@app.route('/api/strategy_jobs')
+@login_required
+def submit_strategy_job():
+    """
+    Submits the strategy run of the query string (same args as /strategies), or
+    returns the job already running it. Polled by the strategies page. A failed
+    run is returned as such; retry=1 submits it again.
+    """
+    selected_strategy = request.args.get('strategy')
+    run_params, compute = strategy_run(selected_strategy, request.args)
+    if not compute:
+        return {"error": f"Unknown strategy: {selected_strategy}"}, 404
+    # Finished by any worker: the result is in the (shared) cache
+    cached = strategy_cache.lookup(selected_strategy, run_params)
+    if cached is not None:
+        return jsonify({"strategy": selected_strategy, "params": run_params, "state": strategy_jobs.DONE,
+                        "cached": True, "result_count": len(cached)})
+    try:
+        job = strategy_jobs.submit(selected_strategy, run_params, compute,
+                                   retry=request.args.get('retry') == '1')
+    except strategy_jobs.JobQueueFull as e:
+        return {"error": str(e)}, 429
+    return jsonify(job.to_dict())
+
+@app.route('/api/strategy_jobs/<job_id>')
+@login_required
+def strategy_job_status(job_id):
+    job = strategy_jobs.get_job(job_id)
+    if job is None:
+        return {"error": "Unknown job (finished jobs are kept for a while, per worker)"}, 404
+    return jsonify(job.to_dict(with_result=request.args.get('result') == '1'))
 
 @app.route('/paper_trading', methods=['GET', 'POST'])
 @login_required
 def paper_trading():
-    conn_orders = get_orders_db_connection()
-    if not conn_orders:
-        flash("Orders Database Error", "error")
-        return redirect(url_for('index'))
-    
-    # Check if Postgres or SQLite for parameter placeholder style
-    # generic psycopg2 uses %s, sqlite3 uses ?
-    # But wait, pandas read_sql uses params tuple.
-    # Standard cursor.execute matches driver.
-    # Psycopg2: %s
-    # PySQLite: ?
-    # This is a bit annoying. 
-    # BUT, if I use an ORM later it's better. For now, I need to detect dialet.
-    
-    is_postgres = 'psycopg2' in str(type(conn_orders))
-    param_style = '%s' if is_postgres else '?'
-
+    # Orders go through the pooled orders_db layer (Postgres or SQLite, same queries)
     if request.method == 'POST':
         sc_code = request.form['sc_code'].strip()
         # sc_name = request.form['sc_name'].strip() # Optional, maybe fetch from DB based on code
@@ -292,10 +244,10 @@ def paper_trading():
                   if conn_stock:
                       try:
                           stock_cur = conn_stock.cursor()
-                          stock_cur.execute("SELECT SC_NAME FROM stocks WHERE CAST(SC_CODE AS TEXT) = ? LIMIT 1", (sc_code,))
+                          stock_cur.execute("SELECT name FROM securities WHERE code = ?", (sc_code,))
                           row = stock_cur.fetchone()
                           if row:
-                              real_sc_name = row['SC_NAME']
+                              real_sc_name = row['name']
                       except Exception as e:
                           print(f"Error checking stock: {e}")
                       finally:
@@ -303,21 +255,7 @@ def paper_trading():
                   
                   if real_sc_name:
                       try:
-                          cur = conn_orders.cursor()
-                          
-                          if is_postgres:
-                              cur.execute(
-                                  'INSERT INTO orders (username, sc_code, sc_name, quantity, order_date) VALUES (%s, %s, %s, %s, %s)',
-                                  (current_user.id, sc_code, real_sc_name, quantity, order_date)
-                              )
-                          else:
-                              cur.execute(
-                                  'INSERT INTO orders (username, sc_code, sc_name, quantity, order_date) VALUES (?, ?, ?, ?, ?)',
-                                  (current_user.id, sc_code, real_sc_name, quantity, order_date)
-                              )
-                              
-                          conn_orders.commit()
-                          cur.close()
+                          orders_db.add_order(current_user.id, sc_code, real_sc_name, quantity, order_date)
                           flash("Order placed successfully!", "success")
                       except Exception as e:
                           print(f"Error placing order: {e}")
@@ -329,219 +267,104 @@ def paper_trading():
     # Fetch user's orders
     orders = []
     try:
-        cur = conn_orders.cursor()
-        
-        if is_postgres:
-             cur.execute('SELECT * FROM orders WHERE username = %s ORDER BY created_at DESC', (current_user.id,))
-        else:
-             cur.execute('SELECT * FROM orders WHERE username = ? ORDER BY created_at DESC', (current_user.id,))
-             
-        orders = cur.fetchall()
-        cur.close()
+        orders = orders_db.list_orders(current_user.id)
     except Exception as e:
         print(f"Error fetching orders: {e}")
-    finally:
-        conn_orders.close()
+        flash("Orders Database Error", "error")
 
-    # Calculate Portfolio Summary
-    total_invested = 0.0
-    total_current_value = 0.0
-    
+    # Calculate Portfolio Summary (all orders valued in one batch)
+    summary = dict.fromkeys(portfolio.SUMMARY_KEYS, 0.0)
     stock_conn = get_stock_db_connection()
     if orders and stock_conn:
         try:
+            valuations, summary = portfolio.value_orders(stock_conn, orders)
             for order in orders:
-                try:
-                    # Optimized: Could fetch all needed stocks in one go, but this is fine for now
-                    # We need the price on order_date and current price
-                    # Query the main 'stocks' table for the specific SCRIP CODE
-                    # usage of "SCRIP CODE" (quoted) to handle space in column name
-                    query = 'SELECT Close, Date FROM stocks WHERE "SCRIP CODE" = ? ORDER BY Date ASC'
-                    stock_data = stock_conn.execute(query, (order['sc_code'],)).fetchall()
-                    
-
-                    if stock_data:
-                        # Find Purchase Price
-                        purchase_price = 0.0
-                        order_date_str = order['order_date']
-                        
-                        # Find first date >= order_date
-                        # Since list is sorted by date ASC, we can iterate
-                        for row in stock_data:
-                            if row['Date'] >= order_date_str:
-                                purchase_price = float(row['Close'])
-                                break
-                        
-                        # If date is in future relative to data, use last available?
-                        # Or if we didn't find any date >= order_date (unlikely if order validated)
-                        if purchase_price == 0.0 and stock_data:
-                             # Fallback to last close if order date is very recent/future
-                             purchase_price = float(stock_data[-1]['Close'])
-
-                        current_price = float(stock_data[-1]['Close'])
-                        
-                        total_invested += purchase_price * order['quantity']
-                        total_current_value += current_price * order['quantity']
-                
-                except Exception as e:
-                    print(f"Error calculating stats for order {order['id']}: {e}")
+                order['valuation'] = valuations.get(order['id'])
         except Exception as e:
-             print(f"Error in portfolio calc: {e}")
+            print(f"Error in portfolio calc: {e}")
         finally:
             stock_conn.close()
     elif stock_conn:
         stock_conn.close()
 
-    total_pl = total_current_value - total_invested
-    total_pl_pct = (total_pl / total_invested * 100) if total_invested > 0 else 0.0
-
     return render_template('paper_trading.html', 
                            orders=orders,
-                           summary={
-                               'total_invested': total_invested,
-                               'total_current_value': total_current_value,
-                               'total_pl': total_pl,
-                               'total_pl_pct': total_pl_pct
-                           })
+                           summary=summary)
 
 @app.route('/delete_order/<int:order_id>', methods=['POST'])
 @login_required
 def delete_order(order_id):
-    conn = get_orders_db_connection()
-    if not conn:
-        flash("Orders Database Error", "error")
-        return redirect(url_for('paper_trading'))
-    
-    is_postgres = 'psycopg2' in str(type(conn))
-    
     try:
-        # Verify order belongs to user
-        cur = conn.cursor()
-        
-        if is_postgres:
-             cur.execute("SELECT id FROM orders WHERE id = %s AND username = %s", (order_id, current_user.id))
-        else:
-             cur.execute("SELECT id FROM orders WHERE id = ? AND username = ?", (order_id, current_user.id))
-             
-        if cur.fetchone():
-            if is_postgres:
-                cur.execute("DELETE FROM orders WHERE id = %s", (order_id,))
-            else:
-                cur.execute("DELETE FROM orders WHERE id = ?", (order_id,))
-                
-            conn.commit()
+        # Only deletes the order if it belongs to the user
+        if orders_db.delete_order(order_id, current_user.id):
             flash("Order deleted successfully.", "success")
         else:
             flash("Order not found or unauthorized.", "error")
-        cur.close()
     except Exception as e:
         print(f"Error deleting order: {e}")
         flash("Failed to delete order.", "error")
-    finally:
-        conn.close()
         
     return redirect(url_for('paper_trading'))
 
 @app.route('/order_chart_data/<int:order_id>')
 @login_required
 def order_chart_data(order_id):
-    conn_orders = get_orders_db_connection()
-    if not conn_orders:
-        return {"error": "Orders Database error"}, 500
-        
     data = {"dates": [], "values": []}
-    
-    is_postgres = 'psycopg2' in str(type(conn_orders))
-    
     try:
-        cur_orders = conn_orders.cursor()
-        if is_postgres:
-            cur_orders.execute('SELECT * FROM orders WHERE id = %s AND username = %s', (order_id, current_user.id))
-        else:
-            cur_orders.execute('SELECT * FROM orders WHERE id = ? AND username = ?', (order_id, current_user.id))
-            
-        order = cur_orders.fetchone()
-        cur_orders.close()
-        
+        order = orders_db.get_order(order_id, current_user.id)
         if order:
-            sc_code = order['sc_code']
-            order_date = order['order_date']
-            quantity = order['quantity']
-            
-            # Fetch stock data from stock DB
             conn_stock = get_stock_db_connection()
             if conn_stock:
                 try:
-                    # Log debug info
-                    with open("app_debug.log", "a") as f:
-                        f.write(f"Chart Request: OrderID={order_id}, SC_CODE={sc_code}, Date={order_date}\n")
-    
-                    # Fetch stock data from order_date to present
-                    # Use "SCRIP CODE" as per DB schema
-                    query = """
-                        SELECT Date, "CLOSE" 
-                        FROM stocks 
-                        WHERE "SCRIP CODE" = ? AND Date >= ? 
-                        ORDER BY Date ASC
-                    """
-                    # Stock DB is always SQLite, use ?
-                    cursor_stock = conn_stock.cursor()
-                    rows = cursor_stock.execute(query, (sc_code, order_date)).fetchall()
-                    
-                    with open("app_debug.log", "a") as f:
-                        f.write(f"Rows found: {len(rows)}\n")
-    
-                    for row in rows:
-                        data["dates"].append(row['Date'])
-                        # Ensure Close is float
-                        try:
-                            close_val = float(row['CLOSE'])
-                        except:
-                            close_val = 0.0
-                        data["values"].append(close_val * quantity)
-                    
-                    # Calculate Stats
-                    if data["values"]:
-                        # database returns rows sorted by Date ASC
-                        # Purchase Price is the price on order_date (first record found)
-                        # But wait, data["values"] is (Price * Qty). Use the raw price for stats or the total value?
-                        # User asked for "purchase price, current price". Usually per unit.
-                        # But the chart shows "Investment Value".
-                        # Let's return both per unit prices for clarity.
-                        
-                        try:
-                             # Calculate per-unit prices first for % change
-                             unit_purchase_price = float(rows[0]['CLOSE'])
-                             unit_current_price = float(rows[-1]['CLOSE'])
-                             
-                             pct_change = ((unit_current_price - unit_purchase_price) / unit_purchase_price) * 100 if unit_purchase_price != 0 else 0
-                             
-                             data["stats"] = {
-                                 "purchase_price": unit_purchase_price * quantity,
-                                 "current_price": unit_current_price * quantity,
-                                 "pct_change": round(pct_change, 2),
-                                 "profit_loss": (unit_current_price - unit_purchase_price) * quantity
-                             }
-                        except Exception as e:
-                            print(f"Error calculating stats: {e}")
-                            data["stats"] = None
-
-                except Exception as e:
-                     print(f"Error fetching stock data: {e}")
+                    chart = portfolio.order_series(conn_stock, [order])
                 finally:
                     conn_stock.close()
-                
+                if chart["series"]:
+                    series = chart["series"][0]
+                    data["dates"] = chart["dates"]
+                    data["values"] = [v if v is not None else 0.0 for v in series["values"]]
+                    if series["stats"]:
+                        data["stats"] = series["stats"]
     except Exception as e:
-        error_msg = f"Error fetching chart data: {e}"
-        print(error_msg)
-        with open("app_debug.log", "a") as f:
-            f.write(error_msg + "\n")
+        print(f"Error fetching chart data: {e}")
         return {"error": str(e)}, 500
-    finally:
-        conn_orders.close()
-        
+
     return data
 
+@app.route('/api/order_chart_series')
+@login_required
+def order_chart_series():
+    """
+    Value series of the user's orders (or of ?ids=1,2,...) on a shared date
+    axis, optionally downsampled to about ?points=N dates.
+    """
+    try:
+        ids = {int(i) for i in request.args.get('ids', '').split(',') if i.strip()}
+        points = request.args.get('points', type=int)
+    except ValueError:
+        return {"error": "ids must be order ids"}, 400
+    if points is not None:
+        points = max(3, min(points, portfolio.MAX_POINTS))
+
+    try:
+        orders = orders_db.list_orders(current_user.id)
+        if ids:
+            orders = [order for order in orders if order['id'] in ids]
+        chart = {"dates": [], "series": [], "total_points": 0, "downsampled": False}
+        conn_stock = get_stock_db_connection()
+        if orders and conn_stock:
+            try:
+                chart = portfolio.order_series(conn_stock, orders, points)
+            finally:
+                conn_stock.close()
+        elif conn_stock:
+            conn_stock.close()
+    except Exception as e:
+        print(f"Error fetching chart series: {e}")
+        return {"error": str(e)}, 500
+
+    return jsonify(chart)
+
 @app.route('/api/search_stocks')
 @login_required
 def search_stocks():
@@ -554,18 +377,23 @@ def search_stocks():
         return jsonify([])
         
     try:
-        # Search for stock names containing the query string
-        # Limit results to 10
-        sql = 'SELECT DISTINCT "SC NAME", "SCRIP CODE" FROM stocks WHERE "SC NAME" LIKE ? LIMIT 10'
-        cursor = conn.execute(sql, ('%' + query_str + '%',))
-        results = [{'sc_name': row['SC NAME'], 'sc_code': row['SCRIP CODE']} for row in cursor.fetchall()]
-        return jsonify(results)
+        # Ranked code / name prefix and substring matches from this worker's index
+        return jsonify(stock_search.search_stocks(conn, query_str, limit=10))
     except Exception as e:
         print(f"Error searching stocks: {e}")
         return jsonify([])
     finally:
         conn.close()
 
+@app.route('/api/db_stats')
+@login_required
+def db_stats():
+    # Per-worker connection counters (stock DB: opened should stay at one per thread)
+    return jsonify({"stock_db": get_stock_db_stats(), "orders_pool": orders_db.get_orders_pool_stats(),
+                    "strategy_cache": get_strategy_cache_stats(),
+                    "strategy_jobs": strategy_jobs.get_strategy_job_stats(),
+                    "market_panel": get_panel_stats()})
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -1,31 +1,217 @@
 import os
+import json
+import argparse
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
 import daily_update
+import pipeline_metrics
 
-def run_backfill(start_date, end_date):
-    # Ensure directory setup
-    daily_update.setup_directories()
-    
+# Backfill engine:
+#   1. Fetch - BSE and Samco files for every pending date are downloaded (or
+#      taken from the raw file cache) and parsed concurrently on a bounded
+#      thread pool sharing one pooled requests.Session. Each finished date is
+#      checkpointed as soon as its raw files are archived to disk.
+#   2. Merge - all fetched days are written to the history store and the
+#      derived exports in one batch at the end, then the retention window is
+#      applied and the stock DB snapshot published, as after process_date.
+# An interrupted run resumes from the checkpoint: already fetched dates are
+# re-parsed from the files on disk instead of being downloaded again.
+
+CHECKPOINT_FILENAME = "backfill_checkpoint.json"
+DEFAULT_WORKERS = 4
+
+
+def trading_days(start_date, end_date):
+    """Weekdays between start_date and end_date (inclusive)."""
+    days = []
     current = start_date
     while current <= end_date:
         # Skip weekends (Saturday=5, Sunday=6)
         if current.weekday() < 5:
-            print(f"--- Running update for {current.strftime('%Y-%m-%d')} ---")
-            try:
-                daily_update.process_date(current)
-            except Exception as e:
-                print(f"Error processing {current}: {e}")
-        else:
-            print(f"Skipping weekend: {current.strftime('%Y-%m-%d')}")
-        
+            days.append(current)
         current += datetime.timedelta(days=1)
+    return days
 
-if __name__ == "__main__":
-    start = datetime.datetime(2026, 2, 4) # Nov 3rd, 2025
-    end = datetime.datetime(2026, 2, 11)    # Feb 3rd, 2026
-    
-    # We are appending to existing data (which has Feb 4+), so DO NOT delete existing files.
-    # The updated daily_update.py sorting logic will handle the ordering.
-    
+
+def _checkpoint_path():
+    return os.path.join(daily_update.STOCK_DATA_DIR, CHECKPOINT_FILENAME)
+
+
+def load_checkpoint():
+    path = _checkpoint_path()
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error reading backfill checkpoint, starting over: {e}")
+    return {"fetched": {}, "unavailable": []}
+
+
+def save_checkpoint(checkpoint):
+    path = _checkpoint_path()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint():
+    path = _checkpoint_path()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def fetch_date(current, session, cache, force=False, stats=None):
+    """
+    Downloads (or reuses the cached raw files for) and parses one trading day.
+    Downloads are parsed in memory and archived to disk in the background.
+    Returns (files, day_df, archived); files is None if either source had no
+    data, archived is True once its raw files are on disk. Raises
+    daily_update.SourceFetchError if a source could not be reached.
+    """
+    files, day_df = daily_update.fetch_day_frame(current, session=session, cache=cache, force=force, stats=stats)
+    if files is None:
+        return files, day_df, False
+    # Waits for this day's archive writes only, in the worker
+    paths = [os.path.join(daily_update.STOCK_DATA_DIR, files["bse"])] + list(files["samco"])
+    return files, day_df, daily_update.wait_for_archived(paths)
+
+
+def run_backfill(start_date, end_date, workers=DEFAULT_WORKERS, resume=True, force=False,
+                 retry_unavailable=False, sqlite_mode='upsert', exports=daily_update.DEFAULT_EXPORTS,
+                 retention_days=daily_update.RETENTION_DAYS):
+    # Ensure directory setup
+    daily_update.setup_directories()
+
+    with pipeline_metrics.run("backfill", report_dir=daily_update.STOCK_DATA_DIR,
+                              start=start_date.strftime("%Y-%m-%d"), end=end_date.strftime("%Y-%m-%d"),
+                              workers=workers) as info:
+        return _run_backfill(info, start_date, end_date, workers, resume, force, retry_unavailable,
+                             sqlite_mode, exports, retention_days)
+
+
+def _run_backfill(info, start_date, end_date, workers, resume, force, retry_unavailable,
+                  sqlite_mode, exports, retention_days):
+    store = daily_update.get_history_store()
+    daily_update.bootstrap_history_store(store)
+    stored = set(store.dates())
+    cache = daily_update.get_raw_cache()
+
+    checkpoint = load_checkpoint() if resume else {"fetched": {}, "unavailable": []}
+    if not resume:
+        clear_checkpoint()
+    unavailable = set() if retry_unavailable else set(checkpoint["unavailable"])
+
+    frames = {}
+    stats = {}
+    pending = []
+    for current in trading_days(start_date, end_date):
+        key = current.strftime("%Y-%m-%d")
+        if key in stored and not force:
+            continue
+        if key in unavailable:
+            print(f"Skipping {key}: no data at source in a previous run")
+            continue
+        files = checkpoint["fetched"].get(key)
+        if files:
+            # Fetched by an interrupted run, re-parse from disk
+            stats[key] = {}
+            day_df = daily_update.read_day_frame(files["bse"], files["samco"], current, stats=stats[key])
+            if day_df is not None:
+                frames[key] = day_df
+                continue
+        pending.append(current)
+
+    print(f"Backfill: {len(frames)} day(s) resumed from checkpoint, {len(pending)} day(s) to fetch "
+          f"with {workers} worker(s)")
+
+    lock = threading.Lock()
+    session = daily_update.make_http_session(pool_size=workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for current in pending:
+                day_stats = stats.setdefault(current.strftime("%Y-%m-%d"), {})
+                futures[pool.submit(fetch_date, current, session, cache, force, day_stats)] = current
+            for future in as_completed(futures):
+                key = futures[future].strftime("%Y-%m-%d")
+                try:
+                    files, day_df, archived = future.result()
+                except Exception as e:
+                    # Not checkpointed: the date is fetched again on the next run
+                    print(f"Error processing {key}, left pending: {e}")
+                    continue
+                with lock:
+                    if files is None:
+                        # The source answered that it has no file for the date
+                        print(f"--- {key}: no data available ---")
+                        checkpoint["unavailable"] = sorted(set(checkpoint["unavailable"]) | {key})
+                    else:
+                        print(f"--- {key}: fetched {len(day_df)} rows ---")
+                        frames[key] = day_df
+                        # The checkpoint only points at raw files already on disk
+                        if archived:
+                            checkpoint["fetched"][key] = files
+                    save_checkpoint(checkpoint)
+    finally:
+        session.close()
+        daily_update.wait_for_archives()
+
+    if not frames:
+        print("Backfill: nothing new to merge.")
+        info["status"] = "no data"
+        return 0
+
+    # One batch write for all fetched days
+    print(f"Backfill: merging {len(frames)} day(s) into the history store...")
+    with pipeline_metrics.stage("history_write", rows_in=sum(len(f) for f in frames.values())) as st:
+        store.write_days(frames)
+        st["rows_out"] = store.row_count()
+    day_df = pd.concat([frames[key] for key in sorted(frames)], ignore_index=True)
+    daily_update.write_exports(store, exports, day_df=day_df, sqlite_mode=sqlite_mode)
+    for key in frames:
+        cache.mark_ingested(datetime.datetime.strptime(key, "%Y-%m-%d"), stats.get(key, {}),
+                            daily_update.MERGE_VERSION)
+
+    # Everything fetched is now persisted; only keep the dates known to be empty
+    checkpoint["fetched"] = {}
+    save_checkpoint(checkpoint)
+    print(f"Backfill complete: {len(frames)} day(s), {len(day_df)} rows.")
+    info["days"], info["rows"] = len(frames), len(day_df)
+
+    daily_update.enforce_retention(retention_days, exports=exports)
+    # Compressed full snapshot for the app instances (the deltas are already written)
+    daily_update.publish_stock_snapshot()
+    return len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill stock data for a range of dates.")
+    parser.add_argument("--start", type=str, default="2026-02-04", help="Start date YYYY-MM-DD")
+    parser.add_argument("--end", type=str, default="2026-02-11", help="End date YYYY-MM-DD (inclusive)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent download workers")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore the checkpoint of an interrupted run")
+    parser.add_argument("--force", action="store_true", help="Re-fetch dates already in the history store")
+    parser.add_argument("--retry-unavailable", action="store_true",
+                        help="Retry dates that had no data at the source in a previous run")
+    parser.add_argument("--keep-days", type=int, default=daily_update.RETENTION_DAYS,
+                        help="Rolling retention window in trading days applied after the merge, 0 disables")
+    args = parser.parse_args()
+
+    start = datetime.datetime.strptime(args.start, "%Y-%m-%d")
+    end = datetime.datetime.strptime(args.end, "%Y-%m-%d")
+
+    # We are appending to existing data, so DO NOT delete existing files.
+    # The history store keeps one partition per date, so ordering is handled there.
     print(f"Starting backfill from {start.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')}")
-    run_backfill(start, end)
+    run_backfill(start, end, workers=max(1, args.workers), resume=not args.no_resume,
+                 force=args.force, retry_unavailable=args.retry_unavailable, retention_days=args.keep_days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import contextlib
+
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+import daily_update
+import pipeline_metrics
+from synthetic_bhavcopy import SyntheticBhavcopy, trading_days_ending, DEFAULT_SECURITIES
+
+# Offline ingestion benchmark on synthetic bhavcopies. For each history size D:
+#   full_ingest - D days parsed from generated files and loaded into an empty
+#                 history store + exports, in batches like backfill_history
+#   append      - one more day through merge_and_accumulate (the nightly path)
+#   prune       - prune_data(1) on the D+1 day history
+# Nothing is downloaded; every size runs in its own temporary StockData dir.
+
+DEFAULT_SIZES = (60, 250, 1000)
+END_DATE = datetime.datetime(2026, 2, 13)
+BATCH_DAYS = 50
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _stage_totals(work_dir):
+    with open(os.path.join(work_dir, pipeline_metrics.REPORT_FILENAME)) as f:
+        report = json.load(f)
+    return {name: entry["wall_s"] for name, entry in report["totals"].items()}
+
+
+def full_ingest(generator, dates, exports):
+    """Loads dates into an empty store; mirrors the batch merge of backfill_history."""
+    store = daily_update.get_history_store()
+    db_path = os.path.join(daily_update.STOCK_DATA_DIR, daily_update.DB_FILENAME)
+    generate_s = 0.0
+    for i in range(0, len(dates), BATCH_DAYS):
+        frames = {}
+        for current in dates[i:i + BATCH_DAYS]:
+            start = time.perf_counter()
+            _, bse_bytes, _, samco_bytes = generator.day_files(current)
+            generate_s += time.perf_counter() - start
+            frames[current.strftime("%Y-%m-%d")] = daily_update.parse_day_frame(
+                io.BytesIO(bse_bytes), io.BytesIO(samco_bytes), current)
+        with pipeline_metrics.stage("history_write", rows_in=sum(len(f) for f in frames.values())):
+            store.write_days(frames)
+        if 'sqlite' in exports:
+            batch_df = pd.concat([frames[key] for key in sorted(frames)], ignore_index=True)
+            with pipeline_metrics.stage("sqlite_upsert", rows_in=len(batch_df)) as st:
+                st["rows_out"] = daily_update.upsert_stock_rows(batch_df, db_path)
+    file_exports = tuple(e for e in exports if e in ('csv', 'pkl'))
+    if file_exports:
+        daily_update.write_exports(store, file_exports)
+    return generate_s
+
+
+def bench_size(days, securities, exports, seed=42, keep=False):
+    work_dir = tempfile.mkdtemp(prefix=f"bench_ingest_{days}_")
+    daily_update.STOCK_DATA_DIR = work_dir
+    generator = SyntheticBhavcopy(securities, seed=seed)
+    dates = trading_days_ending(END_DATE, days + 1)
+    history_dates, append_date = dates[:-1], dates[-1]
+    result = {"days": days, "securities": securities, "exports": list(exports)}
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with pipeline_metrics.run("bench_full_ingest", report_dir=work_dir, days=days):
+                start = time.perf_counter()
+                generate_s = full_ingest(generator, history_dates, exports)
+                elapsed = time.perf_counter() - start - generate_s
+        result["full_ingest_s"] = round(elapsed, 3)
+        result["full_ingest_ms_per_day"] = round(elapsed * 1000 / days, 1)
+        result["full_ingest_stages"] = _stage_totals(work_dir)
+        result["rows"] = daily_update.get_history_store().row_count()
+
+        bse_name, samco_path = generator.write_day(append_date, work_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            daily_update.merge_and_accumulate(bse_name, [samco_path], append_date, exports=exports)
+            result["append_s"] = round(time.perf_counter() - start, 3)
+        result["append_stages"] = _stage_totals(work_dir)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            daily_update.prune_data(1, exports=exports)
+            result["prune_s"] = round(time.perf_counter() - start, 3)
+        result["prune_stages"] = _stage_totals(work_dir)
+
+        result["history_mb"] = round(_dir_size(os.path.join(work_dir, daily_update.HISTORY_DIRNAME)) / 1e6, 1)
+        db_path = os.path.join(work_dir, daily_update.DB_FILENAME)
+        result["db_mb"] = round(os.path.getsize(db_path) / 1e6, 1) if os.path.exists(db_path) else None
+        result["peak_rss_mb"] = pipeline_metrics.peak_rss_mb()
+    finally:
+        if keep:
+            print(f"Kept work dir: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+def print_table(results):
+    print(f"\n{'days':>6} {'rows':>9} {'ingest s':>9} {'ms/day':>8} {'append s':>9} {'prune s':>8} "
+          f"{'hist MB':>8} {'db MB':>7} {'RSS MB':>7}")
+    for r in results:
+        print(f"{r['days']:>6} {r['rows']:>9} {r['full_ingest_s']:>9.2f} {r['full_ingest_ms_per_day']:>8.1f} "
+              f"{r['append_s']:>9.3f} {r['prune_s']:>8.3f} {r['history_mb']:>8.1f} "
+              f"{r['db_mb'] if r['db_mb'] is not None else '-':>7} {r['peak_rss_mb']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion benchmark on synthetic bhavcopies.")
+    parser.add_argument("--sizes", type=str, default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated history sizes in trading days (default: 60,250,1000)")
+    parser.add_argument("--securities", type=int, default=DEFAULT_SECURITIES, help="Securities per day")
+    parser.add_argument("--exports", type=str, default=','.join(daily_update.DEFAULT_EXPORTS),
+                        help="Comma-separated exports to maintain: sqlite,csv,pkl (default: sqlite)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=str, help="Also write the results as JSON to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary StockData dirs")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    exports = tuple(e.strip() for e in args.exports.split(',') if e.strip())
+    unknown = [e for e in exports if e not in daily_update.EXPORT_CHOICES]
+    if unknown:
+        parser.error(f"Unknown export(s): {unknown}")
+
+    results = []
+    for days in sizes:
+        print(f"Benchmarking {days} days x {args.securities} securities (exports: {','.join(exports)})...",
+              flush=True)
+        results.append(bench_size(days, args.securities, exports, seed=args.seed, keep=args.keep))
+        r = results[-1]
+        print(f"  full ingest {r['full_ingest_s']:.2f}s, append {r['append_s']:.3f}s, prune {r['prune_s']:.3f}s",
+              flush=True)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"run": datetime.datetime.now().isoformat(timespec="seconds"), "results": results}, f, indent=1)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import datetime
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+import stock_schema
+import portfolio
+from synthetic_bhavcopy import trading_days_ending
+
+# Benchmark of the paper trading portfolio valuation: the old per-order loop
+# (one full-history query per order) against portfolio.value_orders, for 10,
+# 100 and 1000 orders on a synthetic stock DB. Also checks both give the same totals.
+
+DEFAULT_ORDER_COUNTS = (10, 100, 1000)
+END_DATE = datetime.datetime(2026, 2, 13)
+
+
+def build_db(path, securities, days, seed=42):
+    rng = np.random.default_rng(seed)
+    codes = np.sort(rng.choice(np.arange(500001, 545000), size=securities, replace=False))
+    dates = [stock_schema.date_key(d) for d in trading_days_ending(END_DATE, days)]
+    conn = sqlite3.connect(path)
+    stock_schema.ensure_schema(conn)
+    conn.executemany("INSERT INTO securities (code, name, sc_group, last_date) VALUES (?, ?, 'A', ?)",
+                     [(int(c), f"SEC{c}", dates[-1]) for c in codes])
+    closes = np.round(np.exp(rng.normal(5.0, 1.0, size=securities))[:, None]
+                      * np.cumprod(1 + rng.normal(0, 0.02, size=(securities, days)), axis=1), 2)
+    for j, date in enumerate(dates):
+        conn.executemany("INSERT INTO daily_bars (code, date, close) VALUES (?, ?, ?)",
+                         zip(codes.tolist(), [date] * securities, closes[:, j].tolist()))
+    conn.commit()
+    conn.row_factory = sqlite3.Row
+    return conn, codes, dates
+
+
+def make_orders(codes, dates, count, seed=7):
+    rng = np.random.default_rng(seed)
+    orders = []
+    for i in range(count):
+        # Mostly past trading days, some weekends and a few dates after the last bar
+        day = datetime.datetime.strptime(str(rng.choice(dates)), "%Y%m%d")
+        day += datetime.timedelta(days=int(rng.choice([0, 0, 0, 1, 2, 30])))
+        orders.append({'id': i + 1, 'sc_code': str(int(rng.choice(codes))),
+                       'order_date': day.strftime("%Y-%m-%d"), 'quantity': int(rng.integers(1, 500))})
+    return orders
+
+
+def legacy_value_orders(conn, orders):
+    """The per-order loop paper_trading used before portfolio.value_orders."""
+    total_invested = 0.0
+    total_current_value = 0.0
+    for order in orders:
+        query = f'SELECT close AS Close, {stock_schema.date_text_sql("date")} AS Date FROM daily_bars WHERE code = ? ORDER BY date ASC'
+        stock_data = conn.execute(query, (order['sc_code'],)).fetchall()
+        if stock_data:
+            purchase_price = 0.0
+            for row in stock_data:
+                if row['Date'] >= order['order_date']:
+                    purchase_price = float(row['Close'])
+                    break
+            if purchase_price == 0.0 and stock_data:
+                purchase_price = float(stock_data[-1]['Close'])
+            current_price = float(stock_data[-1]['Close'])
+            total_invested += purchase_price * order['quantity']
+            total_current_value += current_price * order['quantity']
+    return total_invested, total_current_value
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Portfolio valuation benchmark on a synthetic stock DB.")
+    parser.add_argument("--orders", type=str, default=','.join(str(n) for n in DEFAULT_ORDER_COUNTS),
+                        help="Comma-separated order counts (default: 10,100,1000)")
+    parser.add_argument("--securities", type=int, default=4800)
+    parser.add_argument("--days", type=int, default=250, help="Trading days of history")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_portfolio_")
+    try:
+        start = time.perf_counter()
+        conn, codes, dates = build_db(os.path.join(work_dir, "stock_data.db"), args.securities, args.days)
+        print(f"Built {args.securities} securities x {args.days} days in {time.perf_counter() - start:.1f}s")
+
+        print(f"\n{'orders':>7} {'per-order ms':>13} {'batched ms':>11} {'speedup':>8}  totals match")
+        for count in [int(n) for n in args.orders.split(',') if n.strip()]:
+            orders = make_orders(codes, dates, count)
+            legacy_s, (invested, current) = best_of(lambda: legacy_value_orders(conn, orders), args.repeat)
+            batched_s, (_, summary) = best_of(lambda: portfolio.value_orders(conn, orders), args.repeat)
+            match = abs(summary['total_invested'] - invested) < 1e-6 * max(1.0, invested) and \
+                abs(summary['total_current_value'] - current) < 1e-6 * max(1.0, current)
+            print(f"{count:>7} {legacy_s * 1000:>13.1f} {batched_s * 1000:>11.1f} {legacy_s / batched_s:>7.1f}x  "
+                  f"{'yes' if match else 'NO'}")
+        conn.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
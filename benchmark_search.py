@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import statistics
+
+sys.path.append(os.getcwd())
+
+import stock_schema
+import stock_search
+from synthetic_bhavcopy import SyntheticBhavcopy, DEFAULT_SECURITIES
+
+# Micro-benchmark of the autocomplete: the LIKE query on securities against the
+# in-memory stock_search index, on synthetic securities (or --db, a real
+# stock_data.db). Reports the mean / p99 lookup time per query in microseconds.
+
+DEFAULT_QUERIES = ['IN', 'IND', 'INDIA', 'POW', 'STEEL LTD', 'CAP', 'TECH', 'PHARMA IN',
+                   'SYN0012', 'ZZZ', '50', '5001', '500325', 'LTD']
+
+
+def synthetic_db(n_securities, seed=42):
+    generator = SyntheticBhavcopy(n_securities, seed=seed)
+    conn = sqlite3.connect(":memory:")
+    stock_schema.ensure_schema(conn)
+    conn.executemany("INSERT INTO securities (code, name, sc_group) VALUES (?, ?, ?)",
+                     zip(generator.codes.tolist(), generator.names.tolist(), generator.groups.tolist()))
+    return conn
+
+
+def like_search(conn, query):
+    sql = 'SELECT name, code FROM securities WHERE name LIKE ? ORDER BY name LIMIT 10'
+    return conn.execute(sql, ('%' + query + '%',)).fetchall()
+
+
+def time_us(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autocomplete lookup micro-benchmark.")
+    parser.add_argument("--db", type=str, help="Use the securities of this stock_data.db")
+    parser.add_argument("--securities", type=int, default=DEFAULT_SECURITIES)
+    parser.add_argument("--repeat", type=int, default=500, help="Lookups per query")
+    parser.add_argument("--queries", type=str, help="Comma-separated queries")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db) if args.db else synthetic_db(args.securities)
+    queries = args.queries.split(',') if args.queries else DEFAULT_QUERIES
+
+    start = time.perf_counter()
+    index = stock_search.load_search_index(conn)
+    print(f"Index build: {len(index)} securities in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print(f"\n{'query':<12} {'LIKE us':>9} {'p99':>9} {'index us':>9} {'p99':>9} {'hits':>5}  top match")
+    like_means, index_means = [], []
+    for query in queries:
+        like_mean, like_p99 = time_us(lambda: like_search(conn, query), args.repeat)
+        index_mean, index_p99 = time_us(lambda: index.search(query), args.repeat)
+        like_means.append(like_mean)
+        index_means.append(index_mean)
+        results = index.search(query)
+        top = f"{results[0]['sc_code']} {results[0]['sc_name']}" if results else '-'
+        print(f"{query:<12} {like_mean:>9.1f} {like_p99:>9.1f} {index_mean:>9.1f} {index_p99:>9.1f} "
+              f"{len(results):>5}  {top}")
+    print(f"\nMean over queries: LIKE {statistics.mean(like_means):.1f} us, index {statistics.mean(index_means):.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import sqlite3
+import argparse
+import datetime
+import tempfile
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+import database
+import daily_update
+import stock_schema
+from stock_schema import STOCKS_FROM, date_text_sql
+from strategies import panel as market_panel
+from strategies import double_bottom
+from strategies.panel import get_panel
+from strategies.min_increase import get_min_increase_stocks
+from strategies.bullish_reversal import get_bullish_reversal_stocks
+from strategies.double_bottom import get_double_bottom_stocks
+from synthetic_bhavcopy import trading_days_ending
+
+# Benchmark of the strategies on a synthetic stock DB (or one built from the
+# bundled StockData bhavcopies with --stock-data): the pre-panel screeners (SQL
+# read + per-security pandas) against the whole-market array versions, with a
+# check that both give the same results. The original times include their SQL
+# read; the array versions screen the preloaded market panel, whose load time
+# is reported once.
+
+DEFAULT_MIN_INCREASE_DAYS = (5, 20, 60)
+DOUBLE_BOTTOM_PARAMS = (
+    dict(),
+    dict(min_days=5, max_days=30, lookback_days=60),
+    dict(min_days=5, max_days=100, tolerance_pct=5.0, lookback_days=120, peak_prominence_pct=2.0),
+)
+END_DATE = datetime.datetime(2026, 2, 13)
+
+
+def build_db(path, securities, days, seed=42):
+    rng = np.random.default_rng(seed)
+    codes = np.sort(rng.choice(np.arange(500001, 545000), size=securities, replace=False))
+    dates = [stock_schema.date_key(d) for d in trading_days_ending(END_DATE, days)]
+    conn = sqlite3.connect(path)
+    stock_schema.ensure_schema(conn)
+    conn.executemany("INSERT INTO securities (code, name, sc_group, last_date) VALUES (?, ?, 'A', ?)",
+                     [(int(c), f"SEC{c}", dates[-1]) for c in codes])
+
+    closes = np.round(np.exp(rng.normal(5.0, 1.0, size=securities))[:, None]
+                      * np.cumprod(1 + rng.normal(0, 0.02, size=(securities, days)), axis=1), 2)
+    volumes = np.exp(rng.normal(9.0, 1.5, size=securities))[:, None] * np.exp(rng.normal(0, 0.5, size=(securities, days)))
+    # Some securities with volume rising every day, so long windows have matches too
+    rising = rng.random(securities) < 0.01
+    volumes[rising] = np.exp(rng.normal(6.0, 1.0, size=rising.sum()))[:, None] * np.cumprod(
+        1 + rng.uniform(0.01, 0.2, size=(rising.sum(), days)), axis=1)
+    volumes = np.floor(volumes)
+    delivery = np.round(rng.uniform(5, 95, size=(securities, days)), 2)
+    # Gaps: a few missing bars and NULL closes / volumes / delivery
+    missing = rng.random((securities, days)) < 0.01
+    closes[rng.random((securities, days)) < 0.001] = np.nan
+    volumes[rng.random((securities, days)) < 0.005] = np.nan
+    delivery[rng.random((securities, days)) < 0.02] = np.nan
+
+    for j, date in enumerate(dates):
+        keep = ~missing[:, j]
+        conn.executemany("INSERT INTO daily_bars (code, date, close, volume, delivery_pct) VALUES (?, ?, ?, ?, ?)",
+                         zip(codes[keep].tolist(), [date] * int(keep.sum()),
+                             [None if v != v else v for v in closes[keep, j].tolist()],
+                             [None if v != v else int(v) for v in volumes[keep, j].tolist()],
+                             [None if v != v else v for v in delivery[keep, j].tolist()]))
+    conn.commit()
+    conn.close()
+
+
+def build_stock_data_db(path, stock_data_dir):
+    """
+    Stock DB from the bundled bhavcopies: each day's SCBSEALLDDMM.TXT (BSE,
+    with DAY'S VOLUME and DELV. PER.) and YYYYMMDD_BSE.csv (Samco) are parsed
+    and merged by daily_update.parse_day_frame, and written as ingestion does.
+    Returns (securities, days).
+    """
+    conn = sqlite3.connect(path)
+    stock_schema.ensure_schema(conn)
+    days = 0
+    for csv_path in sorted(glob.glob(os.path.join(stock_data_dir, "*_BSE.csv"))):
+        current = datetime.datetime.strptime(os.path.basename(csv_path)[:8], "%Y%m%d")
+        bse_path = os.path.join(stock_data_dir, f"SCBSEALL{current.strftime('%d%m')}.TXT")
+        if not os.path.exists(bse_path):
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            day_df = daily_update.parse_day_frame(bse_path, csv_path, current)
+        if day_df is None or day_df.empty:
+            continue
+        stock_schema.write_bars(conn, day_df)
+        days += 1
+    conn.commit()
+    securities = conn.execute("SELECT COUNT(*) FROM securities").fetchone()[0]
+    conn.close()
+    return securities, days
+
+
+# The screeners as they were before the market panel (strategies/*.py at
+# user-010): one SQL read of the recent dates, then per-security pandas
+# (groupby, sort_values, diff, rolling). Kept verbatim but for the connection
+# getter, as the reference the array versions must match.
+
+def original_min_increase(days):
+    conn = database.get_stock_db_connection()
+    if not conn:
+        return []
+
+    try:
+        # Optimization: Instead of loading all data, fetch only recent data.
+        # 1. Get the last N+1 distinct dates from the database.
+        cursor = conn.cursor()
+        date_query = "SELECT DISTINCT date FROM daily_bars ORDER BY date DESC LIMIT ?"
+        cursor.execute(date_query, (days + 1,))
+        dates = [row[0] for row in cursor.fetchall()]
+        
+        if len(dates) < days + 1:
+            conn.close()
+            return []
+            
+        # 2. Fetch data only for these dates
+        placeholders = ','.join(['?'] * len(dates))
+        query = f"SELECT b.code AS SC_CODE, s.name AS SC_NAME, {date_text_sql('b.date')} AS Date, b.volume AS \"DAY'S VOLUME\" " \
+                f"FROM {STOCKS_FROM} WHERE b.date IN ({placeholders}) ORDER BY b.code, b.date"
+        
+        df = pd.read_sql_query(query, conn, params=dates)
+        
+        # Ensure Date is datetime for sorting if pandas didn't convert
+        if 'Date' in df.columns:
+             df['Date'] = pd.to_datetime(df['Date'])
+             
+    except Exception as e:
+        print(f"Error in strategy: {e}")
+        conn.close()
+        return []
+        
+    conn.close()
+    
+    # Now continue with the Pandas logic on this smaller subset
+    # Sort by SC_CODE and Date (already sorted by SQL but good to verify)
+    df = df.sort_values(by=['SC_CODE', 'Date'])
+    
+    results = []
+    
+    # Group by SC_CODE
+    for sc_code, group in df.groupby('SC_CODE'):
+        if len(group) < days + 1:
+            continue
+        
+        # Get last n+1 records to compare n periods of increase
+        recent_data = group.tail(days + 1)
+        volumes = recent_data["DAY'S VOLUME"].tolist()
+        
+        # Check if strictly increasing
+        is_increasing = True
+        for i in range(len(volumes) - 1):
+            if volumes[i+1] <= volumes[i]:
+                is_increasing = False
+                break
+        
+        if is_increasing:
+            # Get latest SC_NAME
+            sc_name = group.iloc[-1]['SC_NAME']
+            results.append({'SC_CODE': sc_code, 'SC_NAME': sc_name, 'Volumes': volumes})
+            
+    return results
+
+
+def original_bullish_reversal():
+    conn = database.get_stock_db_connection()
+    if not conn:
+        return []
+
+    try:
+        # 1. Get last 7 distinct dates
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT date FROM daily_bars ORDER BY date DESC LIMIT 7")
+        dates = [row[0] for row in cursor.fetchall()]
+        
+        if len(dates) < 5: 
+            conn.close()
+            return []
+            
+        placeholders = ','.join(['?'] * len(dates))
+        query = f"""
+            SELECT b.code AS SC_CODE, s.name AS SC_NAME, {date_text_sql('b.date')} AS Date,
+                   b.close AS "CLOSE", b.volume AS "DAY'S VOLUME", b.delivery_pct AS "DELV. PER."
+            FROM {STOCKS_FROM}
+            WHERE b.date IN ({placeholders}) 
+            ORDER BY b.code, b.date ASC
+        """
+        
+        df = pd.read_sql_query(query, conn, params=dates)
+        
+    except Exception as e:
+        print(f"Error in bullish reversal strategy: {e}")
+        conn.close()
+        return []
+        
+    conn.close()
+
+    # Data Processing
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date'])
+    
+    # CLOSE, DAY'S VOLUME and DELV. PER. are typed at ingest (bhav_parser)
+
+    results = []
+
+    for sc_code, group in df.groupby('SC_CODE'):
+        if len(group) < 5:
+            continue
+            
+        group = group.sort_values('Date')
+        
+        # Calculate Indicators
+        group['Price_Change'] = group['CLOSE'].diff()
+        group['Vol_MA_5'] = group["DAY'S VOLUME"].rolling(window=5).mean()
+        
+        # Get Latest Record (Today)
+        today = group.iloc[-1]
+        
+        # Check Conditions
+        # 1. Price Increase Today
+        if pd.isna(today['Price_Change']) or today['Price_Change'] <= 0:
+            continue
+            
+        # 2. Period of Decline (Sum of price changes for prev 3 days)
+        # We need at least 4 records (3 prev + 1 today)
+        if len(group) < 4:
+            continue
+            
+        prev_3_days_change = group['Price_Change'].iloc[-4:-1].sum()
+        
+        if prev_3_days_change >= 0: # Must be negative (decline)
+            continue
+            
+        # 3. Volume Spike
+        if pd.isna(today['Vol_MA_5']) or today["DAY'S VOLUME"] <= today['Vol_MA_5']:
+            continue
+            
+        # 4. High Delivery
+        if pd.isna(today["DELV. PER."]) or today["DELV. PER."] <= 50:
+            continue
+            
+        results.append({
+            'SC_CODE': sc_code,
+            'SC_NAME': today['SC_NAME'],
+            'Date': today['Date'].strftime('%Y-%m-%d'),
+            'Close': today['CLOSE'],
+            'Volume': int(today["DAY'S VOLUME"]),
+            'Delv_Per': today["DELV. PER."]
+        })
+        
+    return results
+
+
+def original_double_bottom(min_days=10, max_days=60, tolerance_pct=3.0, lookback_days=90, peak_prominence_pct=5.0):
+    conn = database.get_stock_db_connection()
+    if not conn:
+        return []
+
+    try:
+        # 1. Get distinct dates for lookback period
+        cursor = conn.cursor()
+        date_query = "SELECT DISTINCT date FROM daily_bars ORDER BY date DESC LIMIT ?"
+        cursor.execute(date_query, (lookback_days,))
+        dates = [row[0] for row in cursor.fetchall()]
+        
+        if len(dates) < max_days: # Need enough history
+            conn.close()
+            return []
+            
+        placeholders = ','.join(['?'] * len(dates))
+        query = f"""
+            SELECT b.code AS SC_CODE, s.name AS SC_NAME, {date_text_sql('b.date')} AS Date, b.close AS "CLOSE"
+            FROM {STOCKS_FROM}
+            WHERE b.date IN ({placeholders}) 
+            ORDER BY b.code, b.date ASC
+        """
+        
+        df = pd.read_sql_query(query, conn, params=dates)
+        
+    except Exception as e:
+        print(f"Error in double bottom strategy: {e}")
+        conn.close()
+        return []
+        
+    conn.close()
+
+    # Data Processing
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date'])
+    
+    # CLOSE is typed at ingest (bhav_parser)
+
+    results = []
+
+    for sc_code, group in df.groupby('SC_CODE'):
+        if len(group) < max_days:
+            continue
+            
+        group = group.sort_values('Date').reset_index(drop=True)
+        closes = group['CLOSE'].values
+        dates_arr = group['Date'].values
+        
+        # Find local minima manually to avoid scipy dependency
+        # Check 3 neighbors on each side
+        minima_indices = []
+        order = 3
+        
+        for i in range(order, len(closes) - order):
+            window = closes[i-order:i+order+1]
+            if np.argmin(window) == order:
+               # Also ensuring it's not just a flat bottom sequence where the middle isn't strictly smaller
+               # But for simplicity, we accept if it is the minimum in the window
+               minima_indices.append(i)
+        
+        if len(minima_indices) < 2:
+            continue
+            
+        # Check pairs of minima
+        # Iterate backwards to find most recent pattern
+        found_pattern = False
+        for i in range(len(minima_indices) - 1, 0, -1):
+            if found_pattern: break
+            
+            idx2 = minima_indices[i]
+            
+            for j in range(i - 1, -1, -1):
+                idx1 = minima_indices[j]
+                
+                date1 = pd.Timestamp(dates_arr[idx1])
+                date2 = pd.Timestamp(dates_arr[idx2])
+                price1 = closes[idx1]
+                price2 = closes[idx2]
+                
+                # Check Time Distance
+                days_diff = (date2 - date1).days
+                if days_diff < min_days:
+                    continue # Too close
+                if days_diff > max_days:
+                    continue # Too far
+                    
+                # Check Price Tolerance
+                price_diff_pct = abs(price1 - price2) / ((price1 + price2) / 2) * 100
+                if price_diff_pct > tolerance_pct:
+                    continue
+                    
+                # Check Peak in between
+                # Slice data between the two bottoms
+                intermediate_slice = closes[idx1+1:idx2]
+                if len(intermediate_slice) == 0: continue
+                
+                peak_price = np.max(intermediate_slice)
+                min_bottom = min(price1, price2)
+                
+                # Check Peak Prominence
+                prominence = (peak_price - min_bottom) / min_bottom * 100
+                if prominence < peak_prominence_pct:
+                    continue # Not deep enough "W"
+                    
+                # Optional: Check if current price is supportive
+                # (e.g., not crashed way below bottom 2)
+                current_price = closes[-1]
+                if current_price < min_bottom * 0.95:
+                    continue # Pattern invalidated by further drop
+                
+                results.append({
+                    'SC_CODE': sc_code,
+                    'SC_NAME': group.iloc[-1]['SC_NAME'],
+                    'Bottom1_Date': pd.to_datetime(date1).strftime('%Y-%m-%d'),
+                    'Bottom1_Price': round(price1, 2),
+                    'Bottom2_Date': pd.to_datetime(date2).strftime('%Y-%m-%d'),
+                    'Bottom2_Price': round(price2, 2),
+                    'Neckline_Price': round(peak_price, 2),
+                    'Prominence_Pct': round(prominence, 2)
+                })
+                found_pattern = True
+                break
+        
+    return sorted(results, key=lambda x: x['Bottom2_Date'], reverse=True)
+
+
+def _plain(value):
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def identical(a, b):
+    """Same results and values (numpy scalars as the Python values they hold; repr, so NaN equals NaN)."""
+    return len(a) == len(b) and all(
+        x.keys() == y.keys() and all(repr(_plain(x[k])) == repr(_plain(y[k])) for k in x)
+        for x, y in zip(a, b))
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strategy benchmark on a synthetic stock DB.")
+    parser.add_argument("--stock-data", type=str, default=None,
+                        help="Build the DB from the SCBSEALL*.TXT + *_BSE.csv pairs in this dir (e.g. StockData) instead")
+    parser.add_argument("--days", type=str, default=','.join(str(n) for n in DEFAULT_MIN_INCREASE_DAYS),
+                        help="Comma-separated min_increase windows (default: 5,20,60)")
+    parser.add_argument("--securities", type=int, default=4800)
+    parser.add_argument("--history", type=int, default=120, help="Trading days of history")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes for the sharded double_bottom run (default: all cores)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_strategies_")
+    database.DB_PATH = os.path.join(work_dir, "stock_data.db")
+    try:
+        start = time.perf_counter()
+        if args.stock_data:
+            securities, days = build_stock_data_db(database.DB_PATH, args.stock_data)
+        else:
+            build_db(database.DB_PATH, args.securities, args.history)
+            securities, days = args.securities, args.history
+        print(f"Built {securities} securities x {days} days in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            panel = get_panel(args.history, ('close', 'volume', 'delivery_pct'))
+        print(f"Loaded the market panel ({len(panel)} dates) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        print(f"\nmin_increase\n{'days':>5} {'original ms':>12} {'vectorized ms':>14} {'speedup':>8} {'matches':>8}  identical")
+        for days in [int(n) for n in args.days.split(',') if n.strip()]:
+            loop_s, expected = best_of(lambda: original_min_increase(days), args.repeat)
+            vector_s, result = best_of(lambda: get_min_increase_stocks(days), args.repeat)
+            print(f"{days:>5} {loop_s * 1000:>12.1f} {vector_s * 1000:>14.2f} {loop_s / vector_s:>7.1f}x "
+                  f"{len(result):>8}  {'yes' if identical(expected, result) else 'NO'}")
+
+        print(f"\nbullish_reversal\n{'original ms':>12} {'vectorized ms':>14} {'speedup':>8} {'matches':>8}  identical")
+        loop_s, expected = best_of(original_bullish_reversal, args.repeat)
+        vector_s, result = best_of(get_bullish_reversal_stocks, args.repeat)
+        print(f"{loop_s * 1000:>12.1f} {vector_s * 1000:>14.2f} {loop_s / vector_s:>7.1f}x "
+              f"{len(result):>8}  {'yes' if identical(expected, result) else 'NO'}")
+
+        print(f"\ndouble_bottom (sharded over {args.workers} processes)\n{'original ms':>12} {'vectorized ms':>14} "
+              f"{'sharded ms':>11} {'speedup':>8} {'matches':>8}  identical  params")
+        for params in DOUBLE_BOTTOM_PARAMS:
+            loop_s, expected = best_of(lambda: original_double_bottom(**params), args.repeat)
+            vector_s, result = best_of(lambda: get_double_bottom_stocks(**params, workers=0), args.repeat)
+            # Shard whatever the size, and the first sharded run starts the pool
+            double_bottom.MIN_SHARD_SECURITIES = 1
+            sharded = get_double_bottom_stocks(**params, workers=args.workers)
+            sharded_s, sharded = best_of(
+                lambda: get_double_bottom_stocks(**params, workers=args.workers), args.repeat)
+            same = identical(expected, result) and identical(expected, sharded)
+            print(f"{loop_s * 1000:>12.1f} {vector_s * 1000:>14.2f} {sharded_s * 1000:>11.2f} "
+                  f"{loop_s / vector_s:>7.1f}x {len(result):>8}  {'yes' if same else 'NO':<9}  {params}")
+    finally:
+        market_panel.clear_panel()
+        conn = getattr(database._stock_local, "conn", None)
+        if conn is not None:
+            conn.close_for_real()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
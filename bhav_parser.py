@@ -0,0 +1,153 @@
+import pandas as pd
+
+# Typed parsers for the two daily source files:
+#   SCBSEALLDDMM.TXT  - BSE delivery data, pipe delimited, zero-padded 16 digit quantities
+#   YYYYMMDD_BSE.csv  - Samco BSE bhavcopy, comma delimited
+#
+# Every column is converted once here, with whole-column (vectorized) operations,
+# so nothing downstream needs to call pd.to_numeric again. Rows whose required
+# fields do not parse are dropped from the result and returned separately.
+
+# column -> (kind, required)
+# kinds: 'int' -> int64, 'float' -> float64, 'date' -> datetime64 (DDMMYYYY), 'str' -> stripped text
+BSE_SCHEMA = {
+    'DATE': ('date', True),
+    'SCRIP CODE': ('int', True),
+    'DELIVERY QTY': ('int', True),
+    'DELIVERY VAL': ('int', True),
+    "DAY'S VOLUME": ('int', True),
+    "DAY'S TURNOVER": ('int', True),
+    'DELV. PER.': ('float', True),
+}
+
+SAMCO_SCHEMA = {
+    'SC_CODE': ('int', True),
+    'SC_NAME': ('str', True),
+    'SC_GROUP': ('str', False),
+    'SC_TYPE': ('str', False),
+    'OPEN': ('float', False),
+    'HIGH': ('float', False),
+    'LOW': ('float', False),
+    'CLOSE': ('float', True),
+    'LAST': ('float', False),
+    'PREVCLOSE': ('float', False),
+    'NO_TRADES': ('int', True),
+    'NO_OF_SHRS': ('int', True),
+    'NET_TURNOV': ('int', True),
+    'TDCLOINDI': ('str', False),
+}
+
+# Types of the merged columns that are not in either source schema
+MERGED_EXTRA_SCHEMA = {
+    'DATE_GEN': ('date', False),
+}
+
+BSE_DATE_FORMAT = '%d%m%Y'
+
+
+def _convert_column(raw, kind):
+    """
+    Converts a column of raw strings to its schema type.
+    Returns (values, bad) where bad marks non-empty values that failed to parse.
+    """
+    text = raw.astype(object).where(raw.notna(), '').astype(str).str.strip()
+    empty = text == ''
+
+    if kind == 'str':
+        return text.where(~empty, None), pd.Series(False, index=raw.index)
+
+    if kind == 'date':
+        # Integer-typed legacy values lose the leading zero of the day (1012026)
+        values = pd.to_datetime(text.str.zfill(8), format=BSE_DATE_FORMAT, errors='coerce')
+    elif kind == 'float':
+        values = pd.to_numeric(text.str.rstrip('%'), errors='coerce').astype('float64')
+    else:
+        values = pd.to_numeric(text, errors='coerce')
+
+    bad = values.isna() & ~empty
+    if kind == 'int':
+        # Whole numbers only; fractional values are a parse failure too
+        bad |= values.notna() & (values % 1 != 0)
+    return values, bad
+
+
+def apply_schema(df, schema, source="data"):
+    """
+    Converts the columns of df that appear in schema and validates them.
+    Returns (typed_df, rejected_df). rejected_df holds the original rows that
+    were dropped plus a REJECT_REASON column naming the offending fields.
+    """
+    missing = [col for col, (_, required) in schema.items() if required and col not in df.columns]
+    if missing:
+        raise ValueError(f"{source}: missing required column(s) {missing}. Columns: {list(df.columns)}")
+
+    typed = df.copy()
+    reasons = pd.Series('', index=df.index)
+
+    for col, (kind, required) in schema.items():
+        if col not in df.columns:
+            continue
+        values, bad = _convert_column(df[col], kind)
+        if required:
+            bad = bad | values.isna()
+        reasons = reasons.where(~bad, reasons + col + ';')
+        typed[col] = values
+
+    invalid = reasons != ''
+    rejected = df[invalid].copy()
+    rejected['REJECT_REASON'] = reasons[invalid].str.rstrip(';')
+
+    typed = typed[~invalid].reset_index(drop=True)
+    for col, (kind, _) in schema.items():
+        if col in typed.columns and kind == 'int':
+            typed[col] = typed[col].astype('int64')
+
+    if len(rejected):
+        print(f"{source}: rejected {len(rejected)} malformed row(s) "
+              f"(fields: {sorted(set(';'.join(rejected['REJECT_REASON']).split(';')))})")
+    return typed, rejected
+
+
+def _read_raw(source, sep):
+    # Read everything as text; the schema does the conversion in one place
+    return pd.read_csv(source, sep=sep, dtype=str, keep_default_na=False)
+
+
+def parse_bse(source):
+    """
+    Parses a SCBSEALLDDMM.TXT file (path or file-like object).
+    Returns (typed_df, rejected_df).
+    """
+    df = _read_raw(source, sep='|')
+    df.columns = [c.strip() for c in df.columns]
+    return apply_schema(df, BSE_SCHEMA, source="BSE file")
+
+
+def parse_samco(source):
+    """
+    Parses a Samco YYYYMMDD_BSE.csv bhavcopy (path or file-like object).
+    Returns (typed_df, rejected_df).
+    """
+    df = _read_raw(source, sep=',')
+    df.columns = [c.strip() for c in df.columns]
+    return apply_schema(df, SAMCO_SCHEMA, source="Samco file")
+
+
+def normalize_merged_frame(df):
+    """
+    Brings an already merged frame (e.g. the legacy CSV/PKL history) to the
+    ingest schema. Unparseable values become NaN rather than dropping rows.
+    """
+    df = df.copy()
+    schema = {}
+    schema.update(BSE_SCHEMA)
+    schema.update(SAMCO_SCHEMA)
+    schema.update(MERGED_EXTRA_SCHEMA)
+    for col, (kind, _) in schema.items():
+        if col not in df.columns or col == 'DATE':
+            continue
+        values, _ = _convert_column(df[col], kind)
+        if kind == 'int' and values.notna().all():
+            values = values.astype('int64')
+        df[col] = values
+    return df
@@ -4,55 +4,108 @@ import zipfile
 import io
 import datetime
 import os
+import sqlite3
 from bs4 import BeautifulSoup
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from history_store import HistoryStore, HISTORY_DIRNAME
+from bhav_parser import parse_bse, parse_samco, normalize_merged_frame
+from raw_cache import RawCache
+import stock_schema
+import db_snapshots
+import pipeline_metrics
 
 # Script Configuration
 STOCK_DATA_DIR = "StockData"
 PKL_FILENAME = "merged_stock_data.pkl"
+CSV_FILENAME = "merged_stock_data.csv"
+DB_FILENAME = "stock_data.db"
+
+# Source endpoints
+BSE_URL_TEMPLATE = "https://www.bseindia.com/BSEDATA/gross/{yyyy}/SCBSEALL{ddmm}.zip"
+SAMCO_URL = "https://www.samco.in/bse_nse_mcx/getBhavcopy"
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+HTTP_TIMEOUT = 60
+
+# The history store is the primary persistence layer. SQLite (read by the app),
+# CSV and PKL are derived exports; only SQLite is refreshed by default.
+EXPORT_CHOICES = ('sqlite', 'csv', 'pkl')
+DEFAULT_EXPORTS = ('sqlite',)
+
+# Bump when the parser / build_day_frame output changes: dates ingested with an
+# older version are re-parsed from the cached raw files on their next run.
+MERGE_VERSION = 1
+
+# Rolling retention window in trading days, enforced after every process_date
+# (0 disables). Override with STOCK_RETENTION_DAYS or --keep-days.
+RETENTION_DAYS = int(os.environ.get('STOCK_RETENTION_DAYS', 250))
+
+# SQLite ingestion modes (tables and the 'stocks' view are defined in stock_schema):
+#   'upsert'  - write only the new day's bars, replacing existing (code, date) bars
+#   'replace' - rewrite the whole database from the accumulated history
+SQLITE_MODES = ('upsert', 'replace')
+
+
+class SourceFetchError(Exception):
+    """A source could not be reached (timeout, connection, 5xx); unlike a 404, the date may still have data."""
+    pass
 
 
 
 def setup_directories():
     if not os.path.exists(STOCK_DATA_DIR):
         os.makedirs(STOCK_DATA_DIR)
+    os.makedirs(os.path.join(STOCK_DATA_DIR, db_snapshots.SNAPSHOT_DIRNAME), exist_ok=True)
 
-def download_bse_zip(current_date):
+def fetch_bse_bytes(current_date, session=None):
     """
-    Downloads and extracts BSE data.
+    Downloads the BSE ZIP and returns (member_name, member_bytes) for the
+    SCBSEALLDDMM.TXT inside it, read straight from the response buffer.
+    Returns (None, None) if BSE has no file for the date (404), raises
+    SourceFetchError if it could not be downloaded.
     URL Format: https://www.bseindia.com/BSEDATA/gross/YYYY/SCBSEALLDDMM.zip
     """
     yyyy = current_date.strftime("%Y")
     ddmm = current_date.strftime("%d%m")
-    url = f"https://www.bseindia.com/BSEDATA/gross/{yyyy}/SCBSEALL{ddmm}.zip"
+    url = BSE_URL_TEMPLATE.format(yyyy=yyyy, ddmm=ddmm)
+    http = session or requests
     
     print(f"Attempting to download BSE ZIP from: {url}")
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
 
     try:
-        response = requests.get(url, headers=headers)
+        response = http.get(url, headers=HTTP_HEADERS, timeout=HTTP_TIMEOUT)
+        if response.status_code == 404:
+            print("BSE has no ZIP for this date.")
+            return None, None
         response.raise_for_status()
         
         with zipfile.ZipFile(io.BytesIO(response.content)) as z:
-            z.extractall(STOCK_DATA_DIR)
-            print("BSE ZIP downloaded and extracted successfully.")
-            return f"SCBSEALL{ddmm}.TXT" # Assuming the file inside uses the same naming convention or similar
+            names = [n for n in z.namelist() if n.upper().endswith('.TXT')]
+            if not names:
+                print(f"Error: no .TXT member in BSE ZIP. Members: {z.namelist()}")
+                return None, None
+            # Prefer the expected SCBSEALLDDMM.TXT, fall back to the first text member
+            expected = _bse_file_name(current_date)
+            member = next((n for n in names if os.path.basename(n).upper() == expected.upper()), names[0])
+            print("BSE ZIP downloaded successfully.")
+            return os.path.basename(member), z.read(member)
     except requests.exceptions.RequestException as e:
-        print(f"Error downloading BSE ZIP: {e}")
-        return None
-    except zipfile.BadZipFile:
-        print("Error: The downloaded file is not a valid zip file.")
-        return None
+        raise SourceFetchError(f"Error downloading BSE ZIP: {e}") from e
+    except zipfile.BadZipFile as e:
+        raise SourceFetchError("The downloaded BSE file is not a valid zip file") from e
 
-def download_samco_bhavcopy(current_date):
+def fetch_samco_bytes(current_date, session=None):
     """
-    Downloads CSV from Samco via POST request.
+    Downloads CSV from Samco via POST request and returns a list of
+    (file_name, csv_bytes), kept in memory; empty if Samco lists no file for
+    the date. Raises SourceFetchError if Samco could not be reached.
     URL: https://www.samco.in/bse_nse_mcx/getBhavcopy
     """
-    url = "https://www.samco.in/bse_nse_mcx/getBhavcopy"
+    url = SAMCO_URL
+    http = session or requests
     date_str = current_date.strftime("%Y-%m-%d")
     
     payload = {
@@ -62,20 +115,16 @@ def download_samco_bhavcopy(current_date):
         'show_or_down': '1'
     }
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
     print(f"Requesting Samco Bhavcopy for date: {date_str}")
     
     try:
-        response = requests.post(url, data=payload, headers=headers)
+        response = http.post(url, data=payload, headers=HTTP_HEADERS, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
         soup = BeautifulSoup(response.content, 'lxml')
         links = soup.find_all('a', class_='bhavcopy-table-body-link')
         
-        downloaded_files = []
+        downloaded = []
         
         if not links:
             print("No CSV links found in Samco response.")
@@ -91,92 +140,511 @@ def download_samco_bhavcopy(current_date):
                 
                 print(f"Found CSV link: {href}, downloading as {file_name}")
                 
-                csv_response = requests.get(href, headers=headers)
+                csv_response = http.get(href, headers=HTTP_HEADERS, timeout=HTTP_TIMEOUT)
                 csv_response.raise_for_status()
-                
-                file_path = os.path.join(STOCK_DATA_DIR, file_name)
-                with open(file_path, 'wb') as f:
-                    f.write(csv_response.content)
-                
-                downloaded_files.append(file_path)
-                print(f"Downloaded: {file_path}")
+                downloaded.append((file_name, csv_response.content))
         
-        return downloaded_files
+        return downloaded
 
     except requests.exceptions.RequestException as e:
-        print(f"Error communicating with Samco: {e}")
-        return []
+        raise SourceFetchError(f"Error communicating with Samco: {e}") from e
 
-def merge_and_accumulate(bse_file_name, samco_files, current_date):
-    if not bse_file_name:
-        print("BSE file missing, skipping merge.")
-        return
+def _write_raw_file(data_dir, file_name, data):
+    file_path = os.path.join(data_dir, file_name)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+    return file_path
 
-    bse_path = os.path.join(STOCK_DATA_DIR, bse_file_name)
-    if not os.path.exists(bse_path):
-        # Fallback: check if the extracted file has a generic name or slightly different case
-        # For now, assuming exact match or we search dir
-        # The user prompt says "SCBSEALLDDMM.TXT" is the first file name format implies inside zip it matches
-        print(f"Expected BSE file not found: {bse_path}")
+def download_bse_zip(current_date, session=None):
+    """
+    Downloads the BSE ZIP and saves its SCBSEALLDDMM.TXT into STOCK_DATA_DIR.
+    Returns the file name, or None on failure.
+    """
+    name, data = fetch_bse_bytes(current_date, session=session)
+    if name is None:
+        return None
+    _write_raw_file(STOCK_DATA_DIR, name, data)
+    return name
+
+def download_samco_bhavcopy(current_date, session=None):
+    """Downloads the Samco CSVs into STOCK_DATA_DIR and returns their paths."""
+    downloaded_files = []
+    for file_name, data in fetch_samco_bytes(current_date, session=session):
+        file_path = _write_raw_file(STOCK_DATA_DIR, file_name, data)
+        downloaded_files.append(file_path)
+        print(f"Downloaded: {file_path}")
+    return downloaded_files
+
+# Raw file archiving runs on a single background thread so the disk writes
+# stay off the download -> parse -> merge path.
+_archive_pool = None
+# Queued writes by file path, until they are done
+_archive_pending = {}
+_archive_lock = threading.Lock()
+
+def archive_raw_files(blobs):
+    """Queues (file_name, bytes) pairs to be written into STOCK_DATA_DIR in the background."""
+    global _archive_pool
+    data_dir = STOCK_DATA_DIR
+    for file_name, data in blobs:
+        path = os.path.join(data_dir, file_name)
+        with _archive_lock:
+            if _archive_pool is None:
+                _archive_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="raw-archive")
+            future = _archive_pool.submit(_write_raw_file, data_dir, file_name, data)
+            _archive_pending[path] = future
+        future.add_done_callback(lambda done, path=path: _archive_done(path, done))
+
+def _archive_done(path, future):
+    with _archive_lock:
+        if _archive_pending.get(path) is future:
+            del _archive_pending[path]
+    if future.exception() is not None:
+        print(f"Error archiving raw file: {future.exception()}")
+
+def wait_for_archived(paths):
+    """Blocks until the queued writes of paths are done. Returns True if all of them are on disk."""
+    with _archive_lock:
+        futures = [_archive_pending[path] for path in paths if path in _archive_pending]
+    for future in futures:
+        future.exception()
+    return all(os.path.exists(path) for path in paths)
+
+def wait_for_archives():
+    """Blocks until all queued raw file writes are on disk."""
+    global _archive_pool
+    with _archive_lock:
+        pool, _archive_pool = _archive_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+def make_http_session(pool_size=10):
+    """
+    Returns a requests.Session whose connection pool can serve pool_size
+    concurrent requests per host, so threads can share it.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+def get_raw_cache():
+    """Returns the manifest of raw files already downloaded into STOCK_DATA_DIR."""
+    return RawCache(STOCK_DATA_DIR)
+
+def _bse_file_name(current_date):
+    return f"SCBSEALL{current_date.strftime('%d%m')}.TXT"
+
+def _samco_file_name(current_date):
+    return f"{current_date.strftime('%Y%m%d')}_BSE.csv"
+
+def _adopt_local_files(current_date):
+    """
+    Finds raw files for current_date that were downloaded before the manifest
+    existed. SCBSEALLDDMM.TXT carries no year, so the DATE column is checked.
+    Returns (bse_file, samco_paths) or None.
+    """
+    bse_file = _bse_file_name(current_date)
+    bse_path = os.path.join(STOCK_DATA_DIR, bse_file)
+    samco_path = os.path.join(STOCK_DATA_DIR, _samco_file_name(current_date))
+    if not os.path.exists(bse_path) or not os.path.exists(samco_path):
+        return None
+    try:
+        with open(bse_path, "r") as f:
+            f.readline()
+            first_row = f.readline()
+    except Exception:
+        return None
+    if not first_row.startswith(current_date.strftime("%d%m%Y")):
+        return None
+    return bse_file, [samco_path]
+
+def cached_day_files(current_date, cache):
+    """
+    Returns (bse_file, samco_files) for current_date from the raw file cache
+    (checksums verified), or None if the files have to be downloaded.
+    """
+    cached = cache.cached_files(current_date)
+    if cached is None and cache.entry(current_date) is None:
+        # Files from before the manifest existed; recorded ones that fail the checksum are re-downloaded
+        cached = _adopt_local_files(current_date)
+        if cached is not None:
+            cache.record_files(current_date, cached[0], cached[1])
+    if cached is not None:
+        print(f"Using cached raw files for {current_date.strftime('%Y-%m-%d')}: {cached[0]}, "
+              f"{[os.path.basename(p) for p in cached[1]]}")
+    return cached
+
+def download_day_files(current_date, session=None, cache=None):
+    """
+    Downloads both raw files for current_date to disk and records them in the
+    raw file manifest. Returns (bse_file, samco_files).
+    """
+    cache = cache or get_raw_cache()
+    bse_file = download_bse_zip(current_date, session=session)
+    samco_files = download_samco_bhavcopy(current_date, session=session)
+    if bse_file and samco_files:
+        cache.record_files(current_date, bse_file, samco_files)
+    return bse_file, samco_files
+
+def get_history_store():
+    """Returns the primary date-partitioned history store under STOCK_DATA_DIR."""
+    return HistoryStore(os.path.join(STOCK_DATA_DIR, HISTORY_DIRNAME))
+
+def bootstrap_history_store(store):
+    """
+    One-off migration: seeds an empty history store from the legacy
+    merged_stock_data.csv / .pkl accumulation files if they exist.
+    """
+    if not store.is_empty():
         return
 
-    print(f"Reading BSE file: {bse_path}")
+    csv_path = os.path.join(STOCK_DATA_DIR, CSV_FILENAME)
+    pkl_path = os.path.join(STOCK_DATA_DIR, PKL_FILENAME)
+    legacy_df = None
     try:
-        # User said pipe delimited
-        df_bse = pd.read_csv(bse_path, sep='|')
+        if os.path.exists(csv_path):
+            print(f"Seeding history store from legacy CSV: {csv_path}")
+            legacy_df = pd.read_csv(csv_path)
+        elif os.path.exists(pkl_path):
+            print(f"Seeding history store from legacy PKL: {pkl_path}")
+            legacy_df = pd.read_pickle(pkl_path)
     except Exception as e:
-        print(f"Error reading BSE file: {e}")
+        print(f"Error reading legacy history, starting fresh store: {e}")
         return
 
-    # Find the matching Samco file (YYYYMMDD_BSE.csv)
-    # The prompt implies a specific naming convention or we look for 'BSE' in name
-    # "Download this csv file and name it as the corresponding anchor text value"
-    # Typically Samco BSE file anchor text is something like '05022026_BSE'
-    
-    samco_bse_file = None
-    target_samco_name_part = f"{current_date.strftime('%d%m%Y')}_BSE" # e.g. 05022026_BSE
-    # Actually user prompt says: using YYYYMMDD in one place and DDMMYYYY possibly in another example? 
-    # Prompt says: "SC_CODE' in the second file (YYYYMMDD_BSE.csv)"
-    # But usually links are DDMMYYYY_BSE.csv or similar. I'll search for *BSE.csv in downloaded files.
-    
-    for fpath in samco_files:
-        if "BSE" in os.path.basename(fpath):
-            samco_bse_file = fpath
-            break
-            
-    if not samco_bse_file:
-        print("Samco BSE CSV file not found among downloaded files.")
+    if legacy_df is None or legacy_df.empty or 'Date' not in legacy_df.columns:
         return
 
-    print(f"Reading Samco file: {samco_bse_file}")
+    # Bring legacy text/inferred columns to the same types the parser produces
+    with pipeline_metrics.stage("history_bootstrap", rows_in=len(legacy_df)) as st:
+        legacy_df = normalize_merged_frame(legacy_df)
+        legacy_df.drop_duplicates(subset=['SCRIP CODE', 'Date'], keep='last', inplace=True)
+        legacy_df.sort_values(by=['Date', 'SCRIP CODE'], inplace=True)
+        days = store.import_frame(legacy_df)
+        st["rows_out"] = store.row_count()
+    print(f"Seeded history store with {days} days ({len(legacy_df)} rows).")
+
+def write_exports(store, exports, day_df=None, sqlite_mode='upsert'):
+    """
+    Refreshes the derived exports (SQLite, CSV, PKL) from the history store.
+    In 'upsert' mode SQLite only receives day_df; every other export needs
+    the full history, which is read from the store once.
+    """
+    full_df = None
+    needs_full = 'csv' in exports or 'pkl' in exports or \
+        ('sqlite' in exports and (sqlite_mode == 'replace' or day_df is None))
+    if needs_full:
+        with pipeline_metrics.stage("history_read") as st:
+            full_df = store.read()
+            full_df.sort_values(by=['Date', 'SCRIP CODE'], inplace=True)
+            st["rows_out"] = len(full_df)
+            st["bytes_read"] = sum(p["bytes"] for p in store.manifest["partitions"].values())
+
+    if 'sqlite' in exports:
+        db_path = os.path.join(STOCK_DATA_DIR, DB_FILENAME)
+        try:
+            size_before = _source_size(db_path) or 0
+            if sqlite_mode == 'upsert' and day_df is not None:
+                print(f"Upserting new rows into SQLite: {db_path}")
+                with pipeline_metrics.stage("sqlite_upsert", rows_in=len(day_df)) as st:
+                    st["rows_out"] = upsert_stock_rows(day_df, db_path)
+                    st["bytes_written"] = (_source_size(db_path) or 0) - size_before
+            else:
+                print(f"Saving accumulated data to SQLite: {db_path}")
+                with pipeline_metrics.stage("sqlite_replace", rows_in=len(full_df)) as st:
+                    replace_stock_table(full_df, db_path)
+                    st["rows_out"], st["bytes_written"] = len(full_df), _source_size(db_path)
+            print("SQLite update successful.")
+        except Exception as e:
+            print(f"Error saving to SQLite: {e}")
+
+    if 'csv' in exports:
+        csv_path = os.path.join(STOCK_DATA_DIR, CSV_FILENAME)
+        print(f"Exporting accumulated data to CSV: {csv_path}")
+        with pipeline_metrics.stage("csv_write", rows_in=len(full_df)) as st:
+            full_df.to_csv(csv_path, index=False)
+            st["rows_out"], st["bytes_written"] = len(full_df), _source_size(csv_path)
+
+    if 'pkl' in exports:
+        pkl_path = os.path.join(STOCK_DATA_DIR, PKL_FILENAME)
+        print(f"Exporting accumulated data to PKL: {pkl_path}")
+        with pipeline_metrics.stage("pkl_write", rows_in=len(full_df)) as st:
+            full_df.to_pickle(pkl_path)
+            st["rows_out"], st["bytes_written"] = len(full_df), _source_size(pkl_path)
+
+def _open_stock_db(db_path):
+    """
+    Opens the stock DB in autocommit mode with the normalized schema in place
+    (created in a new file; an older DB goes through db_snapshots.migrate_file first).
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < stock_schema.SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stock_schema.ensure_schema(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            conn.close()
+            raise
+    return conn
+
+def _snapshot_dir(db_path):
+    """Where the published snapshots live; publishing is on once the directory exists (setup_directories)."""
+    path = os.path.join(os.path.dirname(db_path) or ".", db_snapshots.SNAPSHOT_DIRNAME)
+    return path if os.path.isdir(path) else None
+
+def write_stock_snapshot(db_path, ops, fresh=False):
+    """
+    Applies stock_schema ops to the stock DB as its next data version. The
+    ops and the version bump are one transaction written in place under WAL,
+    so the app's read-only workers see either the previous version or the
+    new one, and the cost is that of the rows the ops touch (plus a WAL
+    checkpoint of the pages they changed), not of the history.
+    fresh=True ('replace' mode) builds a new file instead and atomically
+    swaps it in; on error it is discarded. The ops are also published as a
+    delta for the app instances (see db_snapshots).
+    Assumes a single writer (the ingestion job). Returns the bars changed.
+    """
+    if fresh or not os.path.exists(db_path):
+        return _swap_in_stock_db(db_path, ops)
+
+    # A DB of an older schema is migrated on a copy swapped in first
+    db_snapshots.migrate_file(db_path)
+    conn = _open_stock_db(db_path)
     try:
-        df_samco = pd.read_csv(samco_bse_file)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = stock_schema.get_data_version(conn)
+            changed = stock_schema.apply_ops(conn, ops)
+            stock_schema.set_data_version(conn, version + 1)
+            bars_total = stock_schema.get_bars_total(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        # Back into the main file, which is what gets committed and published
+        busy = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0]
+        if busy:
+            print("Stock DB checkpoint deferred: readers still on the previous version")
+    finally:
+        conn.close()
+    print(f"Stock DB written in place: data version {version + 1}")
+
+    snapshot_dir = _snapshot_dir(db_path)
+    if snapshot_dir:
+        db_snapshots.record_delta(snapshot_dir, version, version + 1, ops, bars_total)
+    return changed
+
+def _swap_in_stock_db(db_path, ops):
+    """write_stock_snapshot into a new, empty file swapped in for db_path; breaks the delta chain."""
+    tmp_path = db_snapshots.temp_path_for(db_path)
+    try:
+        version = 0
+        if os.path.exists(db_path):
+            current = sqlite3.connect(db_path)
+            try:
+                version = stock_schema.get_data_version(current)
+            finally:
+                current.close()
+
+        conn = _open_stock_db(tmp_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            changed = stock_schema.apply_ops(conn, ops)
+            stock_schema.set_data_version(conn, version + 1)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        os.replace(tmp_path, db_path)
+        print(f"Stock DB snapshot swapped in: data version {version + 1}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    snapshot_dir = _snapshot_dir(db_path)
+    if snapshot_dir:
+        db_snapshots.reset_deltas(snapshot_dir, version + 1)
+    return changed
+
+def publish_stock_snapshot():
+    """Refreshes the compressed full snapshot of the stock DB, if publishing is on."""
+    db_path = os.path.join(STOCK_DATA_DIR, DB_FILENAME)
+    snapshot_dir = _snapshot_dir(db_path)
+    if not snapshot_dir or not os.path.exists(db_path):
+        return None
+    try:
+        with pipeline_metrics.stage("snapshot_publish", bytes_read=_source_size(db_path)) as st:
+            entry = db_snapshots.publish_snapshot(db_path, snapshot_dir)
+            st["bytes_written"] = entry["bytes"]
+        print(f"Published stock DB snapshot version {entry['version']} ({entry['bytes']} bytes)")
+        return entry
+    except Exception as e:
+        print(f"Error publishing the stock DB snapshot: {e}")
+        return None
+
+def replace_stock_table(df, db_path):
+    """Rewrites securities/daily_bars from df ('replace' mode) as a new file swapped in."""
+    write_stock_snapshot(db_path, [stock_schema.write_op(df)], fresh=True)
+
+def upsert_stock_rows(df, db_path):
+    """
+    Writes df into securities/daily_bars as the next data version (one transaction).
+    Existing bars with the same (code, date) are replaced, so re-running a
+    day replaces it. Returns the number of rows written.
+    """
+    start = time.perf_counter()
+    written = write_stock_snapshot(db_path, [stock_schema.write_op(df)])
+
+    elapsed = time.perf_counter() - start
+    print(f"SQLite upsert: wrote {written} rows in {elapsed:.2f}s")
+    return written
+
+def _pick_samco_bse(names):
+    """Returns the first Samco file name/path that is the BSE bhavcopy, or None."""
+    # Samco anchor text is the file name, e.g. YYYYMMDD_BSE
+    for name in names:
+        if "BSE" in os.path.basename(name):
+            return name
+    return None
+
+def _source_size(source):
+    """Size in bytes of a path or in-memory buffer (for the run report)."""
+    if isinstance(source, io.BytesIO):
+        return len(source.getbuffer())
+    try:
+        return os.path.getsize(source)
+    except (OSError, TypeError):
+        return None
+
+def parse_day_frame(bse_source, samco_source, current_date, stats=None):
+    """
+    Parses one trading day's BSE and Samco sources (paths or file-like
+    buffers) and merges them. Returns the day frame, or None if a source is
+    unreadable. If stats is a dict it receives the parsed and merged row counts.
+    """
+    try:
+        # Pipe delimited, typed and validated by the parser
+        with pipeline_metrics.stage("parse_bse", bytes_read=_source_size(bse_source)) as st:
+            df_bse, rejected = parse_bse(bse_source)
+            st["rows_in"], st["rows_out"] = len(df_bse) + len(rejected), len(df_bse)
+    except Exception as e:
+        print(f"Error reading BSE file: {e}")
+        return None
+
+    try:
+        with pipeline_metrics.stage("parse_samco", bytes_read=_source_size(samco_source)) as st:
+            df_samco, rejected = parse_samco(samco_source)
+            st["rows_in"], st["rows_out"] = len(df_samco) + len(rejected), len(df_samco)
     except Exception as e:
         print(f"Error reading Samco file: {e}")
-        return
+        return None
 
+    day_df = build_day_frame(df_bse, df_samco, current_date)
+    if stats is not None:
+        stats.update({'bse': len(df_bse), 'samco': len(df_samco), 'merged': len(day_df)})
+    return day_df
+
+def read_day_frame(bse_file_name, samco_files, current_date, stats=None):
+    """
+    Parses one trading day's BSE and Samco files from STOCK_DATA_DIR and
+    merges them. Returns the day frame, or None if a file is missing/unreadable.
+    """
+    if not bse_file_name:
+        print("BSE file missing, skipping merge.")
+        return None
+
+    bse_path = os.path.join(STOCK_DATA_DIR, bse_file_name)
+    if not os.path.exists(bse_path):
+        print(f"Expected BSE file not found: {bse_path}")
+        return None
+
+    samco_bse_file = _pick_samco_bse(samco_files)
+    if not samco_bse_file:
+        print("Samco BSE CSV file not found among downloaded files.")
+        return None
+
+    print(f"Reading BSE file: {bse_path}")
+    print(f"Reading Samco file: {samco_bse_file}")
+    return parse_day_frame(bse_path, samco_bse_file, current_date, stats=stats)
+
+def fetch_day_frame(current_date, session=None, cache=None, force=False, stream=True, archive=True, stats=None):
+    """
+    Gets one trading day's merged frame, from the raw file cache when possible.
+    Otherwise downloads it; with stream=True the ZIP member and the Samco CSV
+    are parsed straight from the response buffers and the raw bytes are only
+    archived to disk (in the background) when archive=True.
+    Returns (files, day_df), or (None, None) if a source has no data. Raises
+    SourceFetchError if a source could not be reached.
+    """
+    cache = cache or get_raw_cache()
+    if not force:
+        cached = cached_day_files(current_date, cache)
+        if cached is not None:
+            day_df = read_day_frame(cached[0], cached[1], current_date, stats=stats)
+            if day_df is not None:
+                return {"bse": cached[0], "samco": cached[1]}, day_df
+
+    if not stream:
+        with pipeline_metrics.stage("download") as st:
+            bse_file, samco_files = download_day_files(current_date, session=session, cache=cache)
+            st["bytes_written"] = sum(_source_size(p) or 0 for p in samco_files) + \
+                (_source_size(os.path.join(STOCK_DATA_DIR, bse_file)) or 0 if bse_file else 0)
+        if not bse_file or not samco_files:
+            return None, None
+        day_df = read_day_frame(bse_file, samco_files, current_date, stats=stats)
+        return ({"bse": bse_file, "samco": samco_files}, day_df) if day_df is not None else (None, None)
+
+    with pipeline_metrics.stage("download_bse") as st:
+        bse_name, bse_bytes = fetch_bse_bytes(current_date, session=session)
+        st["bytes_read"] = len(bse_bytes) if bse_bytes else 0
+    samco_blobs = []
+    if bse_name:
+        with pipeline_metrics.stage("download_samco") as st:
+            samco_blobs = fetch_samco_bytes(current_date, session=session)
+            st["bytes_read"] = sum(len(data) for _, data in samco_blobs)
+    samco_name = _pick_samco_bse([name for name, _ in samco_blobs])
+    if not bse_name or not samco_name:
+        print("Skipping merge due to missing download(s).")
+        return None, None
+
+    samco_bytes = dict(samco_blobs)[samco_name]
+    print(f"Parsing {bse_name} and {samco_name} from memory")
+    day_df = parse_day_frame(io.BytesIO(bse_bytes), io.BytesIO(samco_bytes), current_date, stats=stats)
+    if day_df is None:
+        return None, None
+
+    cache.record_blobs(current_date, (bse_name, bse_bytes), samco_blobs)
+    if archive:
+        archive_raw_files([(bse_name, bse_bytes)] + samco_blobs)
+    samco_paths = [os.path.join(STOCK_DATA_DIR, name) for name, _ in samco_blobs]
+    return {"bse": bse_name, "samco": samco_paths}, day_df
+
+def build_day_frame(df_bse, df_samco, current_date):
+    """
+    Merges the typed BSE and Samco frames for current_date into the
+    accumulated-history layout (one row per SCRIP CODE, sorted, with Date).
+    """
     # Columns: 
     # BSE: 'SCRIP CODE'
     # Samco: 'SC_CODE'
-    
-    # Standardize column names for merge if needed, or just specify left_on/right_on
-    if 'SCRIP CODE' not in df_bse.columns:
-        print(f"Column 'SCRIP CODE' not found in BSE file. Columns: {df_bse.columns}")
-        return
-    if 'SC_CODE' not in df_samco.columns:
-        print(f"Column 'SC_CODE' not found in Samco file. Columns: {df_samco.columns}")
-        return
+    # Both are int64 (the parsers reject files missing either column)
 
     # Merge
     print("Merging files...")
     # Using inner join to keep only matching records, or left/outer? 
     # "Now I would like to merge these 2 files into single pkl file"
     # Usually implies getting attributes from both. Inner join is safest to ensure data integrity.
-    merged_df = pd.merge(df_bse, df_samco, left_on='SCRIP CODE', right_on='SC_CODE', how='inner')
+    with pipeline_metrics.stage("merge", rows_in=len(df_bse) + len(df_samco)) as st:
+        merged_df = pd.merge(df_bse, df_samco, left_on='SCRIP CODE', right_on='SC_CODE', how='inner')
+        st["rows_out"] = len(merged_df)
     
-    # Post-merge processing
-    # Ensure SCRIP CODE is numeric for comparison
-    merged_df['SCRIP CODE'] = pd.to_numeric(merged_df['SCRIP CODE'], errors='coerce')
     filtered_df = merged_df
 
     if filtered_df.empty:
@@ -197,184 +665,185 @@ def merge_and_accumulate(bse_file_name, samco_files, current_date):
     # Add Date column for tracking over accumulation
     filtered_df['Date'] = current_date.strftime("%Y-%m-%d")
 
+    # One row per security, in SCRIP CODE order
+    with pipeline_metrics.stage("dedup", rows_in=len(filtered_df)) as st:
+        filtered_df.drop_duplicates(subset=['SCRIP CODE'], keep='last', inplace=True)
+        st["rows_out"] = len(filtered_df)
+    with pipeline_metrics.stage("sort", rows_in=len(filtered_df)) as st:
+        filtered_df.sort_values(by=['SCRIP CODE'], inplace=True)
+        filtered_df.reset_index(drop=True, inplace=True)
+        st["rows_out"] = len(filtered_df)
+
+    return filtered_df
+
+def merge_and_accumulate(bse_file_name, samco_files, current_date, sqlite_mode='upsert', exports=DEFAULT_EXPORTS,
+                         stats=None):
+    """Merges one day's files and accumulates them. Returns the day frame (None on failure)."""
+    with pipeline_metrics.run("merge_and_accumulate", report_dir=STOCK_DATA_DIR,
+                              date=current_date.strftime("%Y-%m-%d")) as info:
+        filtered_df = read_day_frame(bse_file_name, samco_files, current_date, stats=stats)
+        if filtered_df is None:
+            info["status"] = "no data"
+            return None
+        return accumulate_day_frame(filtered_df, current_date, sqlite_mode=sqlite_mode, exports=exports)
+
+def accumulate_day_frame(filtered_df, current_date, sqlite_mode='upsert', exports=DEFAULT_EXPORTS):
+    """Writes a merged day frame to the history store and refreshes the exports."""
     # Accumulate
-    # We use CSV for robust storage and easier debugging (text-based diffs in git)
-    csv_path = os.path.join(STOCK_DATA_DIR, "merged_stock_data.csv")
-    pkl_path = os.path.join(STOCK_DATA_DIR, PKL_FILENAME)
-    
-    final_df = None
+    # The date-partitioned history store is the primary persistence layer:
+    # only the new day's partition is written, the rest of the history is untouched.
+    store = get_history_store()
+    bootstrap_history_store(store)
+
+    print(f"Writing history partition for {current_date.strftime('%Y-%m-%d')} ({len(filtered_df)} rows)")
+    with pipeline_metrics.stage("history_write", rows_in=len(filtered_df)) as st:
+        store.write_day(current_date, filtered_df)
+        partition = store.manifest["partitions"][current_date.strftime("%Y-%m-%d")]
+        st["rows_out"], st["bytes_written"] = partition["rows"], partition["bytes"]
+    print(f"History store now holds {len(store.dates())} days, {store.row_count()} rows.")
+
+    write_exports(store, exports, day_df=filtered_df, sqlite_mode=sqlite_mode)
+
+    print("\n--- New Day Preview (First 5 Rows) ---")
+    print(filtered_df.head().to_string())
     
-    # Try loading from CSV first (Primary persistence)
-    if os.path.exists(csv_path):
-        print(f"Loading existing CSV: {csv_path}")
-        try:
-            existing_df = pd.read_csv(csv_path)
-            # Ensure 'SCRIP CODE' is numeric in existing data too
-            if 'SCRIP CODE' in existing_df.columns:
-                existing_df['SCRIP CODE'] = pd.to_numeric(existing_df['SCRIP CODE'], errors='coerce')
-        except Exception as e:
-            print(f"Error reading CSV, trying PKL fallback: {e}")
-            existing_df = None
-    
-    # Fallback to PKL if CSV didn't work (Migration or legacy)
-    elif os.path.exists(pkl_path):
-        print(f"Loading existing PKL (Legacy): {pkl_path}")
+    print("Process completed successfully.")
+    return filtered_df
+
+def delete_stock_dates_before(db_path, cutoff_date):
+    """
+    Deletes every bar dated before cutoff_date (YYYY-MM-DD), written in place
+    as the next data version (see write_stock_snapshot). The date-bounded
+    DELETE on idx_bars_date is proportional to the rows removed; on top of
+    it come one PK probe per security (those left without bars are dropped)
+    and the read-only COUNT of the remaining bars recorded with the delta.
+    The rest of the history is not rewritten or copied.
+    Returns the number of rows deleted.
+    """
+    if not os.path.exists(db_path):
+        return 0
+    return write_stock_snapshot(db_path, [{"op": "delete_before", "date": cutoff_date}])
+
+def _prune_before(store, cutoff_date, exports):
+    """Drops every date before cutoff_date from the store and the exports."""
+    start = time.perf_counter()
+    dates_to_remove = [d for d in store.dates() if d < cutoff_date]
+    if not dates_to_remove:
+        return 0
+    print(f"Pruning data for dates: {dates_to_remove}")
+
+    with pipeline_metrics.stage("history_drop", rows_in=store.row_count()) as st:
+        removed = store.drop_dates(dates_to_remove)
+        st["rows_out"] = store.row_count()
+    print(f"Removed {removed} rows from the history store. Remaining rows: {store.row_count()}")
+
+    if 'sqlite' in exports:
+        db_path = os.path.join(STOCK_DATA_DIR, DB_FILENAME)
         try:
-            existing_df = pd.read_pickle(pkl_path)
+            with pipeline_metrics.stage("sqlite_delete") as st:
+                deleted = delete_stock_dates_before(db_path, cutoff_date)
+                st["rows_in"] = deleted
+            print(f"Deleted {deleted} rows from SQLite: {db_path}")
         except Exception as e:
-            print(f"Error reading existing PKL: {e}")
-            existing_df = None
-    else:
-        existing_df = None
+            print(f"Error updating SQLite DB during pruning: {e}")
 
-    if existing_df is not None:
-        print("Appending new data to existing history...")
-        final_df = pd.concat([existing_df, filtered_df], ignore_index=True)
-        # Remove duplicates
-        final_df.drop_duplicates(subset=['SCRIP CODE', 'Date'], keep='last', inplace=True)
-    else:
-        print("Starting fresh accumulation file.")
-        final_df = filtered_df
+    # CSV / PKL are whole-file exports, so they can only be rewritten
+    file_exports = tuple(e for e in exports if e in ('csv', 'pkl'))
+    if file_exports:
+        write_exports(store, file_exports)
 
-    # Sort by Date and SCRIP CODE to ensure chronological order
-    final_df.sort_values(by=['Date', 'SCRIP CODE'], inplace=True)
+    print(f"Pruning took {time.perf_counter() - start:.2f}s")
+    return removed
 
-    # Save to BOTH CSV and PKL
-    print(f"Saving accumulated data to CSV: {csv_path}")
-    final_df.to_csv(csv_path, index=False)
-    
-    print(f"Saving accumulated data to PKL: {pkl_path}")
-    final_df.to_pickle(pkl_path)
-    
-    # Save to SQLite Database
-    import sqlite3
-    db_path = os.path.join(STOCK_DATA_DIR, "stock_data.db")
-    print(f"Saving accumulated data to SQLite: {db_path}")
-    try:
-        conn = sqlite3.connect(db_path)
-        # Store Date as string (YYYY-MM-DD) for SQLite compatibility
-        # Create a copy to not affect final_df if used later (though it's the end of func)
-        db_df = final_df.copy()
-        if 'Date' in db_df.columns:
-             db_df['Date'] = pd.to_datetime(db_df['Date']).dt.date
-        
-        db_df.to_sql('stocks', conn, if_exists='replace', index=False)
-        conn.close()
-        print("SQLite update successful.")
-    except Exception as e:
-        print(f"Error saving to SQLite: {e}")
-
-    print("\n--- Accumulation File Preview (First 5 Rows) ---")
-    print(final_df.head().to_string())
-    print("\n--- Accumulation File Preview (Last 5 Rows) ---")
-    print(final_df.tail().to_string())
-    
-    print("Process completed successfully.")
-
-def prune_data(days_to_remove=1):
+def prune_data(days_to_remove=1, exports=DEFAULT_EXPORTS):
     """
     Removes the oldest 'days_to_remove' dates from the accumulated data.
-    Updates CSV, PKL, and SQLite DB.
+    Drops the history store partitions and deletes the rows from SQLite.
     """
     if days_to_remove <= 0:
         return
 
-    csv_path = os.path.join(STOCK_DATA_DIR, "merged_stock_data.csv")
-    pkl_path = os.path.join(STOCK_DATA_DIR, PKL_FILENAME)
-    db_path = os.path.join(STOCK_DATA_DIR, "stock_data.db")
-    
-    df = None
-    
-    # Load existing data (Prefer CSV)
-    if os.path.exists(csv_path):
-        try:
-            df = pd.read_csv(csv_path)
-            # Ensure 'SCRIP CODE' is numeric
-            if 'SCRIP CODE' in df.columns:
-                df['SCRIP CODE'] = pd.to_numeric(df['SCRIP CODE'], errors='coerce')
-        except Exception as e:
-            print(f"Error reading CSV for pruning: {e}")
-            
-    if df is None and os.path.exists(pkl_path):
-         try:
-            df = pd.read_pickle(pkl_path)
-         except Exception as e:
-            print(f"Error reading PKL for pruning: {e}")
-            
-    if df is None or df.empty:
-        print("No data found to prune.")
-        return
+    with pipeline_metrics.run("prune", report_dir=STOCK_DATA_DIR, days=days_to_remove) as info:
+        store = get_history_store()
+        bootstrap_history_store(store)
 
-    # Handle Date column types
-    if 'Date' in df.columns:
-         # Convert to datetime for sorting
-         df['Date'] = pd.to_datetime(df['Date'])
-    elif 'DATE_GEN' in df.columns: # Determine if DATE_GEN is the date column
-         df['Date'] = pd.to_datetime(df['DATE_GEN']) # Use standard name for logic
-    else:
-        print("Date column not found, cannot prune.")
-        return
+        unique_dates = store.dates()
+        if not unique_dates:
+            print("No data found to prune.")
+            info["status"] = "no data"
+            return
 
-    # Get unique dates sorted locally
-    unique_dates = sorted(df['Date'].unique())
-    
-    if len(unique_dates) <= days_to_remove:
-        print(f"Cannot prune {days_to_remove} days. Only {len(unique_dates)} days of data exist.")
-        return
-        
-    dates_to_remove = unique_dates[:days_to_remove]
-    print(f"Pruning data for dates: {[d.strftime('%Y-%m-%d') for d in dates_to_remove]}")
-    
-    # Filter out these dates
-    original_count = len(df)
-    df_pruned = df[~df['Date'].isin(dates_to_remove)].copy()
-    new_count = len(df_pruned)
-    
-    print(f"Removed {original_count - new_count} rows. Remaining rows: {new_count}")
+        if len(unique_dates) <= days_to_remove:
+            print(f"Cannot prune {days_to_remove} days. Only {len(unique_dates)} days of data exist.")
+            info["status"] = "skipped"
+            return
 
-    # Save updates
-    # 1. CSV
-    df_pruned.to_csv(csv_path, index=False)
-    print(f"Updated CSV: {csv_path}")
-    
-    # 2. PKL
-    df_pruned.to_pickle(pkl_path)
-    print(f"Updated PKL: {pkl_path}")
-    
-    # 3. SQLite
-    import sqlite3
-    try:
-        conn = sqlite3.connect(db_path)
-        db_df = df_pruned.copy()
-        if 'Date' in db_df.columns:
-             db_df['Date'] = db_df['Date'].dt.date
-        db_df.to_sql('stocks', conn, if_exists='replace', index=False)
-        conn.close()
-        print(f"Updated SQLite DB: {db_path}")
-    except Exception as e:
-        print(f"Error updating SQLite DB during pruning: {e}")
+        _prune_before(store, unique_dates[days_to_remove], exports)
+        publish_stock_snapshot()
 
-import argparse
+def enforce_retention(keep_days, exports=DEFAULT_EXPORTS):
+    """
+    Keeps only the most recent keep_days trading days (rolling window).
+    Returns the number of rows removed from the history store.
+    """
+    if not keep_days or keep_days <= 0:
+        return 0
+
+    store = get_history_store()
+    unique_dates = store.dates()
+    if len(unique_dates) <= keep_days:
+        print(f"Retention: {len(unique_dates)} day(s) held, window is {keep_days}, nothing to prune.")
+        return 0
 
-def process_date(target_date):
-    # Prune oldest day(s) before adding new data
-    # Default is 1 day for daily run
-    print("Running pre-process pruning (maintaining 60-day window)...")
-    # prune_data(1)
+    cutoff_date = unique_dates[-keep_days]
+    print(f"Retention: keeping {keep_days} trading days (from {cutoff_date})")
+    return _prune_before(store, cutoff_date, exports)
 
+import argparse
+
+def process_date(target_date, sqlite_mode='upsert', exports=DEFAULT_EXPORTS, session=None, force=False,
+                 reparse=False, stream=True, archive=True, retention_days=RETENTION_DAYS):
+    """
+    Downloads (or reuses cached raw files for), merges and accumulates one date,
+    then applies the rolling retention window (retention_days, 0 disables).
+    Dates already ingested with the current MERGE_VERSION are skipped unless
+    force (re-download) or reparse (re-merge from the cached files) is set.
+    """
     print(f"Starting execution for date: {target_date.strftime('%Y-%m-%d')}")
-    
-    # 1. BSE
-    bse_file = download_bse_zip(target_date)
-    
-    # 2. Samco
-    samco_files = download_samco_bhavcopy(target_date)
-    
-    # 3. Merge & Process
-    if bse_file and samco_files:
-        merge_and_accumulate(bse_file, samco_files, target_date)
-    else:
-        print("Skipping merge due to missing download(s).")
+
+    with pipeline_metrics.run("process_date", report_dir=STOCK_DATA_DIR, date=target_date.strftime('%Y-%m-%d'),
+                              sqlite_mode=sqlite_mode, exports=list(exports)) as info:
+        cache = get_raw_cache()
+        if not force and not reparse and cache.is_ingested(target_date, MERGE_VERSION):
+            print(f"{target_date.strftime('%Y-%m-%d')} already ingested, skipping (use --reparse or --force to redo).")
+            info["status"] = "skipped"
+            return
+
+        # 1. BSE and 2. Samco (from the raw file cache when possible, else parsed in memory)
+        stats = {}
+        try:
+            _, day_df = fetch_day_frame(target_date, session=session, cache=cache, force=force, stream=stream,
+                                        archive=archive, stats=stats)
+        except SourceFetchError as e:
+            # Not ingested, the next run tries the date again
+            print(f"{e}; {target_date.strftime('%Y-%m-%d')} left for the next run.")
+            info["status"] = "fetch failed"
+            return
+
+        # 3. Merge & Process
+        if day_df is not None:
+            accumulate_day_frame(day_df, target_date, sqlite_mode=sqlite_mode, exports=exports)
+            cache.mark_ingested(target_date, stats, MERGE_VERSION)
+            info["rows"] = stats
+        else:
+            print("Skipping merge due to missing download(s).")
+            info["status"] = "no data"
+
+        # 4. Retention (rolling window of trading days)
+        enforce_retention(retention_days, exports=exports)
+
+        # 5. Compressed full snapshot for the app instances (the deltas are already written)
+        publish_stock_snapshot()
 
 def main():
     setup_directories()
@@ -382,11 +851,30 @@ def main():
     parser = argparse.ArgumentParser(description="Download and process stock data for a specific date.")
     parser.add_argument("--date", type=str, help="Date in YYYY-MM-DD format (default: today)")
     parser.add_argument("--prune", type=int, help="Number of oldest days to prune immediately (Manual cleanup)")
+    parser.add_argument("--sqlite-mode", choices=SQLITE_MODES, default='upsert',
+                        help="'upsert' writes only the new day's rows (default), 'replace' rewrites the whole table")
+    parser.add_argument("--exports", type=str, default=','.join(DEFAULT_EXPORTS),
+                        help="Comma-separated derived exports to refresh from the history store: sqlite,csv,pkl (default: sqlite)")
+    parser.add_argument("--force", action="store_true", help="Re-download and re-ingest even if the date is cached")
+    parser.add_argument("--reparse", action="store_true",
+                        help="Re-merge an already ingested date from the cached raw files (no download)")
+    parser.add_argument("--keep-days", type=int, default=RETENTION_DAYS,
+                        help=f"Rolling retention window in trading days, 0 disables (default: {RETENTION_DAYS})")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="Write the downloads to disk and parse them from there (legacy path)")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="Do not keep the raw downloaded files in StockData when streaming")
     args = parser.parse_args()
+
+    exports = tuple(e.strip() for e in args.exports.split(',') if e.strip())
+    unknown = [e for e in exports if e not in EXPORT_CHOICES]
+    if unknown:
+        print(f"Unknown export(s): {unknown}. Choose from {list(EXPORT_CHOICES)}.")
+        return
     
     if args.prune:
         print(f"Manual pruning requested: {args.prune} days.")
-        prune_data(args.prune)
+        prune_data(args.prune, exports=exports)
         return # Exit after manual prune if specified? Or continue? 
         # User requested: "for daily run the delete function will take the argument as 1"
         # If running manual prune, probably just want to prune.
@@ -400,7 +888,9 @@ def main():
     else:
         now = datetime.datetime.now()
     
-    process_date(now)
+    process_date(now, sqlite_mode=args.sqlite_mode, exports=exports, force=args.force, reparse=args.reparse,
+                 stream=not args.no_stream, archive=not args.no_archive, retention_days=args.keep_days)
+    wait_for_archives()
 
 if __name__ == "__main__":
     main()
@@ -1,37 +1,194 @@
 import sqlite3
 import os
-import requests
+import threading
+import urllib.request
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import stock_schema
+import db_snapshots
 
 DB_URL = "https://github.com/rahulpraj10/stock_tracker_v2/raw/main/StockData/stock_data.db"
 DB_PATH = os.path.join("StockData", "stock_data.db")
+SNAPSHOT_URL = os.environ.get('STOCK_SNAPSHOT_URL',
+                              "https://github.com/rahulpraj10/stock_tracker_v2/raw/main/StockData/snapshots")
+# Sync the stock DB with the published snapshots in the background at app startup
+STOCK_DB_FETCH = os.environ.get('STOCK_DB_FETCH', '1') == '1'
+# Seconds a request waits for that download when there is no stock DB yet
+STOCK_DB_WAIT_S = float(os.environ.get('STOCK_DB_WAIT_S', 120))
 ORDERS_DB_PATH = "orders.db"
 
+# Stock DB connection tuning (read-only, one persistent connection per thread)
+STOCK_DB_MMAP_SIZE = int(os.environ.get('STOCK_DB_MMAP_SIZE', 256 * 1024 * 1024))
+STOCK_DB_CACHE_KB = int(os.environ.get('STOCK_DB_CACHE_KB', 64 * 1024))
+# immutable=1 skips all file locking and the WAL. Only safe where the file is replaced whole
+# (app instances synced by the SnapshotFetcher), not on the ingestion host, where
+# daily_update.write_stock_snapshot writes in place under WAL.
+STOCK_DB_IMMUTABLE = os.environ.get('STOCK_DB_IMMUTABLE', '0') == '1'
+STOCK_DB_STATEMENT_CACHE = 256
+
+_stock_local = threading.local()
+_stock_lock = threading.Lock()
+_stock_generation = 0
+_stock_refused = set()
+_stock_stats = {"opened": 0, "reused": 0, "released": 0, "reloads": 0}
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+class PooledStockConnection(sqlite3.Connection):
+    """
+    Stock DB connection kept open for its thread. close() only hands it back,
+    so existing callers keep their open/close pattern; the prepared statement
+    cache survives between requests.
+    """
+
+    def close(self):
+        _count("released")
+
+    def close_for_real(self):
+        sqlite3.Connection.close(self)
+
+
+def _count(key):
+    with _stock_lock:
+        _stock_stats[key] += 1
+
+
+def start_stock_db_fetch():
+    """
+    Starts the background sync of the stock DB with the published snapshots
+    (once per process; the workers' fetchers take turns on the DB's lock file).
+    Returns the db_snapshots.SnapshotFetcher.
+    """
+    global _fetcher
+    with _fetcher_lock:
+        # A fetcher inherited through a fork has no thread in this process
+        if _fetcher is None or _fetcher.pid != os.getpid():
+            os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+            _fetcher = db_snapshots.SnapshotFetcher(SNAPSHOT_URL, DB_PATH, fallback_url=DB_URL).start()
+        return _fetcher
+
+
+def _wait_for_stock_db():
+    """
+    Requests never download the DB themselves: without one they wait for the
+    background fetch. An existing (possibly stale) DB is served right away and
+    the fetched version is picked up once it is swapped in.
+    """
+    if os.path.exists(DB_PATH):
+        return True
+    fetcher = start_stock_db_fetch()
+    if not fetcher.wait(STOCK_DB_WAIT_S):
+        print(f"Stock DB still downloading after {STOCK_DB_WAIT_S}s")
+        return False
+    return os.path.exists(DB_PATH)
+
+
+def _file_identity(path):
+    """Changes when a file is swapped in, or written in place (the WAL, then the checkpoint)."""
+    st = os.stat(path)
+    try:
+        wal = os.stat(path + "-wal")
+        wal = (wal.st_size, wal.st_mtime_ns)
+    except FileNotFoundError:
+        wal = None
+    return (st.st_ino, st.st_size, st.st_mtime_ns, wal)
+
+
+def _open_stock_connection():
+    uri = f"file:{urllib.request.pathname2url(os.path.abspath(DB_PATH))}?mode=ro"
+    if STOCK_DB_IMMUTABLE:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, factory=PooledStockConnection,
+                           cached_statements=STOCK_DB_STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA mmap_size = {STOCK_DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{STOCK_DB_CACHE_KB}")
+    conn.execute("PRAGMA query_only = 1")
+    return conn
+
+
 def get_stock_db_connection():
-    """Connects to the read-only Stock Data SQLite database."""
-    if not os.path.exists("StockData"):
-        os.makedirs("StockData")
+    """
+    Returns this thread's read-only connection to the Stock Data SQLite database,
+    opening it on first use or after the file changed / reload_stock_db().
+    A new file swapped in, or a version written in place by ingestion, changes
+    the file or its WAL, so a couple of os.stat per call are enough to notice it.
+    Callers may close() it as before; it stays open for the next request.
+    """
+    if not _wait_for_stock_db():
+        return None
 
-    # Check if DB needs to be downloaded
-    if not os.path.exists(DB_PATH):
-        print(f"Downloading database from {DB_URL}...")
-        try:
-            response = requests.get(DB_URL)
-            response.raise_for_status()
-            with open(DB_PATH, 'wb') as f:
-                f.write(response.content)
-            print("Database downloaded.")
-        except Exception as e:
-            print(f"Error downloading database: {e}")
+    identity = _file_identity(DB_PATH)
+    conn = getattr(_stock_local, "conn", None)
+    if conn is not None and (_stock_local.generation != _stock_generation or _stock_local.identity != identity):
+        conn.close_for_real()
+        conn = None
+        _count("reloads")
+
+    if conn is None:
+        conn = _open_stock_connection()
+        # After a first read (it sets up the WAL files), before reading the version
+        schema = conn.execute("PRAGMA user_version").fetchone()[0]
+        identity = _file_identity(DB_PATH)
+        if schema < stock_schema.SCHEMA_VERSION:
+            # Workers never write: migrating is for ingestion, migrate_db.py or the fetcher
+            conn.close_for_real()
+            _stock_local.conn = None
+            if identity not in _stock_refused:
+                _stock_refused.add(identity)
+                print(f"Stock DB {DB_PATH} has schema version {schema}, expected {stock_schema.SCHEMA_VERSION}: "
+                      f"not serving it until it is migrated (migrate_db.py) or replaced by the snapshot fetch")
             return None
-            
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+        _stock_local.conn = conn
+        _stock_local.generation = _stock_generation
+        _stock_local.identity = identity
+        _stock_local.data_version = stock_schema.get_data_version(conn)
+        _count("opened")
+    else:
+        _count("reused")
     return conn
 
+
+def reload_stock_db():
+    """Makes every thread reopen its stock DB connection on its next request (e.g. after a new DB was swapped in)."""
+    global _stock_generation
+    with _stock_lock:
+        _stock_generation += 1
+    conn = getattr(_stock_local, "conn", None)
+    if conn is not None:
+        conn.close_for_real()
+        _stock_local.conn = None
+        _count("reloads")
+
+
+def get_data_version():
+    """
+    Data version of the stock DB snapshot this thread currently reads
+    (increases with every ingestion). Caches can key on it. None if unavailable.
+    """
+    conn = get_stock_db_connection()
+    if conn is None:
+        return None
+    conn.close()
+    return _stock_local.data_version
+
+
+def get_stock_db_stats():
+    """Connection counters of this process (one gunicorn worker)."""
+    with _stock_lock:
+        stats = dict(_stock_stats)
+        stats["generation"] = _stock_generation
+    stats["pid"] = os.getpid()
+    stats["data_version"] = getattr(_stock_local, "data_version", None)
+    stats["fetch"] = dict(_fetcher.stats) if _fetcher is not None else None
+    return stats
+
 def get_orders_db_connection():
-    """Connects to the persistent Orders database (Postgres or SQLite)."""
+    """
+    Connects to the persistent Orders database (Postgres or SQLite).
+    Unpooled, for scripts; the app goes through orders_db.
+    """
     database_url = os.environ.get('DATABASE_URL')
     
     if database_url:
@@ -0,0 +1,484 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import urllib.request
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single app process, nothing to serialize
+    fcntl = None
+
+import stock_schema
+from raw_cache import file_sha256
+
+# Published copies of StockData/stock_data.db for the app instances:
+#
+#   StockData/snapshots/snapshot_manifest.json
+#       {
+#         "version": 124,                                   latest data version
+#         "snapshot": {"name": "stock_data.db.gz", "version": 123, "sha256", "bytes",
+#                      "db_sha256", "db_bytes"},            gzip of the whole DB
+#         "deltas": [{"name": "delta_000124.json.gz", "from_version": 123, "version": 124,
+#                     "sha256", "bytes", "bars_total"}, ...]
+#       }
+#   StockData/snapshots/stock_data.db.gz
+#   StockData/snapshots/delta_<version>.json.gz              stock_schema ops of one snapshot
+#
+# The ingestion job (daily_update) writes a delta for every data version it writes
+# and refreshes the compressed full snapshot once per run. An app instance
+# (SnapshotFetcher) a few versions behind downloads only the deltas; one without
+# a usable DB downloads the full snapshot (resumable) plus the deltas after it.
+# Every file is checked against its sha256 before it is used. The gunicorn
+# workers each start a fetcher; they take turns on {db_path}.lock, so one of
+# them downloads and swaps in the DB and the others find it current.
+
+SNAPSHOT_DIRNAME = "snapshots"
+MANIFEST_FILENAME = "snapshot_manifest.json"
+SNAPSHOT_FILENAME = "stock_data.db.gz"
+DELTA_KEEP = 30
+CHUNK_SIZE = 1 << 20
+HTTP_TIMEOUT = 60
+FETCH_ATTEMPTS = 3
+RETRY_DELAY = 2
+
+
+class SnapshotFetchError(Exception):
+    pass
+
+
+def _delta_name(version):
+    return f"delta_{version:06d}.json.gz"
+
+
+def read_manifest(snapshot_dir):
+    path = os.path.join(snapshot_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {"version": 0, "snapshot": None, "deltas": []}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_manifest(snapshot_dir, manifest):
+    path = os.path.join(snapshot_dir, MANIFEST_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _write_file(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _remove_deltas(snapshot_dir, entries):
+    for entry in entries:
+        path = os.path.join(snapshot_dir, entry["name"])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def record_delta(snapshot_dir, from_version, version, ops, bars_total):
+    """Publishes the ops that took the stock DB from from_version to version."""
+    name = _delta_name(version)
+    payload = {"from_version": from_version, "version": version, "ops": ops, "bars_total": bars_total}
+    data = gzip.compress(json.dumps(payload, separators=(',', ':')).encode("utf-8"), mtime=0)
+    _write_file(os.path.join(snapshot_dir, name), data)
+
+    manifest = read_manifest(snapshot_dir)
+    deltas = [d for d in manifest["deltas"] if d["version"] < version]
+    # A delta that does not continue the chain makes the older ones unreachable
+    if deltas and deltas[-1]["version"] != from_version:
+        _remove_deltas(snapshot_dir, deltas)
+        deltas = []
+    deltas.append({"name": name, "from_version": from_version, "version": version,
+                   "sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data), "bars_total": bars_total})
+    _remove_deltas(snapshot_dir, deltas[:-DELTA_KEEP])
+    manifest["deltas"] = deltas[-DELTA_KEEP:]
+    manifest["version"] = version
+    _write_manifest(snapshot_dir, manifest)
+    return deltas[-1]
+
+
+def reset_deltas(snapshot_dir, version):
+    """A snapshot written without a delta (full replace) breaks the chain: drops every delta."""
+    manifest = read_manifest(snapshot_dir)
+    _remove_deltas(snapshot_dir, manifest["deltas"])
+    manifest["deltas"] = []
+    manifest["version"] = version
+    _write_manifest(snapshot_dir, manifest)
+
+
+def publish_snapshot(db_path, snapshot_dir):
+    """
+    Writes the gzip of db_path as the full snapshot, unless the published one
+    already has its data version. Returns the manifest entry.
+    The DB is written in place under WAL, so what is compressed is a copy
+    taken with the backup API (consistent, whatever is still in the WAL) and
+    set back to a rollback journal: a plain self-contained file, like the
+    ones the app instances always got.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        version = stock_schema.get_data_version(conn)
+        manifest = read_manifest(snapshot_dir)
+        current = manifest.get("snapshot")
+        if current and current["version"] == version and os.path.exists(os.path.join(snapshot_dir, current["name"])):
+            return current
+
+        copy_path = temp_path_for(db_path)
+        try:
+            target = sqlite3.connect(copy_path)
+            try:
+                conn.backup(target)
+                version = stock_schema.get_data_version(target)
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+
+            path = os.path.join(snapshot_dir, SNAPSHOT_FILENAME)
+            tmp_path = path + ".tmp"
+            digest = hashlib.sha256()
+            db_bytes = 0
+            with open(copy_path, "rb") as src, open(tmp_path, "wb") as raw:
+                with gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) as dst:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                        db_bytes += len(chunk)
+                        dst.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            os.remove(copy_path)
+    finally:
+        conn.close()
+
+    manifest["snapshot"] = {"name": SNAPSHOT_FILENAME, "version": version, "sha256": file_sha256(path),
+                            "bytes": os.path.getsize(path), "db_sha256": digest.hexdigest(), "db_bytes": db_bytes}
+    manifest["version"] = max(manifest.get("version", 0), version)
+    _write_manifest(snapshot_dir, manifest)
+    return manifest["snapshot"]
+
+
+def delta_chain(manifest, from_version):
+    """The deltas leading from from_version to the latest version, [] if current, None if there is no chain."""
+    by_start = {d["from_version"]: d for d in manifest["deltas"]}
+    chain = []
+    version = from_version
+    while version < manifest["version"]:
+        entry = by_start.get(version)
+        if entry is None:
+            return None
+        chain.append(entry)
+        version = entry["version"]
+    return chain
+
+
+def temp_path_for(path):
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".next",
+                                    dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    os.chmod(tmp_path, 0o644)
+    return tmp_path
+
+
+def schema_version(db_path):
+    """PRAGMA user_version of db_path, read without writing to it."""
+    uri = f"file:{urllib.request.pathname2url(os.path.abspath(db_path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def migrate_file(db_path):
+    """
+    Brings a DB from before the securities/daily_bars schema up to date on a
+    copy that is then swapped in, so readers of db_path never see a half
+    migrated file. Only for the writers of db_path (ingestion, migrate_db.py,
+    the SnapshotFetcher); the app's workers only read. Returns True if it migrated.
+    """
+    if not os.path.exists(db_path) or schema_version(db_path) >= stock_schema.SCHEMA_VERSION:
+        return False
+    print(f"Migrating {db_path} to stock DB schema version {stock_schema.SCHEMA_VERSION}...")
+    tmp_path = temp_path_for(db_path)
+    try:
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(tmp_path, isolation_level=None)
+        try:
+            src.backup(dst)
+            dst.execute("PRAGMA journal_mode = DELETE")
+            dst.execute("BEGIN IMMEDIATE")
+            try:
+                migrated = stock_schema.ensure_schema(dst)
+                dst.execute("COMMIT")
+            except Exception:
+                dst.execute("ROLLBACK")
+                raise
+            if migrated:
+                # Give back the pages of the dropped flat table
+                dst.execute("VACUUM")
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp_path, db_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
+
+
+class SnapshotFetcher:
+    """
+    Brings db_path up to the latest published snapshot, normally in a
+    background thread (start()). wait() blocks until that first sync is over,
+    whatever its outcome. The new DB is swapped in with os.replace, so readers
+    never see a partial file.
+    """
+
+    def __init__(self, base_url, db_path, fallback_url=None, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.db_path = db_path
+        self.fallback_url = fallback_url
+        self.session = session or requests.Session()
+        self.pid = os.getpid()
+        self.ready = threading.Event()
+        self._thread = None
+        self.stats = {"state": "idle", "mode": None, "from_version": None, "version": None, "files": 0,
+                      "bytes": 0, "resumed": 0, "checksum_errors": 0, "seconds": None, "error": None}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stock-db-fetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def _run(self):
+        start = time.perf_counter()
+        self.stats["state"] = "fetching"
+        try:
+            self.sync()
+            self.stats["state"] = "ready"
+        except Exception as e:
+            self.stats["state"] = "failed"
+            self.stats["error"] = str(e)
+            print(f"Stock DB fetch failed: {e}")
+        finally:
+            self.stats["seconds"] = round(time.perf_counter() - start, 3)
+            self.ready.set()
+
+    def sync(self):
+        """
+        Updates db_path. Returns how: 'current', 'delta', 'full' or 'legacy' (plain DB download).
+        Holds an exclusive lock on {db_path}.lock meanwhile: a fetcher in another
+        process waits for it, then finds the DB current.
+        """
+        with open(self.db_path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                return self._sync()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self):
+        # The workers refuse a DB of an older schema, so it is migrated before anything else
+        try:
+            migrate_file(self.db_path)
+        except sqlite3.Error as e:
+            print(f"Could not migrate the local stock DB ({e}), fetching a new one")
+        local_version = self._local_version()
+        self.stats["from_version"] = local_version
+        try:
+            manifest = json.loads(self._get(MANIFEST_FILENAME))
+        except (requests.RequestException, ValueError) as e:
+            if local_version is not None or not self.fallback_url:
+                print(f"No snapshot manifest ({e}), keeping the local stock DB")
+                return self._done("current", local_version)
+            print(f"No snapshot manifest ({e}), downloading {self.fallback_url}")
+            self._fetch_legacy()
+            return self._done("legacy", self._local_version())
+
+        latest = manifest["version"]
+        if local_version is not None and local_version >= latest:
+            return self._done("current", local_version)
+
+        # Version 0 is a DB from before the snapshots (or a legacy one): no delta applies
+        chain = delta_chain(manifest, local_version) if local_version else None
+        if chain:
+            try:
+                self._apply_deltas(self.db_path, chain, copy=True)
+                return self._done("delta", latest)
+            except (SnapshotFetchError, requests.RequestException) as e:
+                print(f"Delta update failed ({e}), downloading the full snapshot")
+        self._fetch_full(manifest)
+        return self._done("full", self._local_version())
+
+    def _done(self, mode, version):
+        self.stats["mode"] = mode
+        self.stats["version"] = version
+        print(f"Stock DB sync: {mode}, data version {version} "
+              f"({self.stats['files']} file(s), {self.stats['bytes'] / 1e6:.1f} MB)")
+        return mode
+
+    def _local_version(self):
+        if not os.path.exists(self.db_path):
+            return None
+        try:
+            uri = f"file:{urllib.request.pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True)
+            try:
+                return stock_schema.get_data_version(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+
+    def _get(self, name, sha256=None):
+        """Small file into memory (manifest, deltas), checked against sha256 if given."""
+        response = self.session.get(f"{self.base_url}/{name}", timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        data = response.content
+        self.stats["files"] += 1
+        self.stats["bytes"] += len(data)
+        if sha256 and hashlib.sha256(data).hexdigest() != sha256:
+            self.stats["checksum_errors"] += 1
+            raise SnapshotFetchError(f"Checksum mismatch for {name}")
+        return data
+
+    def _download(self, url, part_path):
+        """
+        Streams url into part_path. A part file left by an interrupted attempt
+        (this run or an earlier one) is resumed with a Range request.
+        """
+        for attempt in range(1, FETCH_ATTEMPTS + 1):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=HTTP_TIMEOUT) as response:
+                    if response.status_code == 416:
+                        # Part file already complete
+                        break
+                    response.raise_for_status()
+                    resumed = response.status_code == 206
+                    if resumed:
+                        self.stats["resumed"] += 1
+                    with open(part_path, "ab" if resumed else "wb") as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                            self.stats["bytes"] += len(chunk)
+                break
+            except requests.RequestException as e:
+                if attempt == FETCH_ATTEMPTS:
+                    raise
+                print(f"Download of {url} interrupted ({e}), resuming (attempt {attempt + 1})")
+                time.sleep(RETRY_DELAY * attempt)
+        self.stats["files"] += 1
+
+    def _fetch_full(self, manifest):
+        snapshot = manifest.get("snapshot")
+        if not snapshot:
+            raise SnapshotFetchError("No full snapshot published")
+        part_path = f"{self.db_path}.{snapshot['sha256'][:12]}.gz.part"
+        self._download(f"{self.base_url}/{snapshot['name']}", part_path)
+        if file_sha256(part_path) != snapshot["sha256"]:
+            os.remove(part_path)
+            self.stats["checksum_errors"] += 1
+            raise SnapshotFetchError(f"Checksum mismatch for {snapshot['name']}")
+
+        tmp_path = temp_path_for(self.db_path)
+        try:
+            digest = hashlib.sha256()
+            with gzip.open(part_path, "rb") as src, open(tmp_path, "wb") as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            os.remove(part_path)
+            if digest.hexdigest() != snapshot["db_sha256"]:
+                self.stats["checksum_errors"] += 1
+                raise SnapshotFetchError(f"Checksum mismatch for the database in {snapshot['name']}")
+
+            chain = delta_chain(manifest, snapshot["version"])
+            if chain is None:
+                print(f"No deltas after snapshot version {snapshot['version']}, using it as is")
+            elif chain:
+                try:
+                    self._apply_deltas(tmp_path, chain)
+                except (SnapshotFetchError, requests.RequestException) as e:
+                    # The deltas applied so far are committed: still a complete, older version
+                    print(f"Delta update failed ({e}), using the snapshot at the last good version")
+            os.replace(tmp_path, self.db_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _apply_deltas(self, db_path, chain, copy=False):
+        """Applies the deltas of chain to db_path (to a copy swapped in at the end if copy)."""
+        target = db_path
+        if copy:
+            target = temp_path_for(db_path)
+            src = sqlite3.connect(db_path)
+            dst = sqlite3.connect(target)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+                src.close()
+        try:
+            conn = sqlite3.connect(target, isolation_level=None)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("PRAGMA user_version").fetchone()[0] < stock_schema.SCHEMA_VERSION:
+                    stock_schema.ensure_schema(conn)
+                conn.execute("COMMIT")
+                for entry in chain:
+                    delta = json.loads(gzip.decompress(self._get(entry["name"], entry["sha256"])))
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        stock_schema.apply_ops(conn, delta["ops"])
+                        stock_schema.set_data_version(conn, delta["version"])
+                        bars = stock_schema.get_bars_total(conn)
+                        if bars != entry["bars_total"]:
+                            raise SnapshotFetchError(
+                                f"{entry['name']} left {bars} bars, expected {entry['bars_total']}")
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+            finally:
+                conn.close()
+            if copy:
+                os.replace(target, db_path)
+        finally:
+            if copy and os.path.exists(target):
+                os.remove(target)
+
+    def _fetch_legacy(self):
+        """Plain download of the uncompressed DB, for when no snapshots are published."""
+        part_path = self.db_path + ".part"
+        # Unverifiable, so a part file from an earlier run is not resumed
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        self._download(self.fallback_url, part_path)
+        # The part file is not served yet, so it can be migrated where it is
+        conn = sqlite3.connect(part_path)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < stock_schema.SCHEMA_VERSION:
+                stock_schema.ensure_schema(conn)
+                conn.commit()
+        finally:
+            conn.close()
+        os.replace(part_path, self.db_path)
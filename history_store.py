@@ -0,0 +1,190 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Date-partitioned columnar store for the merged stock history.
+#
+# Layout (under StockData/history/):
+#     manifest.json          - ordered column list, dtypes and one entry per partition
+#     2026/2026-01-02.npz    - one compressed partition per trading day, one array per column
+#
+# Each partition is a compressed .npz archive holding one array per column, so
+# readers can load a date range without touching other days and a column
+# subset without decompressing the rest.
+
+HISTORY_DIRNAME = "history"
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Null masks for text columns are stored next to the column under this prefix
+NULL_MASK_PREFIX = "__null__"
+
+
+def _date_key(value):
+    """Normalises a date / datetime / string to the YYYY-MM-DD partition key."""
+    return pd.Timestamp(value).strftime("%Y-%m-%d")
+
+
+class HistoryStore:
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILENAME)
+        self._manifest = None
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path, "r") as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = {"version": MANIFEST_VERSION, "columns": [], "dtypes": {}, "partitions": {}}
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def dates(self):
+        """Sorted list of trading dates (YYYY-MM-DD) held in the store."""
+        return sorted(self.manifest["partitions"].keys())
+
+    def is_empty(self):
+        return not self.manifest["partitions"]
+
+    def row_count(self):
+        return sum(p["rows"] for p in self.manifest["partitions"].values())
+
+    def columns(self):
+        return list(self.manifest["columns"])
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def _partition_relpath(self, date_key):
+        return os.path.join(date_key[:4], f"{date_key}.npz")
+
+    def _write_partition(self, date_key, df):
+        arrays = {}
+        dtypes = {}
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+                arrays[col] = series.to_numpy()
+            elif pd.api.types.is_datetime64_any_dtype(series):
+                arrays[col] = series.to_numpy(dtype="datetime64[ns]")
+            else:
+                nulls = series.isna().to_numpy()
+                arrays[col] = series.astype(object).where(~nulls, "").to_numpy(dtype=str)
+                if nulls.any():
+                    arrays[NULL_MASK_PREFIX + col] = nulls
+            dtypes[col] = str(arrays[col].dtype) if arrays[col].dtype.kind != "U" else "str"
+
+        relpath = self._partition_relpath(date_key)
+        path = os.path.join(self.root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+        self.manifest["partitions"][date_key] = {
+            "file": relpath.replace(os.sep, "/"),
+            "rows": int(len(df)),
+            "bytes": os.path.getsize(path),
+        }
+        for col in df.columns:
+            if col not in self.manifest["columns"]:
+                self.manifest["columns"].append(col)
+            self.manifest["dtypes"][col] = dtypes[col]
+
+    def write_day(self, date, df):
+        """Writes (or replaces) the partition for a single trading date."""
+        self.write_days({date: df})
+
+    def write_days(self, frames):
+        """
+        Writes several trading days in one batch.
+        frames maps a date to that day's DataFrame. The manifest is saved once at the end.
+        """
+        for date, df in frames.items():
+            self._write_partition(_date_key(date), df)
+        self._save_manifest()
+
+    def import_frame(self, df, date_column="Date"):
+        """Splits an accumulated history frame by date and writes one partition per day."""
+        keys = pd.to_datetime(df[date_column]).dt.strftime("%Y-%m-%d")
+        frames = {key: day_df for key, day_df in df.groupby(keys, sort=True)}
+        self.write_days(frames)
+        return len(frames)
+
+    def drop_dates(self, dates):
+        """Removes the partitions for the given dates. Returns the number of rows removed."""
+        removed = 0
+        for date in dates:
+            key = _date_key(date)
+            partition = self.manifest["partitions"].pop(key, None)
+            if partition is None:
+                continue
+            removed += partition["rows"]
+            path = os.path.join(self.root, partition["file"])
+            if os.path.exists(path):
+                os.remove(path)
+        self._save_manifest()
+        return removed
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def _read_partition(self, date_key, columns):
+        partition = self.manifest["partitions"][date_key]
+        path = os.path.join(self.root, partition["file"])
+        data = {}
+        with np.load(path, allow_pickle=False) as npz:
+            members = set(npz.files)
+            for col in columns:
+                if col not in members:
+                    # Column added after this partition was written
+                    data[col] = np.full(partition["rows"], np.nan)
+                    continue
+                values = npz[col]
+                if values.dtype.kind == "U":
+                    values = values.astype(object)
+                    mask_name = NULL_MASK_PREFIX + col
+                    if mask_name in members:
+                        values[npz[mask_name]] = np.nan
+                data[col] = values
+        return pd.DataFrame(data, columns=columns)
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Loads the history between start and end (inclusive, either may be None)
+        restricted to the given columns (default: all).
+        """
+        keys = self.dates()
+        if start is not None:
+            start = _date_key(start)
+            keys = [k for k in keys if k >= start]
+        if end is not None:
+            end = _date_key(end)
+            keys = [k for k in keys if k <= end]
+
+        columns = list(columns) if columns is not None else self.columns()
+        if not keys:
+            return pd.DataFrame(columns=columns)
+        frames = [self._read_partition(key, columns) for key in keys]
+        return pd.concat(frames, ignore_index=True)
+
+    def read_day(self, date, columns=None):
+        key = _date_key(date)
+        if key not in self.manifest["partitions"]:
+            return None
+        return self._read_partition(key, list(columns) if columns is not None else self.columns())
@@ -1,6 +1,10 @@
 import pandas as pd
 import sqlite3
 import os
+import stock_schema
+import db_snapshots
+import daily_update
+from bhav_parser import normalize_merged_frame
 
 STOCK_DATA_DIR = "StockData"
 CSV_FILENAME = "merged_stock_data.csv"
@@ -11,6 +15,13 @@ def migrate_to_db():
     db_path = os.path.join(STOCK_DATA_DIR, DB_FILENAME)
     
     if not os.path.exists(csv_path):
+        if os.path.exists(db_path):
+            # No CSV to rebuild from: bring the existing database up to the current schema
+            if db_snapshots.migrate_file(db_path):
+                print("Migration complete.")
+            else:
+                print(f"{db_path} already has the current schema.")
+            return
         print(f"Error: CSV file not found at {csv_path}")
         return
 
@@ -43,27 +54,15 @@ def migrate_to_db():
             
         print(f"Loaded {len(df)} records.")
         
-        print(f"Connecting to database: {db_path}...")
-        conn = sqlite3.connect(db_path)
-        
-        print("Writing data to 'stocks' table...")
-        # if_exists='replace' ensures we start fresh with the full CSV data
-        df.to_sql('stocks', conn, if_exists='replace', index=False)
+        # Built in a new file swapped in for db_path, so the app never sees it half written
+        print(f"Writing data to 'securities' and 'daily_bars' tables of {db_path}...")
+        daily_update.replace_stock_table(normalize_merged_frame(df), db_path)
         
         # Verify
-        cursor = conn.cursor()
-        cursor.execute("SELECT count(*) FROM stocks")
-        count = cursor.fetchone()[0]
-        print(f"Successfully migrated {count} records to database.")
-        
-        # Create indexes for performance
-        print("Creating indexes...")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_date ON stocks (Date)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sc_code ON stocks ('SC_CODE')")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sc_name ON stocks ('SC_NAME')")
-        
-        conn.commit()
+        conn = sqlite3.connect(db_path)
+        count = stock_schema.bar_count(conn)
         conn.close()
+        print(f"Successfully migrated {count} records to database.")
         print("Migration complete.")
         
     except Exception as e:
@@ -0,0 +1,281 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+# Data access for the paper trading orders.
+#
+#   DATABASE_URL set   -> PostgreSQL (Supabase/Render) through a bounded pool
+#   otherwise          -> local orders.db (SQLite) through the same pool
+#
+# Queries are written once with '?' placeholders; the Dialect turns them into
+# the driver's style. On PostgreSQL the order queries are PREPAREd once per
+# pooled connection and run with EXECUTE (set ORDERS_PREPARE=0 to disable,
+# e.g. behind a transaction-mode pgbouncer, which does not keep them).
+
+ORDERS_DB_PATH = "orders.db"
+ORDERS_POOL_SIZE = int(os.environ.get('ORDERS_POOL_SIZE', 5))
+ORDERS_POOL_TIMEOUT = float(os.environ.get('ORDERS_POOL_TIMEOUT', 10))
+ORDERS_PREPARE = os.environ.get('ORDERS_PREPARE', '1') == '1'
+
+ORDER_QUERIES = {
+    "insert_order": "INSERT INTO orders (username, sc_code, sc_name, quantity, order_date) VALUES (?, ?, ?, ?, ?)",
+    "list_orders": "SELECT * FROM orders WHERE username = ? ORDER BY created_at DESC",
+    "get_order": "SELECT * FROM orders WHERE id = ? AND username = ?",
+    "delete_order": "DELETE FROM orders WHERE id = ? AND username = ?",
+}
+
+
+class Dialect:
+    def __init__(self, name, placeholder, id_column):
+        self.name = name
+        self.placeholder = placeholder
+        self.id_column = id_column
+
+    def sql(self, query):
+        """Converts a '?' placeholder query to this dialect."""
+        return query if self.placeholder == '?' else query.replace('?', self.placeholder)
+
+    def create_orders_sql(self):
+        return f'''
+            CREATE TABLE IF NOT EXISTS orders (
+                {self.id_column},
+                username TEXT,
+                sc_code TEXT,
+                sc_name TEXT,
+                quantity INTEGER,
+                order_date TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        '''
+
+
+POSTGRES = Dialect("postgres", "%s", "id SERIAL PRIMARY KEY")
+SQLITE = Dialect("sqlite", "?", "id INTEGER PRIMARY KEY AUTOINCREMENT")
+
+
+def prepare_sql(name):
+    """PostgreSQL PREPARE statement for ORDER_QUERIES[name] ('?' become $1, $2, ...)."""
+    parts = ORDER_QUERIES[name].split('?')
+    numbered = parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], start=1))
+    return f"PREPARE {name} AS {numbered}"
+
+
+class OrdersPoolTimeout(Exception):
+    pass
+
+
+class OrdersConnection:
+    """A pooled connection plus its dialect and the statements already prepared on it."""
+
+    def __init__(self, raw, dialect):
+        self.raw = raw
+        self.dialect = dialect
+        self.prepared = set()
+
+    def is_usable(self):
+        if self.dialect is POSTGRES:
+            return not self.raw.closed
+        return True
+
+    def execute(self, name, params=()):
+        """Runs one of ORDER_QUERIES by name. Returns the cursor."""
+        cur = self.raw.cursor()
+        if self.dialect is POSTGRES and ORDERS_PREPARE:
+            if name not in self.prepared:
+                cur.execute(prepare_sql(name))
+                self.prepared.add(name)
+            args = ', '.join(['%s'] * len(params))
+            cur.execute(f"EXECUTE {name} ({args})" if params else f"EXECUTE {name}", params)
+        else:
+            cur.execute(self.dialect.sql(ORDER_QUERIES[name]), params)
+        return cur
+
+    def close(self):
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
+class OrdersPool:
+    """
+    Bounded pool: at most max_size open connections, callers wait (up to
+    timeout seconds) for a free one. Broken connections are discarded.
+    """
+
+    def __init__(self, connect, dialect, max_size=ORDERS_POOL_SIZE, timeout=ORDERS_POOL_TIMEOUT):
+        self._connect = connect
+        self.dialect = dialect
+        self.pid = os.getpid()
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {"created": 0, "acquired": 0, "reused": 0, "waits": 0, "wait_s": 0.0,
+                       "max_wait_s": 0.0, "timeouts": 0, "discarded": 0, "in_use": 0}
+
+    def acquire(self):
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if conn.is_usable():
+                        self._stats["reused"] += 1
+                        return self._checked_out(conn, start, waited)
+                    self._open -= 1
+                    self._stats["discarded"] += 1
+                if self._open < self.max_size:
+                    self._open += 1
+                    break
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise OrdersPoolTimeout(f"No orders DB connection free after {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+        # Connect outside the lock, other callers can still take idle connections
+        try:
+            conn = OrdersConnection(self._connect(), self.dialect)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+            return self._checked_out(conn, start, waited)
+
+    def _checked_out(self, conn, start, waited):
+        wait_s = time.perf_counter() - start
+        self._stats["acquired"] += 1
+        self._stats["in_use"] += 1
+        if waited:
+            self._stats["waits"] += 1
+        self._stats["wait_s"] += wait_s
+        self._stats["max_wait_s"] = max(self._stats["max_wait_s"], wait_s)
+        return conn
+
+    def release(self, conn, broken=False):
+        if broken or not conn.is_usable():
+            conn.close()
+        with self._cond:
+            self._stats["in_use"] -= 1
+            if broken or not conn.is_usable():
+                self._open -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({"dialect": self.dialect.name, "max_size": self.max_size, "open": self._open,
+                          "idle": len(self._idle)})
+        stats["wait_s"] = round(stats["wait_s"], 4)
+        stats["max_wait_s"] = round(stats["max_wait_s"], 4)
+        return stats
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            conn.close()
+
+
+def _connect_postgres(database_url):
+    return lambda: psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+
+
+def _connect_sqlite(path):
+    def connect():
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+    return connect
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_orders_pool():
+    global _pool
+    with _pool_lock:
+        # A pool inherited through a fork (gunicorn --preload) is not reused
+        if _pool is None or _pool.pid != os.getpid():
+            database_url = os.environ.get('DATABASE_URL')
+            if database_url:
+                _pool = OrdersPool(_connect_postgres(database_url), POSTGRES)
+            else:
+                _pool = OrdersPool(_connect_sqlite(ORDERS_DB_PATH), SQLITE)
+        return _pool
+
+
+@contextmanager
+def orders_connection():
+    """
+    Borrows a pooled orders connection. Commits on success, rolls back on
+    error; connections that fail at the driver level are dropped from the pool.
+    """
+    pool = get_orders_pool()
+    conn = pool.acquire()
+    broken = False
+    try:
+        yield conn
+        conn.raw.commit()
+    except Exception as e:
+        try:
+            conn.raw.rollback()
+        except Exception:
+            broken = True
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            broken = True
+        raise
+    finally:
+        pool.release(conn, broken=broken)
+
+
+def _rows(cur):
+    return [dict(row) for row in cur.fetchall()]
+
+
+def init_orders_table():
+    with orders_connection() as conn:
+        conn.raw.cursor().execute(conn.dialect.create_orders_sql())
+
+
+def add_order(username, sc_code, sc_name, quantity, order_date):
+    with orders_connection() as conn:
+        conn.execute("insert_order", (username, sc_code, sc_name, quantity, order_date))
+
+
+def list_orders(username):
+    with orders_connection() as conn:
+        return _rows(conn.execute("list_orders", (username,)))
+
+
+def get_order(order_id, username):
+    with orders_connection() as conn:
+        row = conn.execute("get_order", (order_id, username)).fetchone()
+        return dict(row) if row else None
+
+
+def delete_order(order_id, username):
+    """Deletes the user's order. Returns False if it does not exist or belongs to someone else."""
+    with orders_connection() as conn:
+        return conn.execute("delete_order", (order_id, username)).rowcount > 0
+
+
+def get_orders_pool_stats():
+    return get_orders_pool().stats()
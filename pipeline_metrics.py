@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Per-stage instrumentation for the ingestion pipeline.
+#
+#     with pipeline_metrics.run("process_date", report_dir=STOCK_DATA_DIR, date=...):
+#         with pipeline_metrics.stage("download_bse") as st:
+#             ...
+#             st["bytes_read"] = len(content)
+#
+# The outermost run() owns the report: on exit it is written as JSON to
+# run_report.json and appended to run_history.jsonl in report_dir. A run()
+# nested inside another one (e.g. merge_and_accumulate called from
+# process_date) is recorded as a stage of the outer run instead.
+# stage() outside of any run is a no-op apart from the timing.
+
+REPORT_FILENAME = "run_report.json"
+HISTORY_FILENAME = "run_history.jsonl"
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+class RunReport:
+    def __init__(self, name, **info):
+        self.name = name
+        self.info = dict(info)
+        self.started = datetime.datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, record):
+        with self._lock:
+            self.stages.append(record)
+
+    def totals(self):
+        totals = {}
+        for record in self.stages:
+            entry = totals.setdefault(record["stage"], {"count": 0, "wall_s": 0.0, "bytes_read": 0, "bytes_written": 0})
+            entry["count"] += 1
+            entry["wall_s"] = round(entry["wall_s"] + record["wall_s"], 4)
+            entry["bytes_read"] += record.get("bytes_read") or 0
+            entry["bytes_written"] += record.get("bytes_written") or 0
+        return totals
+
+    def to_dict(self, status):
+        return {
+            "run": self.name,
+            "status": status,
+            "started": self.started,
+            "wall_s": round(time.perf_counter() - self._start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "info": self.info,
+            "stages": self.stages,
+            "totals": self.totals(),
+        }
+
+
+def _clean(record):
+    return {k: v for k, v in record.items() if v is not None}
+
+
+@contextmanager
+def stage(name, **fields):
+    """Times a pipeline stage. The yielded dict takes rows_in/rows_out/bytes_read/bytes_written."""
+    record = {"stage": name, "rows_in": None, "rows_out": None, "bytes_read": None, "bytes_written": None}
+    record.update(fields)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = round(time.perf_counter() - start, 4)
+        record["peak_rss_mb"] = peak_rss_mb()
+        report = _active
+        if report is not None:
+            report.add_stage(_clean(record))
+
+
+def _print_summary(report_dict):
+    print(f"\n--- Run report: {report_dict['run']} ({report_dict['status']}) "
+          f"{report_dict['wall_s']:.2f}s, peak RSS {report_dict['peak_rss_mb']} MB ---")
+    for record in report_dict["stages"]:
+        rows = ""
+        if "rows_in" in record or "rows_out" in record:
+            rows = f" rows {record.get('rows_in', '-')} -> {record.get('rows_out', '-')}"
+        io_bytes = ""
+        if "bytes_read" in record or "bytes_written" in record:
+            io_bytes = f" read {record.get('bytes_read', 0)}B written {record.get('bytes_written', 0)}B"
+        print(f"  {record['stage']:<20} {record['wall_s']:>8.3f}s{rows}{io_bytes}")
+
+
+def write_report(report_dict, report_dir):
+    os.makedirs(report_dir, exist_ok=True)
+    report_path = os.path.join(report_dir, REPORT_FILENAME)
+    tmp_path = report_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report_dict, f, indent=1)
+    os.replace(tmp_path, report_path)
+    with open(os.path.join(report_dir, HISTORY_FILENAME), "a") as f:
+        f.write(json.dumps(report_dict) + "\n")
+    return report_path
+
+
+@contextmanager
+def run(name, report_dir=None, **info):
+    """
+    Starts a run report (or a stage, if a run is already active).
+    The yielded dict can be used to attach extra info, e.g. a status.
+    """
+    global _active
+    with _active_lock:
+        owner = _active is None
+        if owner:
+            _active = RunReport(name, **info)
+            report = _active
+
+    if not owner:
+        with stage(name, **info) as record:
+            yield record
+        return
+
+    status = "ok"
+    try:
+        yield report.info
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        with _active_lock:
+            _active = None
+        report_dict = report.to_dict(report.info.pop("status", status) if status == "ok" else status)
+        _print_summary(report_dict)
+        if report_dir:
+            try:
+                path = write_report(report_dict, report_dir)
+                print(f"Run report written to {path}")
+            except Exception as e:
+                print(f"Error writing run report: {e}")
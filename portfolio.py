@@ -0,0 +1,233 @@
+import numpy as np
+
+from stock_schema import date_key, key_to_text
+
+# Valuation of paper trading orders against the stock DB.
+#
+# An order is bought at the close of the first trading day on or after its
+# order date (the last close if there is none yet, e.g. a future date) and is
+# worth the latest close of its security. Both prices come from one statement
+# per batch of orders: two primary key seeks on daily_bars per distinct
+# (code, order date), so no price history is read. The P&L is then computed
+# for all orders at once with numpy.
+
+# (code, order date) pairs per statement, 3 bound parameters each (SQLite's
+# default limit was 999 before 3.32)
+PAIRS_PER_QUERY = 300
+
+PRICE_SQL = """
+    WITH o(i, code, from_date) AS (VALUES {values})
+    SELECT o.i,
+        (SELECT close FROM daily_bars b WHERE b.code = o.code AND b.date >= o.from_date
+         ORDER BY b.date LIMIT 1) AS purchase_price,
+        (SELECT close FROM daily_bars b WHERE b.code = o.code ORDER BY b.date DESC LIMIT 1) AS current_price
+    FROM o
+"""
+
+SUMMARY_KEYS = ('total_invested', 'total_current_value', 'total_pl', 'total_pl_pct')
+
+
+def fetch_prices(conn, pairs):
+    """Purchase and current close arrays (NaN if missing) for (code, YYYYMMDD from_date) pairs, in order."""
+    purchase = np.full(len(pairs), np.nan)
+    current = np.full(len(pairs), np.nan)
+    for start in range(0, len(pairs), PAIRS_PER_QUERY):
+        chunk = pairs[start:start + PAIRS_PER_QUERY]
+        sql = PRICE_SQL.format(values=', '.join(['(?, ?, ?)'] * len(chunk)))
+        params = [value for i, (code, from_date) in enumerate(chunk, start) for value in (i, code, from_date)]
+        for i, purchase_price, current_price in conn.execute(sql, params):
+            purchase[i] = np.nan if purchase_price is None else purchase_price
+            current[i] = np.nan if current_price is None else current_price
+    return purchase, current
+
+
+def _empty_summary():
+    return dict.fromkeys(SUMMARY_KEYS, 0.0)
+
+
+def value_orders(conn, orders):
+    """
+    Values the orders (dicts with id, sc_code, order_date, quantity).
+    Returns (per_order, summary): per_order maps order id to its purchase_price,
+    current_price, invested, current_value, pl and pl_pct; orders without any
+    bars are left out. summary has the totals of SUMMARY_KEYS.
+    """
+    ids, quantities, pair_index = [], [], []
+    pairs = {}
+    for order in orders:
+        try:
+            pair = (int(order['sc_code']), date_key(order['order_date']))
+        except (TypeError, ValueError) as e:
+            print(f"Error calculating stats for order {order['id']}: {e}")
+            continue
+        ids.append(order['id'])
+        quantities.append(order['quantity'])
+        pair_index.append(pairs.setdefault(pair, len(pairs)))
+    if not ids:
+        return {}, _empty_summary()
+
+    purchase, current = fetch_prices(conn, list(pairs))
+    pair_index = np.array(pair_index)
+    purchase, current = purchase[pair_index], current[pair_index]
+    quantities = np.array(quantities, dtype=float)
+
+    # Orders of securities without bars are skipped; with no bar on/after the
+    # order date (or a zero close) the order is bought at the latest close
+    valued = ~np.isnan(current)
+    purchase = np.where(np.isnan(purchase) | (purchase == 0), current, purchase)
+    invested = purchase * quantities
+    current_value = current * quantities
+    pl = current_value - invested
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pl_pct = np.where(invested > 0, pl / invested * 100, 0.0)
+
+    columns = ('purchase_price', 'current_price', 'invested', 'current_value', 'pl', 'pl_pct')
+    values = np.column_stack([purchase, current, invested, current_value, pl, pl_pct])[valued].tolist()
+    per_order = {order_id: dict(zip(columns, row))
+                 for order_id, row in zip(np.array(ids, dtype=object)[valued], values)}
+
+    total_invested = float(invested[valued].sum())
+    total_current_value = float(current_value[valued].sum())
+    total_pl = total_current_value - total_invested
+    summary = {
+        'total_invested': total_invested,
+        'total_current_value': total_current_value,
+        'total_pl': total_pl,
+        'total_pl_pct': (total_pl / total_invested * 100) if total_invested > 0 else 0.0,
+    }
+    return per_order, summary
+
+
+# Value series of orders for the paper trading chart.
+#
+# The closes of all the orders' securities are read in one statement per
+# batch of codes (a primary key range scan per code, from its earliest order
+# date). The orders share one date axis (every date any of them has a bar on)
+# and each order's value is a column on it: close x quantity from its order
+# date on, carried forward over dates its security has no bar, None before.
+# Optionally the axis is downsampled with largest-triangle-three-buckets
+# (LTTB) on the summed value, so peaks and troughs of the chart survive.
+
+SERIES_SQL = """
+    WITH o(code, from_date) AS (VALUES {values})
+    SELECT b.code, b.date, b.close
+    FROM o JOIN daily_bars b ON b.code = o.code AND b.date >= o.from_date
+"""
+
+# Upper bound for the points parameter of the chart endpoint
+MAX_POINTS = 5000
+
+
+def fetch_closes(conn, from_dates):
+    """(dates, codes, closes) for {code: YYYYMMDD from_date}: closes[i, j] is the close of codes[i] on dates[j] or NaN."""
+    codes = sorted(from_dates)
+    rows = []
+    for start in range(0, len(codes), PAIRS_PER_QUERY):
+        chunk = codes[start:start + PAIRS_PER_QUERY]
+        sql = SERIES_SQL.format(values=', '.join(['(?, ?)'] * len(chunk)))
+        rows.extend(conn.execute(sql, [value for code in chunk for value in (code, from_dates[code])]).fetchall())
+    if not rows:
+        return np.array([], dtype=np.int64), codes, np.full((len(codes), 0), np.nan)
+
+    bar_codes, bar_dates, bar_closes = (np.array(column) for column in zip(*rows))
+    dates = np.unique(bar_dates.astype(np.int64))
+    closes = np.full((len(codes), len(dates)), np.nan)
+    closes[np.searchsorted(codes, bar_codes.astype(np.int64)), np.searchsorted(dates, bar_dates)] = \
+        np.array([np.nan if close is None else close for close in bar_closes], dtype=float)
+    return dates, codes, closes
+
+
+def _carry_forward(row):
+    """row with each NaN replaced by the last value before it (leading NaNs stay)."""
+    index = np.where(np.isnan(row), 0, np.arange(len(row)))
+    np.maximum.accumulate(index, out=index)
+    filled = row[index]
+    filled[np.cumsum(~np.isnan(row)) == 0] = np.nan
+    return filled
+
+
+def lttb_indexes(values, points):
+    """Indexes of the points kept by largest-triangle-three-buckets, x being the index."""
+    n = len(values)
+    if points >= n or points < 3:
+        return np.arange(n)
+    y = np.asarray(values, dtype=float)
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    kept = [0]
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (just the last point for the final one)
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = (edges[bucket + 1] + next_end - 1) / 2
+        next_y = y[edges[bucket + 1]:next_end].mean()
+        prev = kept[-1]
+        x = np.arange(start, end)
+        area = np.abs((prev - next_x) * (y[start:end] - y[prev]) - (prev - x) * (next_y - y[prev]))
+        kept.append(start + int(np.argmax(area)))
+    kept.append(n - 1)
+    return np.array(kept)
+
+
+def _series_stats(closes, quantity):
+    """Chart stats from an order's closes since its order date, None without any."""
+    closes = closes[~np.isnan(closes)]
+    if not len(closes):
+        return None
+    purchase, current = float(closes[0]), float(closes[-1])
+    pct_change = (current - purchase) / purchase * 100 if purchase != 0 else 0
+    return {
+        "purchase_price": purchase * quantity,
+        "current_price": current * quantity,
+        "pct_change": round(pct_change, 2),
+        "profit_loss": (current - purchase) * quantity,
+    }
+
+
+def order_series(conn, orders, points=None):
+    """
+    Value series of the orders (dicts with id, sc_code, sc_name, order_date,
+    quantity) on a shared date axis:
+    {"dates": [...], "series": [{"id", "sc_code", "sc_name", "values", "stats"}],
+     "total_points": n, "downsampled": bool}.
+    With points, the axis is reduced to about that many dates by LTTB.
+    """
+    parsed = []
+    from_dates = {}
+    for order in orders:
+        try:
+            code, from_date = int(order['sc_code']), date_key(order['order_date'])
+        except (TypeError, ValueError) as e:
+            print(f"Error building chart series for order {order['id']}: {e}")
+            continue
+        parsed.append((order, code, from_date))
+        from_dates[code] = min(from_date, from_dates.get(code, from_date))
+
+    dates, codes, closes = fetch_closes(conn, from_dates)
+    columns = []
+    for order, code, from_date in parsed:
+        row = closes[codes.index(code)].copy()
+        row[dates < from_date] = np.nan
+        columns.append((order, row, _carry_forward(row) * float(order['quantity'])))
+
+    total_points = len(dates)
+    keep = np.arange(total_points)
+    if points and columns and points < total_points:
+        total = np.nansum(np.vstack([values for _, _, values in columns]), axis=0)
+        keep = lttb_indexes(total, points)
+
+    series = []
+    for order, row, values in columns:
+        values = values[keep]
+        series.append({
+            "id": order['id'],
+            "sc_code": order['sc_code'],
+            "sc_name": order.get('sc_name'),
+            "values": [v if v == v else None for v in values.tolist()],  # NaN != NaN
+            "stats": _series_stats(row, float(order['quantity'])),
+        })
+    return {
+        "dates": [key_to_text(d) for d in dates[keep].tolist()],
+        "series": series,
+        "total_points": total_points,
+        "downsampled": len(keep) < total_points,
+    }
@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import datetime
+import threading
+
+# Manifest of the raw source files already downloaded into StockData/.
+#
+# One entry per trading date:
+#     {
+#       "files": {"bse": {"name", "sha256", "bytes"}, "samco": [{"name", "sha256", "bytes"}, ...]},
+#       "rows": {"bse": ..., "samco": ..., "merged": ...},
+#       "ingested": true,
+#       "merge_version": 1,
+#       "updated": "2026-02-05T21:00:03"
+#     }
+#
+# process_date uses it to skip dates that are already ingested and to re-parse
+# from the cached files (no download) when only the merge logic changed.
+
+RAW_MANIFEST_FILENAME = "raw_manifest.json"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _date_key(value):
+    return value.strftime("%Y-%m-%d")
+
+
+class RawCache:
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, RAW_MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r") as f:
+                        self._entries = json.load(f).get("dates", {})
+                except Exception as e:
+                    print(f"Error reading raw file manifest, starting a new one: {e}")
+        return self._entries
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dates": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _describe(self, file_path):
+        return {
+            "name": os.path.basename(file_path),
+            "sha256": file_sha256(file_path),
+            "bytes": os.path.getsize(file_path),
+        }
+
+    def _describe_blob(self, file_name, data):
+        return {"name": file_name, "sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+
+    def entry(self, date):
+        return self.entries.get(_date_key(date))
+
+    def record_files(self, date, bse_file, samco_files):
+        """Records the raw files downloaded for date (paths relative to data_dir or absolute)."""
+        bse_info = self._describe(os.path.join(self.data_dir, bse_file))
+        samco_info = [self._describe(os.path.join(self.data_dir, os.path.basename(p))) for p in samco_files]
+        self._record(date, bse_info, samco_info)
+
+    def record_blobs(self, date, bse_blob, samco_blobs):
+        """
+        Records raw files downloaded into memory as (file_name, bytes) pairs.
+        The checksums are taken from the buffers; the files count as cached
+        once they have been archived to data_dir.
+        """
+        bse_info = self._describe_blob(*bse_blob)
+        samco_info = [self._describe_blob(name, data) for name, data in samco_blobs]
+        self._record(date, bse_info, samco_info)
+
+    def _record(self, date, bse_info, samco_info):
+        with self._lock:
+            entry = self.entries.setdefault(_date_key(date), {})
+            entry["files"] = {"bse": bse_info, "samco": samco_info}
+            entry["ingested"] = False
+            entry["updated"] = datetime.datetime.now().isoformat(timespec="seconds")
+            self._save()
+
+    def mark_ingested(self, date, rows, merge_version):
+        """Marks date as merged into the history store with the given row counts."""
+        with self._lock:
+            entry = self.entries.setdefault(_date_key(date), {})
+            entry["rows"] = rows
+            entry["ingested"] = True
+            entry["merge_version"] = merge_version
+            entry["updated"] = datetime.datetime.now().isoformat(timespec="seconds")
+            self._save()
+
+    def is_ingested(self, date, merge_version):
+        entry = self.entry(date)
+        return bool(entry and entry.get("ingested") and entry.get("merge_version") == merge_version)
+
+    def cached_files(self, date):
+        """
+        Returns (bse_file, samco_paths) if the raw files recorded for date are
+        still on disk with matching checksums, otherwise None.
+        """
+        entry = self.entry(date)
+        if not entry or "files" not in entry:
+            return None
+        infos = [entry["files"]["bse"]] + list(entry["files"]["samco"])
+        for info in infos:
+            path = os.path.join(self.data_dir, info["name"])
+            if not os.path.exists(path) or os.path.getsize(path) != info["bytes"]:
+                return None
+            if file_sha256(path) != info["sha256"]:
+                print(f"Cached file changed on disk: {info['name']}")
+                return None
+        bse_file = entry["files"]["bse"]["name"]
+        samco_paths = [os.path.join(self.data_dir, info["name"]) for info in entry["files"]["samco"]]
+        return bse_file, samco_paths
@@ -0,0 +1,220 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+from stock_schema import STOCKS_SELECT, STOCKS_FROM, date_key, get_data_version, bar_dates
+
+# Filtering and paging of the stock rows on the index page.
+#
+# Pages are read with keyset (seek) pagination on (date, code), the order of
+# idx_bars_date (an index on a WITHOUT ROWID table also carries the primary
+# key), so a deep page costs the same as the first one. The links carry the
+# key of the first / last row shown: ?after=YYYYMMDD:code for the next page,
+# ?before=YYYYMMDD:code for the previous one. A bare ?page=N still works (OFFSET).
+#
+# Filters are translated to forms the indexes can serve: a code prefix becomes
+# code ranges, dates become integer equality / BETWEEN on daily_bars.date.
+#
+# Totals are cached per filter and data version. Counting stops after
+# COUNT_CAP rows; past that the total is estimated (matching securities x
+# matching dates, an upper bound) and flagged approximate.
+
+PER_PAGE = 18
+COUNT_CAP = 20000
+COUNT_CACHE_SIZE = 256
+# BSE scrip codes have at most 6 digits
+MAX_CODE_DIGITS = 6
+
+_count_cache = OrderedDict()
+_dates_cache = {}
+_cache_lock = threading.Lock()
+_count_stats = {"hits": 0, "misses": 0, "approximate": 0}
+
+
+def code_prefix_ranges(prefix):
+    """Inclusive (low, high) code ranges of the integer codes starting with prefix."""
+    if not prefix.isdigit() or prefix.startswith('0'):
+        return []
+    value = int(prefix)
+    if len(prefix) >= MAX_CODE_DIGITS:
+        return [(value, value)]
+    ranges = []
+    for digits in range(len(prefix), MAX_CODE_DIGITS + 1):
+        scale = 10 ** (digits - len(prefix))
+        ranges.append((value * scale, (value + 1) * scale - 1))
+    return ranges
+
+
+def parse_cursor(value):
+    """(date, code) from a 'YYYYMMDD:code' cursor, None if missing or malformed."""
+    try:
+        date, code = value.split(':')
+        return int(date), int(code)
+    except (AttributeError, ValueError):
+        return None
+
+
+def format_cursor(row):
+    return f"{row['_date']}:{row['_code']}"
+
+
+class StockFilters:
+    def __init__(self, sc_code='', sc_name='', sc_group='', date='', date_to=''):
+        self.sc_code = sc_code
+        self.sc_name = sc_name
+        self.groups = tuple(g.strip().upper() for g in sc_group.split(',') if g.strip())
+        self.date_from = self._date(date)
+        self.date_to = self._date(date_to)
+
+    @staticmethod
+    def _date(value):
+        if not value:
+            return None
+        try:
+            return date_key(value)
+        except ValueError:
+            # Matches nothing, like an unknown date
+            return -1
+
+    def signature(self):
+        return (self.sc_code, self.sc_name, self.groups, self.date_from, self.date_to)
+
+    def security_where(self, code_column):
+        """Clauses on the security (code prefix, name, group) and their params."""
+        clauses, params = [], []
+        if self.sc_code:
+            ranges = code_prefix_ranges(self.sc_code)
+            if ranges:
+                clauses.append("(" + " OR ".join(f"{code_column} BETWEEN ? AND ?" for _ in ranges) + ")")
+                params.extend(bound for pair in ranges for bound in pair)
+            else:
+                clauses.append("0")
+        if self.sc_name:
+            clauses.append("s.name LIKE ?")
+            params.append(f"%{self.sc_name}%")
+        if self.groups:
+            clauses.append(f"UPPER(s.sc_group) IN ({','.join(['?'] * len(self.groups))})")
+            params.extend(self.groups)
+        return clauses, params
+
+    def date_where(self):
+        if self.date_from is not None and self.date_to is not None:
+            return ["b.date BETWEEN ? AND ?"], [self.date_from, self.date_to]
+        if self.date_from is not None:
+            return ["b.date = ?"], [self.date_from]
+        if self.date_to is not None:
+            return ["b.date <= ?"], [self.date_to]
+        return [], []
+
+    def where(self):
+        # On securities: the planner then starts from the few matching codes
+        clauses, params = self.security_where("s.code")
+        date_clauses, date_params = self.date_where()
+        clauses = clauses + date_clauses
+        return (" AND ".join(clauses) if clauses else "1=1"), params + date_params
+
+
+def _dates(conn, version):
+    with _cache_lock:
+        dates = _dates_cache.get(version)
+    if dates is None:
+        dates = bar_dates(conn)
+        with _cache_lock:
+            _dates_cache.clear()
+            _dates_cache[version] = dates
+    return dates
+
+
+def _estimate_rows(conn, filters, version):
+    """Upper bound: securities matching the filters x dates in the date filter."""
+    clauses, params = filters.security_where("s.code")
+    where_sql = " AND ".join(clauses) if clauses else "1=1"
+    securities = conn.execute(f"SELECT COUNT(*) FROM securities s WHERE {where_sql}", params).fetchone()[0]
+    dates = _dates(conn, version)
+    if filters.date_from is not None and filters.date_to is None:
+        n_dates = 1 if filters.date_from in dates else 0
+    else:
+        low = filters.date_from if filters.date_from is not None else 0
+        high = filters.date_to if filters.date_to is not None else 99999999
+        n_dates = bisect.bisect_right(dates, high) - bisect.bisect_left(dates, low)
+    return securities * n_dates
+
+
+def count_rows(conn, filters):
+    """(total, approximate) for the filters, cached per data version."""
+    version = get_data_version(conn)
+    key = (version, filters.signature())
+    with _cache_lock:
+        if key in _count_cache:
+            _count_cache.move_to_end(key)
+            _count_stats["hits"] += 1
+            return _count_cache[key]
+        _count_stats["misses"] += 1
+
+    where_sql, params = filters.where()
+    total = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {STOCKS_FROM} WHERE {where_sql} LIMIT ?)",
+                         params + [COUNT_CAP + 1]).fetchone()[0]
+    result = (total, False)
+    if total > COUNT_CAP:
+        result = (max(_estimate_rows(conn, filters, version), total), True)
+
+    with _cache_lock:
+        if result[1]:
+            _count_stats["approximate"] += 1
+        _count_cache[key] = result
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return result
+
+
+def get_count_cache_stats():
+    with _cache_lock:
+        return dict(_count_stats, size=len(_count_cache))
+
+
+def fetch_page(conn, filters, after=None, before=None, page=1, per_page=PER_PAGE):
+    """
+    One page of rows (legacy 'stocks' columns) in (date, code) order.
+    after / before are cursors of the neighbouring page; page is used for
+    display, or as an OFFSET when no cursor is given.
+    """
+    total, approximate = count_rows(conn, filters)
+    total_pages = (total + per_page - 1) // per_page
+    where_sql, params = filters.where()
+    select = f"SELECT {STOCKS_SELECT}, b.date AS _date, b.code AS _code FROM {STOCKS_FROM} WHERE {where_sql}"
+
+    after, before = parse_cursor(after), parse_cursor(before)
+    if before:
+        sql = f"{select} AND (b.date, b.code) < (?, ?) ORDER BY b.date DESC, b.code DESC LIMIT ?"
+        rows = conn.execute(sql, params + list(before) + [per_page + 1]).fetchall()
+        has_prev, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+        if not has_prev:
+            page = 1
+    else:
+        if after:
+            sql = f"{select} AND (b.date, b.code) > (?, ?) ORDER BY b.date, b.code LIMIT ?"
+            query_params = params + list(after) + [per_page + 1]
+        else:
+            if not approximate:
+                page = max(1, min(page, total_pages)) if total_pages > 0 else 1
+            page = max(1, page)
+            sql = f"{select} ORDER BY b.date, b.code LIMIT ? OFFSET ?"
+            query_params = params + [per_page + 1, (page - 1) * per_page]
+        rows = conn.execute(sql, query_params).fetchall()
+        has_prev, has_next = page > 1 or after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+
+    columns = [c for c in rows[0].keys() if not c.startswith('_')] if rows else []
+    return {
+        "data": [{c: row[c] for c in columns} for row in rows],
+        "columns": columns,
+        "page": page,
+        "total_records": total,
+        "total_pages": max(total_pages, page),
+        "approximate": approximate,
+        "has_prev": has_prev,
+        "has_next": has_next,
+        "first_cursor": format_cursor(rows[0]) if rows else None,
+        "last_cursor": format_cursor(rows[-1]) if rows else None,
+    }
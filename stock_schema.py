@@ -0,0 +1,358 @@
+import sqlite3
+import datetime
+
+import pandas as pd
+
+# Normalized layout of StockData/stock_data.db:
+#
+#   securities  - one row per security: code (INTEGER PRIMARY KEY), name, group, type
+#                 as of last_date (the latest bar they were taken from)
+#   daily_bars  - one row per security per trading day, keyed by (code, date) where
+#                 date is an integer YYYYMMDD; typed OHLC, trade and delivery columns.
+#                 WITHOUT ROWID, so the primary key is the table itself and code /
+#                 date range lookups never leave the b-tree.
+#   meta        - key/value pairs, e.g. data_version: bumped by every ingestion
+#                 snapshot, so readers and caches can tell data sets apart, and
+#                 bars_total: rows in daily_bars, kept up to date by apply_ops
+#   stocks      - view with the columns and names of the old flat pandas table
+#                 (SCRIP CODE, SC_CODE, SC_NAME, DATE_GEN, Date as YYYY-MM-DD, ...)
+#                 so existing queries keep working.
+#
+# Hot queries should filter on daily_bars.code / daily_bars.date (integer keys)
+# and only format the date for output: filtering on the view's Date column is a
+# computed expression and cannot use an index.
+
+SCHEMA_VERSION = 3
+
+SECURITIES_DDL = """
+CREATE TABLE IF NOT EXISTS securities (
+    code INTEGER PRIMARY KEY,
+    name TEXT,
+    sc_group TEXT,
+    sc_type TEXT,
+    last_date INTEGER
+)
+"""
+
+DAILY_BARS_DDL = """
+CREATE TABLE IF NOT EXISTS daily_bars (
+    code INTEGER NOT NULL REFERENCES securities (code),
+    date INTEGER NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    last REAL,
+    prev_close REAL,
+    no_trades INTEGER,
+    no_of_shrs INTEGER,
+    net_turnov INTEGER,
+    tdcloindi TEXT,
+    delivery_qty INTEGER,
+    delivery_val INTEGER,
+    volume INTEGER,
+    turnover INTEGER,
+    delivery_pct REAL,
+    PRIMARY KEY (code, date)
+) WITHOUT ROWID
+"""
+
+META_DDL = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+)
+"""
+
+INDEXES = [
+    ("idx_bars_date", "daily_bars (date)"),
+    ("idx_securities_name", "securities (name)"),
+]
+
+# Merged frame column -> daily_bars column, SQL type
+BAR_COLUMNS = [
+    ('OPEN', 'open', 'REAL'),
+    ('HIGH', 'high', 'REAL'),
+    ('LOW', 'low', 'REAL'),
+    ('CLOSE', 'close', 'REAL'),
+    ('LAST', 'last', 'REAL'),
+    ('PREVCLOSE', 'prev_close', 'REAL'),
+    ('NO_TRADES', 'no_trades', 'INTEGER'),
+    ('NO_OF_SHRS', 'no_of_shrs', 'INTEGER'),
+    ('NET_TURNOV', 'net_turnov', 'INTEGER'),
+    ('TDCLOINDI', 'tdcloindi', 'TEXT'),
+    ('DELIVERY QTY', 'delivery_qty', 'INTEGER'),
+    ('DELIVERY VAL', 'delivery_val', 'INTEGER'),
+    ("DAY'S VOLUME", 'volume', 'INTEGER'),
+    ("DAY'S TURNOVER", 'turnover', 'INTEGER'),
+    ('DELV. PER.', 'delivery_pct', 'REAL'),
+]
+
+# Merged frame column -> securities column
+SECURITY_COLUMNS = [
+    ('SC_NAME', 'name'),
+    ('SC_GROUP', 'sc_group'),
+    ('SC_TYPE', 'sc_type'),
+]
+
+SECURITY_TABLE_COLUMNS = ['code'] + [dst for _, dst in SECURITY_COLUMNS] + ['last_date']
+BAR_TABLE_COLUMNS = ['code', 'date'] + [dst for _, dst, _ in BAR_COLUMNS]
+
+STOCKS_FROM = "daily_bars b JOIN securities s ON s.code = b.code"
+
+
+def date_text_sql(column):
+    """SQL expression formatting an integer YYYYMMDD column as 'YYYY-MM-DD'."""
+    return f"printf('%04d-%02d-%02d', {column} / 10000, {column} / 100 % 100, {column} % 100)"
+
+
+# Column list of the legacy flat table, in its original order
+STOCKS_SELECT = f"""
+    {date_text_sql('b.date')} AS DATE_GEN,
+    b.code AS "SCRIP CODE",
+    b.delivery_qty AS "DELIVERY QTY",
+    b.delivery_val AS "DELIVERY VAL",
+    b.volume AS "DAY'S VOLUME",
+    b.turnover AS "DAY'S TURNOVER",
+    b.delivery_pct AS "DELV. PER.",
+    b.code AS SC_CODE,
+    s.name AS SC_NAME,
+    s.sc_group AS SC_GROUP,
+    s.sc_type AS SC_TYPE,
+    b.open AS "OPEN",
+    b.high AS HIGH,
+    b.low AS LOW,
+    b.close AS "CLOSE",
+    b.last AS "LAST",
+    b.prev_close AS PREVCLOSE,
+    b.no_trades AS NO_TRADES,
+    b.no_of_shrs AS NO_OF_SHRS,
+    b.net_turnov AS NET_TURNOV,
+    b.tdcloindi AS TDCLOINDI,
+    {date_text_sql('b.date')} AS Date
+"""
+
+STOCKS_VIEW_DDL = f"CREATE VIEW IF NOT EXISTS stocks AS SELECT {STOCKS_SELECT} FROM {STOCKS_FROM}"
+
+
+def date_key(value):
+    """Integer YYYYMMDD key for a date, datetime, Timestamp or 'YYYY-MM-DD...' string."""
+    if isinstance(value, str):
+        value = datetime.datetime.strptime(value[:10], "%Y-%m-%d")
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def key_to_text(key):
+    """'YYYY-MM-DD' for an integer YYYYMMDD key."""
+    key = int(key)
+    return f"{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}"
+
+
+def _object_type(conn, name):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def ensure_schema(conn):
+    """
+    Creates the normalized tables, indexes and the stocks view if missing.
+    A legacy flat 'stocks' table is migrated into them and dropped.
+    Runs inside the caller's transaction, if any. Returns True if it migrated.
+    """
+    conn.execute(SECURITIES_DDL)
+    conn.execute(DAILY_BARS_DDL)
+    conn.execute(META_DDL)
+    for name, columns in INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+    migrated = _object_type(conn, 'stocks') == 'table'
+    if migrated:
+        migrate_legacy_table(conn)
+    conn.execute(STOCKS_VIEW_DDL)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return migrated
+
+
+def get_data_version(conn):
+    """The data version of the database (0 if it never had one)."""
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def set_data_version(conn, version):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('data_version', ?)", (int(version),))
+
+
+def migrate_legacy_table(conn):
+    """Copies the flat pandas 'stocks' table into securities/daily_bars and drops it."""
+    legacy_cols = {row[1] for row in conn.execute("PRAGMA table_info(stocks)")}
+
+    def col(name, cast):
+        return f'CAST("{name}" AS {cast})' if name in legacy_cols else 'NULL'
+
+    date_expr = "CAST(replace(substr(Date, 1, 10), '-', '') AS INTEGER)"
+    print("Migrating legacy stocks table to securities/daily_bars...")
+    # Ordered by date so the latest name/group of each security wins
+    conn.execute(f"""
+        INSERT OR REPLACE INTO securities (code, name, sc_group, sc_type, last_date)
+        SELECT CAST("SCRIP CODE" AS INTEGER), {col('SC_NAME', 'TEXT')}, {col('SC_GROUP', 'TEXT')},
+               {col('SC_TYPE', 'TEXT')}, {date_expr}
+        FROM stocks ORDER BY {date_expr}
+    """)
+    bar_select = ', '.join(col(src, kind) for src, _, kind in BAR_COLUMNS)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO daily_bars (code, date, {', '.join(dst for _, dst, _ in BAR_COLUMNS)})
+        SELECT CAST("SCRIP CODE" AS INTEGER), {date_expr}, {bar_select}
+        FROM stocks
+    """)
+    conn.execute("DROP TABLE stocks")
+
+
+def _plain_rows(frame):
+    # Plain Python values (None for NaN) so sqlite3 can bind them
+    return list(frame.astype(object).where(pd.notna(frame), None).itertuples(index=False, name=None))
+
+
+def frame_rows(df):
+    """
+    Plain row tuples of a merged day frame (one or more days):
+    (securities rows, daily_bars rows), in SECURITY_TABLE_COLUMNS / BAR_TABLE_COLUMNS order.
+    """
+    codes = df['SCRIP CODE'].astype('int64')
+    dates = pd.to_datetime(df['Date'])
+    keys = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('int64')
+
+    securities = pd.DataFrame({'code': codes})
+    for src, dst in SECURITY_COLUMNS:
+        securities[dst] = df[src] if src in df.columns else None
+    # Latest row per security wins
+    securities['last_date'] = keys
+    securities = securities.sort_values('last_date', kind='stable').drop_duplicates('code', keep='last')
+
+    bars = pd.DataFrame({'code': codes, 'date': keys})
+    for src, dst, _ in BAR_COLUMNS:
+        bars[dst] = df[src] if src in df.columns else None
+    return _plain_rows(securities), _plain_rows(bars)
+
+
+def write_rows(conn, security_rows, bar_rows):
+    """
+    Upserts securities and daily_bars rows: the securities take the
+    name/group/type of their latest bar (older days, e.g. from a backfill, do
+    not overwrite newer values), bars with the same (code, date) are replaced.
+    Runs inside the caller's transaction. Returns the bars written.
+    """
+    conn.executemany(
+        f"INSERT INTO securities ({', '.join(SECURITY_TABLE_COLUMNS)}) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (code) DO UPDATE SET name = excluded.name, sc_group = excluded.sc_group, "
+        "sc_type = excluded.sc_type, last_date = excluded.last_date "
+        "WHERE excluded.last_date >= securities.last_date",
+        security_rows)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO daily_bars ({', '.join(BAR_TABLE_COLUMNS)}) "
+        f"VALUES ({', '.join(['?'] * len(BAR_TABLE_COLUMNS))})",
+        bar_rows)
+    return len(bar_rows)
+
+
+def write_bars(conn, df):
+    """Upserts the rows of a merged day frame, see write_rows. Returns the bars written."""
+    return write_rows(conn, *frame_rows(df))
+
+
+def delete_bars_before(conn, cutoff_date):
+    """Deletes every bar dated before cutoff_date. Returns the number of bars deleted."""
+    cursor = conn.execute("DELETE FROM daily_bars WHERE date < ?", (date_key(cutoff_date),))
+    # Securities without any bars left are dropped with them
+    conn.execute("DELETE FROM securities WHERE NOT EXISTS "
+                 "(SELECT 1 FROM daily_bars b WHERE b.code = securities.code)")
+    return cursor.rowcount
+
+
+def replace_all(conn, df):
+    """Replaces the whole contents of securities/daily_bars with df."""
+    conn.execute("DELETE FROM daily_bars")
+    conn.execute("DELETE FROM securities")
+    return write_bars(conn, df)
+
+
+# Changes to the stock DB are expressed as a list of operations (plain JSON
+# values), so the ingestion job and a downloading app instance apply a day's
+# delta through the same code:
+#   {"op": "write", "securities": [...], "bars": [...]}   rows as in frame_rows
+#   {"op": "delete_before", "date": "YYYY-MM-DD"}
+#   {"op": "clear"}
+
+
+def write_op(df):
+    security_rows, bar_rows = frame_rows(df)
+    return {"op": "write", "securities": security_rows, "bars": bar_rows}
+
+
+def apply_ops(conn, ops):
+    """
+    Applies change operations inside the caller's transaction and updates
+    bars_total in meta by the rows they added or deleted. Returns the bars
+    written or deleted.
+    """
+    changed = 0
+    total = get_bars_total(conn)
+    for op in ops:
+        kind = op["op"]
+        if kind == "write":
+            # New bars only: the replaced (code, date) ones are counted before and after
+            dates = sorted({row[1] for row in op["bars"]})
+            before = bars_on(conn, dates)
+            changed += write_rows(conn, op["securities"], op["bars"])
+            total += bars_on(conn, dates) - before
+        elif kind == "delete_before":
+            deleted = delete_bars_before(conn, op["date"])
+            changed += deleted
+            total -= deleted
+        elif kind == "clear":
+            changed += conn.execute("DELETE FROM daily_bars").rowcount
+            conn.execute("DELETE FROM securities")
+            total = 0
+        else:
+            raise ValueError(f"Unknown stock DB operation: {kind}")
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('bars_total', ?)", (total,))
+    return changed
+
+
+def bar_count(conn):
+    """Full count of daily_bars (a scan of idx_bars_date); see get_bars_total for the kept one."""
+    return conn.execute("SELECT COUNT(*) FROM daily_bars").fetchone()[0]
+
+
+def bars_on(conn, dates):
+    """Bars on the given date keys, through idx_bars_date."""
+    count = 0
+    for i in range(0, len(dates), 500):
+        chunk = dates[i:i + 500]
+        count += conn.execute(f"SELECT COUNT(*) FROM daily_bars WHERE date IN ({', '.join(['?'] * len(chunk))})",
+                              chunk).fetchone()[0]
+    return count
+
+
+def get_bars_total(conn):
+    """
+    Bars in daily_bars as kept in meta by apply_ops. A database that never
+    went through apply_ops (legacy, or written with write_bars) is counted.
+    """
+    row = conn.execute("SELECT value FROM meta WHERE key = 'bars_total'").fetchone()
+    return int(row[0]) if row else bar_count(conn)
+
+
+def bar_dates(conn):
+    """
+    Every date with bars, ascending. One idx_bars_date seek per date instead of
+    a DISTINCT scan over all bars.
+    """
+    dates = []
+    date = conn.execute("SELECT MIN(date) FROM daily_bars").fetchone()[0]
+    while date is not None:
+        dates.append(date)
+        date = conn.execute("SELECT MIN(date) FROM daily_bars WHERE date > ?", (date,)).fetchone()[0]
+    return dates
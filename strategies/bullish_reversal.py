@@ -1,95 +1,77 @@
-import pandas as pd
-from database import get_db_connection
+import numpy as np
+from strategies.registry import register, Param
 
-def get_bullish_reversal_stocks():
-    conn = get_db_connection()
-    if not conn:
-        return []
+def last_bars(present, k):
+    """
+    (rows, valid) k x securities: rows[t, col] is the panel row of the
+    security's (k - t)-th last bar, so row k - 1 is its latest one. valid is
+    False where the security has fewer bars.
+    """
+    # 1 on a security's latest bar, 2 on the one before, ... and 0 where it has none
+    rank = np.cumsum(present[::-1], axis=0)[::-1] * present
+    rows = np.zeros((k, present.shape[1]), dtype=np.int64)
+    valid = np.zeros((k, present.shape[1]), dtype=bool)
+    for back in range(1, k + 1):
+        at = rank == back
+        rows[k - back] = at.argmax(axis=0)
+        valid[k - back] = at.any(axis=0)
+    return rows, valid
+
+def bars_needed(decline_days, volume_ma_days):
+    """Bars a security needs: the volume average, and today's change plus decline_days before it."""
+    return max(volume_ma_days, decline_days + 2)
 
-    try:
-        # 1. Get last 7 distinct dates
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT Date FROM stocks ORDER BY Date DESC LIMIT 7")
-        dates = [row[0] for row in cursor.fetchall()]
-        
-        if len(dates) < 5: 
-            conn.close()
-            return []
-            
-        placeholders = ','.join(['?'] * len(dates))
-        query = f"""
-            SELECT SC_CODE, SC_NAME, Date, "CLOSE", "DAY'S VOLUME", "DELV. PER." 
-            FROM stocks 
-            WHERE Date IN ({placeholders}) 
-            ORDER BY SC_CODE, Date ASC
-        """
-        
-        df = pd.read_sql_query(query, conn, params=dates)
-        
-    except Exception as e:
-        print(f"Error in bullish reversal strategy: {e}")
-        conn.close()
+@register('bullish_reversal', 'Bullish Reversal', columns=('close', 'volume', 'delivery_pct'),
+          # The bars needed plus 2 dates, for securities that missed a day
+          lookback=lambda params: bars_needed(params['decline_days'], params['volume_ma_days']) + 2,
+          params=[Param('decline_days', int, 3, 1, 20, label='Decline Days'),
+                  Param('volume_ma_days', int, 5, 2, 50, label='Volume Avg Days', arg='volume_ma'),
+                  Param('min_delivery_pct', float, 50.0, 0, 100, label='Min Delivery (%)', arg='min_delivery')],
+          description='Reversing from a decline with high volume and delivery.')
+def find_bullish_reversals(panel, decline_days=3, volume_ma_days=5, min_delivery_pct=50.0):
+    """
+    Stocks up today after falling over the previous decline_days, on volume
+    above its volume_ma_days average and delivery above min_delivery_pct.
+    Each security is judged on its own bars in the panel.
+    """
+    min_bars = bars_needed(decline_days, volume_ma_days)
+    if len(panel) < min_bars:
         return []
-        
-    conn.close()
 
-    # Data Processing
-    if 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date'])
-    
-    # Clean numeric columns
-    df['CLOSE'] = pd.to_numeric(df['CLOSE'], errors='coerce')
-    df["DAY'S VOLUME"] = pd.to_numeric(df["DAY'S VOLUME"], errors='coerce')
-    # Remove % if present and convert
-    if df["DELV. PER."].dtype == object:
-        df["DELV. PER."] = df["DELV. PER."].astype(str).str.replace('%', '', regex=False)
-    df["DELV. PER."] = pd.to_numeric(df["DELV. PER."], errors='coerce')
+    # Each security's last min_bars bars, stacked so its latest bar is the last row
+    rows, valid = last_bars(panel.present, min_bars)
+    cols = np.arange(len(panel.codes))
+    closes = panel['close'][rows, cols]
+    volumes = panel['volume'][rows, cols]
+    delivery = panel['delivery_pct'][rows[-1], cols]
+
+    # Calculate Indicators for the whole market
+    price_change = np.diff(closes, axis=0)
+    # Missing changes count 0 in the decline
+    prev_change = np.nansum(price_change[-(decline_days + 1):-1], axis=0)
+    vol_ma = volumes[-volume_ma_days:].mean(axis=0)
+
+    # Check Conditions (NaN fails every comparison, so a missing value rules a stock out)
+    with np.errstate(invalid='ignore'):
+        matches = (valid[0]
+                   & (price_change[-1] > 0)          # 1. Price Increase Today
+                   & (prev_change < 0)               # 2. Period of Decline
+                   & (volumes[-1] > vol_ma)          # 3. Volume Spike
+                   & (delivery > min_delivery_pct))  # 4. High Delivery
+    matches = np.flatnonzero(matches)
 
-    results = []
+    # Column order is SC_CODE order
+    return [{
+        'SC_CODE': sc_code,
+        'SC_NAME': sc_name,
+        'Date': panel.date_text(today),
+        'Close': close,
+        'Volume': int(volume),
+        'Delv_Per': delivery_pct
+    } for sc_code, sc_name, today, close, volume, delivery_pct in zip(
+        panel.codes[matches].tolist(), panel.names[matches], rows[-1, matches],
+        closes[-1, matches], volumes[-1, matches], delivery[matches])]
 
-    for sc_code, group in df.groupby('SC_CODE'):
-        if len(group) < 5:
-            continue
-            
-        group = group.sort_values('Date')
-        
-        # Calculate Indicators
-        group['Price_Change'] = group['CLOSE'].diff()
-        group['Vol_MA_5'] = group["DAY'S VOLUME"].rolling(window=5).mean()
-        
-        # Get Latest Record (Today)
-        today = group.iloc[-1]
-        
-        # Check Conditions
-        # 1. Price Increase Today
-        if pd.isna(today['Price_Change']) or today['Price_Change'] <= 0:
-            continue
-            
-        # 2. Period of Decline (Sum of price changes for prev 3 days)
-        # We need at least 4 records (3 prev + 1 today)
-        if len(group) < 4:
-            continue
-            
-        prev_3_days_change = group['Price_Change'].iloc[-4:-1].sum()
-        
-        if prev_3_days_change >= 0: # Must be negative (decline)
-            continue
-            
-        # 3. Volume Spike
-        if pd.isna(today['Vol_MA_5']) or today["DAY'S VOLUME"] <= today['Vol_MA_5']:
-            continue
-            
-        # 4. High Delivery
-        if pd.isna(today["DELV. PER."]) or today["DELV. PER."] <= 50:
-            continue
-            
-        results.append({
-            'SC_CODE': sc_code,
-            'SC_NAME': today['SC_NAME'],
-            'Date': today['Date'].strftime('%Y-%m-%d'),
-            'Close': today['CLOSE'],
-            'Volume': int(today["DAY'S VOLUME"]),
-            'Delv_Per': today["DELV. PER."]
-        })
-        
-    return results
+def get_bullish_reversal_stocks(min_delivery_pct=50.0, decline_days=3, volume_ma_days=5):
+    return find_bullish_reversals.strategy.run(
+        {'decline_days': decline_days, 'volume_ma_days': volume_ma_days, 'min_delivery_pct': min_delivery_pct})
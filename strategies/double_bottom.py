@@ -1,129 +1,178 @@
-import pandas as pd
-from database import get_db_connection
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from strategies.registry import register, Param
 
-def get_double_bottom_stocks(min_days=10, max_days=60, tolerance_pct=3.0, lookback_days=90, peak_prominence_pct=5.0):
-    conn = get_db_connection()
-    if not conn:
-        return []
+# Securities are scanned all at once with array operations. With
+# DOUBLE_BOTTOM_WORKERS > 1 (or workers=) they are also sharded across a pool
+# of processes; worth it only for long lookbacks on many cores, since the
+# shards have to be pickled over to the workers.
+DOUBLE_BOTTOM_WORKERS = int(os.environ.get('DOUBLE_BOTTOM_WORKERS', 0))
+# Fewer securities than this per shard are not worth a process
+MIN_SHARD_SECURITIES = 500
+
+# Local minima: the lowest close within ORDER bars on each side
+ORDER = 3
+
+_pool = None
+_pool_pid = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+def pack_bars(present, values):
+    """
+    (packed, rows, counts): each security's bars moved to the bottom of its
+    column, oldest first (packed[-1] is its latest bar). rows are the panel
+    rows of the packed bars and counts the number of bars per security; the
+    rows above them are padding.
+    """
+    # Stable: bars keep their order, below the missing dates
+    rows = np.argsort(present, axis=0, kind='stable')
+    packed = np.take_along_axis(values, rows, axis=0)
+    return packed, rows, present.sum(axis=0)
+
+def find_minima(closes, counts, order=ORDER):
+    """
+    Mask of the local minima of packed closes: a bar whose close is the
+    first lowest (np.argmin) of the window of `order` bars on each side.
+    """
+    dates = closes.shape[0]
+    minima = np.zeros(closes.shape, dtype=bool)
+    if dates < 2 * order + 1:
+        return minima
+    windows = sliding_window_view(closes, 2 * order + 1, axis=0)
+    minima[order:dates - order] = windows.argmin(axis=-1) == order
+    # The whole window has to be the security's own bars
+    minima[np.arange(dates)[:, None] < (dates - counts + order)[None, :]] = False
+    return minima
+
+def scan_double_bottoms(closes, day_numbers, counts, min_days, max_days, tolerance_pct, peak_prominence_pct):
+    """
+    Most recent double bottom of each security of packed closes (dates x
+    securities, see pack_bars) with at least max_days bars.
+
+    Returns the securities (columns) with a pattern and, per security, the
+    packed indexes of both bottoms, the prices and the neckline and
+    prominence. The pattern kept is the first passing pair when the second
+    bottom, then the first, is walked back from the latest minimum.
+    """
+    dates, securities = closes.shape
+    minima = find_minima(closes, counts)
+    minima[:, counts < max_days] = False
+
+    # All minima, security by security, oldest first
+    cols, idx = np.nonzero(minima.T)
+    days = day_numbers[idx, cols]
+
+    # Pair search, pruned by date distance: the first bottoms of minimum k are
+    # the earlier minima of its security from max_days to min_days before it
+    # (day numbers only grow, and per security are below `span`)
+    span = int(day_numbers.max() - day_numbers.min() + max_days + 1) if len(days) else 1
+    key = cols.astype(np.int64) * span + days
+    lo = np.searchsorted(key, key - max_days, side='left')
+    hi = np.minimum(np.searchsorted(key, key - min_days, side='right'), np.arange(len(key)))
+    pair_counts = np.maximum(hi - lo, 0)
+    second = np.repeat(np.arange(len(key)), pair_counts)
+    first = np.arange(pair_counts.sum()) - np.repeat(np.cumsum(pair_counts) - pair_counts - lo, pair_counts)
 
-    try:
-        # 1. Get distinct dates for lookback period
-        cursor = conn.cursor()
-        date_query = "SELECT DISTINCT Date FROM stocks ORDER BY Date DESC LIMIT ?"
-        cursor.execute(date_query, (lookback_days,))
-        dates = [row[0] for row in cursor.fetchall()]
-        
-        if len(dates) < max_days: # Need enough history
-            conn.close()
-            return []
-            
-        placeholders = ','.join(['?'] * len(dates))
-        query = f"""
-            SELECT SC_CODE, SC_NAME, Date, "CLOSE"
-            FROM stocks 
-            WHERE Date IN ({placeholders}) 
-            ORDER BY SC_CODE, Date ASC
-        """
-        
-        df = pd.read_sql_query(query, conn, params=dates)
-        
-    except Exception as e:
-        print(f"Error in double bottom strategy: {e}")
-        conn.close()
+    col = cols[second]
+    idx1, idx2 = idx[first], idx[second]
+    price1, price2 = closes[idx1, col], closes[idx2, col]
+
+    # ... then by price tolerance (NaN passes, as the comparisons did)
+    with np.errstate(invalid='ignore'):
+        keep = ~(np.abs(price1 - price2) / ((price1 + price2) / 2) * 100 > tolerance_pct) & (idx2 - idx1 > 1)
+    col, idx1, idx2, price1, price2 = col[keep], idx1[keep], idx2[keep], price1[keep], price2[keep]
+
+    # Peak in between: max of each pair's closes[idx1+1:idx2], on the flat column-major closes
+    flat = closes.T.ravel()
+    bounds = np.empty(2 * len(col), dtype=np.int64)
+    bounds[0::2] = col * dates + idx1 + 1
+    bounds[1::2] = col * dates + idx2
+    peak = np.maximum.reduceat(flat, bounds)[0::2] if len(col) else np.empty(0)
+
+    with np.errstate(invalid='ignore'):
+        min_bottom = np.where(price2 < price1, price2, price1)
+        prominence = (peak - min_bottom) / min_bottom * 100
+        keep = ~(prominence < peak_prominence_pct)
+        # Pattern invalidated by a further drop of the current price
+        keep &= ~(closes[-1, col] < min_bottom * 0.95)
+
+    # Pairs run by second bottom, then first bottom, so the last passing pair
+    # of each security is the one the backwards walk would find first
+    passing = np.flatnonzero(keep)
+    last = passing[np.append(col[passing][1:] != col[passing][:-1], True)] if len(passing) else passing
+    return (col[last], idx1[last], idx2[last], price1[last], price2[last], peak[last], prominence[last])
+
+def _scan_shard(args):
+    return scan_double_bottoms(*args)
+
+def _get_pool(workers):
+    """This process's pool of spawned processes (safe from the strategy job threads)."""
+    global _pool, _pool_pid, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid() or _pool_workers != workers:
+            if _pool is not None and _pool_pid == os.getpid():
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid, _pool_workers = os.getpid(), workers
+        return _pool
+
+@register('double_bottom', 'Double Bottom Indicator', columns=('close',),
+          lookback=lambda params: params['lookback_days'],
+          params=[Param('lookback_days', int, 90, 30, 365, label='Lookback Days', arg='lookback'),
+                  Param('min_days', int, 10, 5, 50, label='Min Days Between'),
+                  Param('max_days', int, 60, 10, 100, label='Max Days Between'),
+                  Param('tolerance_pct', float, 3.0, 0.1, 10, label='Price Tolerance (%)', arg='tolerance'),
+                  Param('peak_prominence_pct', float, 5.0, 1, 20, label='Peak Prominence (%)', arg='prominence')],
+          description='"W" patterns: two lows at about the same price, separated by a peak.')
+def find_double_bottoms(panel, min_days=10, max_days=60, tolerance_pct=3.0, lookback_days=90, peak_prominence_pct=5.0, workers=None):
+    # Lookback period of the shared market panel (no SQL per request)
+    if len(panel) < max_days: # Need enough history
         return []
-        
-    conn.close()
 
-    # Data Processing
-    if 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date'])
-    
-    df['CLOSE'] = pd.to_numeric(df['CLOSE'], errors='coerce')
+    # Each security's own bars, calendar day of each for the time distance
+    closes, rows, counts = pack_bars(panel.present, panel['close'])
+    day_numbers = panel.day_numbers[rows]
+    params = (min_days, max_days, tolerance_pct, peak_prominence_pct)
+
+    workers = DOUBLE_BOTTOM_WORKERS if workers is None else workers
+    shards = min(workers, len(panel.codes) // MIN_SHARD_SECURITIES)
+    if shards > 1:
+        bounds = np.linspace(0, len(panel.codes), shards + 1).astype(int)
+        parts = list(_get_pool(workers).map(_scan_shard, [
+            (closes[:, start:end], day_numbers[:, start:end], counts[start:end]) + params
+            for start, end in zip(bounds[:-1], bounds[1:])]))
+        found = [np.concatenate([part[0] + start for part, start in zip(parts, bounds[:-1])])]
+        found += [np.concatenate([part[k] for part in parts]) for k in range(1, 7)]
+    else:
+        found = scan_double_bottoms(closes, day_numbers, counts, *params)
 
     results = []
+    cols, idx1, idx2 = found[:3]
+    codes = panel.codes.tolist()
+    # np.round rounds like round() on each np.float64, for whole columns at once
+    for col, row1, row2, price1, price2, peak_price, prominence in zip(
+            cols.tolist(), rows[idx1, cols], rows[idx2, cols], *[np.round(values, 2) for values in found[3:]]):
+        results.append({
+            'SC_CODE': codes[col],
+            'SC_NAME': panel.names[col],
+            'Bottom1_Date': panel.date_text(row1),
+            'Bottom1_Price': price1,
+            'Bottom2_Date': panel.date_text(row2),
+            'Bottom2_Price': price2,
+            'Neckline_Price': peak_price,
+            'Prominence_Pct': prominence
+        })
 
-    for sc_code, group in df.groupby('SC_CODE'):
-        if len(group) < max_days:
-            continue
-            
-        group = group.sort_values('Date').reset_index(drop=True)
-        closes = group['CLOSE'].values
-        dates_arr = group['Date'].values
-        
-        # Find local minima manually to avoid scipy dependency
-        # Check 3 neighbors on each side
-        minima_indices = []
-        order = 3
-        
-        for i in range(order, len(closes) - order):
-            window = closes[i-order:i+order+1]
-            if np.argmin(window) == order:
-               # Also ensuring it's not just a flat bottom sequence where the middle isn't strictly smaller
-               # But for simplicity, we accept if it is the minimum in the window
-               minima_indices.append(i)
-        
-        if len(minima_indices) < 2:
-            continue
-            
-        # Check pairs of minima
-        # Iterate backwards to find most recent pattern
-        found_pattern = False
-        for i in range(len(minima_indices) - 1, 0, -1):
-            if found_pattern: break
-            
-            idx2 = minima_indices[i]
-            
-            for j in range(i - 1, -1, -1):
-                idx1 = minima_indices[j]
-                
-                date1 = pd.Timestamp(dates_arr[idx1])
-                date2 = pd.Timestamp(dates_arr[idx2])
-                price1 = closes[idx1]
-                price2 = closes[idx2]
-                
-                # Check Time Distance
-                days_diff = (date2 - date1).days
-                if days_diff < min_days:
-                    continue # Too close
-                if days_diff > max_days:
-                    continue # Too far
-                    
-                # Check Price Tolerance
-                price_diff_pct = abs(price1 - price2) / ((price1 + price2) / 2) * 100
-                if price_diff_pct > tolerance_pct:
-                    continue
-                    
-                # Check Peak in between
-                # Slice data between the two bottoms
-                intermediate_slice = closes[idx1+1:idx2]
-                if len(intermediate_slice) == 0: continue
-                
-                peak_price = np.max(intermediate_slice)
-                min_bottom = min(price1, price2)
-                
-                # Check Peak Prominence
-                prominence = (peak_price - min_bottom) / min_bottom * 100
-                if prominence < peak_prominence_pct:
-                    continue # Not deep enough "W"
-                    
-                # Optional: Check if current price is supportive
-                # (e.g., not crashed way below bottom 2)
-                current_price = closes[-1]
-                if current_price < min_bottom * 0.95:
-                    continue # Pattern invalidated by further drop
-                
-                results.append({
-                    'SC_CODE': sc_code,
-                    'SC_NAME': group.iloc[-1]['SC_NAME'],
-                    'Bottom1_Date': pd.to_datetime(date1).strftime('%Y-%m-%d'),
-                    'Bottom1_Price': round(price1, 2),
-                    'Bottom2_Date': pd.to_datetime(date2).strftime('%Y-%m-%d'),
-                    'Bottom2_Price': round(price2, 2),
-                    'Neckline_Price': round(peak_price, 2),
-                    'Prominence_Pct': round(prominence, 2)
-                })
-                found_pattern = True
-                break
-        
     return sorted(results, key=lambda x: x['Bottom2_Date'], reverse=True)
+
+def get_double_bottom_stocks(min_days=10, max_days=60, tolerance_pct=3.0, lookback_days=90, peak_prominence_pct=5.0, workers=None):
+    # workers is not a strategy param: it does not change the results
+    return find_double_bottoms.strategy.run({
+        'min_days': min_days, 'max_days': max_days, 'tolerance_pct': tolerance_pct,
+        'lookback_days': lookback_days, 'peak_prominence_pct': peak_prominence_pct, 'workers': workers})
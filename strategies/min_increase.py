@@ -1,65 +1,32 @@
-import pandas as pd
-from database import get_db_connection
+import numpy as np
+from strategies.registry import register, Param
 
-def get_min_increase_stocks(days):
-    conn = get_db_connection()
-    if not conn:
+@register('min_increase', 'Minimum N Day Increase', columns=('volume',),
+          lookback=lambda params: params['days'] + 1,
+          params=[Param('days', int, 5, 2, 10, label='Consecutive Days (N)')],
+          description='Consecutive increase in daily volume for the last N days.')
+def find_min_increase(panel, days):
+    # The last N+1 dates of the shared market panel (no SQL per request)
+    if len(panel) < days + 1:
         return []
 
-    try:
-        # Optimization: Instead of loading all data, fetch only recent data.
-        # 1. Get the last N+1 distinct dates from the database.
-        cursor = conn.cursor()
-        date_query = "SELECT DISTINCT Date FROM stocks ORDER BY Date DESC LIMIT ?"
-        cursor.execute(date_query, (days + 1,))
-        dates = [row[0] for row in cursor.fetchall()]
-        
-        if len(dates) < days + 1:
-            conn.close()
-            return []
-            
-        # 2. Fetch data only for these dates
-        placeholders = ','.join(['?'] * len(dates))
-        query = f"SELECT SC_CODE, SC_NAME, Date, \"DAY'S VOLUME\" FROM stocks WHERE Date IN ({placeholders}) ORDER BY SC_CODE, Date"
-        
-        df = pd.read_sql_query(query, conn, params=dates)
-        
-        # Ensure Date is datetime for sorting if pandas didn't convert
-        if 'Date' in df.columns:
-             df['Date'] = pd.to_datetime(df['Date'])
-             
-    except Exception as e:
-        print(f"Error in strategy: {e}")
-        conn.close()
-        return []
-        
-    conn.close()
-    
-    # Now continue with the Pandas logic on this smaller subset
-    # Sort by SC_CODE and Date (already sorted by SQL but good to verify)
-    df = df.sort_values(by=['SC_CODE', 'Date'])
-    
-    results = []
-    
-    # Group by SC_CODE
-    for sc_code, group in df.groupby('SC_CODE'):
-        if len(group) < days + 1:
-            continue
-        
-        # Get last n+1 records to compare n periods of increase
-        recent_data = group.tail(days + 1)
-        volumes = recent_data["DAY'S VOLUME"].tolist()
-        
-        # Check if strictly increasing
-        is_increasing = True
-        for i in range(len(volumes) - 1):
-            if volumes[i+1] <= volumes[i]:
-                is_increasing = False
-                break
-        
-        if is_increasing:
-            # Get latest SC_NAME
-            sc_name = group.iloc[-1]['SC_NAME']
-            results.append({'SC_CODE': sc_code, 'SC_NAME': sc_name, 'Volumes': volumes})
-            
-    return results
+    present = panel.present
+    volume = panel['volume']
+    # Volumes are ints unless some bar in the window has none (as pandas read them)
+    as_float = bool(np.isnan(volume[present]).any())
+
+    # Whole market at once: a bar on each of the N+1 dates and no day-over-day
+    # step that is <= 0. A missing volume makes its steps NaN, which do not
+    # count as a fall (as in the per-stock comparison loop this replaced).
+    falls = np.diff(volume, axis=0) <= 0
+    matches = np.flatnonzero(present.all(axis=0) & ~falls.any(axis=0))
+
+    volumes = volume[:, matches].T
+    volumes = volumes.tolist() if as_float else volumes.astype(np.int64).tolist()
+
+    # Column order is SC_CODE order
+    return [{'SC_CODE': sc_code, 'SC_NAME': sc_name, 'Volumes': recent}
+            for sc_code, sc_name, recent in zip(panel.codes[matches].tolist(), panel.names[matches], volumes)]
+
+def get_min_increase_stocks(days):
+    return find_min_increase.strategy.run({'days': days})
@@ -0,0 +1,209 @@
+import threading
+import time
+
+import numpy as np
+
+import database
+from stock_schema import key_to_text
+
+# Recent market history in memory, shared by the strategies.
+#
+# A MarketPanel holds one dense dates x securities float matrix per column
+# (NaN where a security has no bar or a NULL value) plus `present`, the mask of
+# the bars that exist. Dates (YYYYMMDD ints) ascend and codes are sorted, so
+# groupby('SC_CODE') order is column order.
+#
+# Each worker keeps one panel covering the most days and columns asked for so
+# far (asking for more grows it). When the stock DB gets a new data version it
+# is refreshed incrementally: dates dropped by a prune are cut off, and only
+# new dates plus the last REFRESH_TAIL_DAYS (re-ingested days) are read again.
+# Strategy requests then run without any SQL or parsing.
+
+# Panel column -> daily_bars column
+PANEL_COLUMNS = {
+    'close': 'close',
+    'open': 'open',
+    'high': 'high',
+    'low': 'low',
+    'volume': 'volume',
+    'delivery_pct': 'delivery_pct',
+    'turnover': 'turnover',
+}
+DEFAULT_PANEL_DAYS = 90
+REFRESH_TAIL_DAYS = 3
+
+_panel = None
+_panel_version = None
+_lock = threading.Lock()
+_stats = {"full_loads": 0, "refreshes": 0, "hits": 0, "rows_read": 0, "load_seconds": 0.0}
+
+
+class MarketPanel:
+    def __init__(self, dates, codes, names, present, columns, days=None):
+        self.dates = dates
+        self.codes = codes
+        self.names = names
+        self.present = present
+        self.columns = columns
+        # Dates asked for (the DB may have had fewer)
+        self.days = len(dates) if days is None else days
+        self.date_index = {int(date): i for i, date in enumerate(dates)}
+        self.code_index = {int(code): j for j, code in enumerate(codes)}
+        # Days since 1970-01-01, for calendar day differences
+        self.day_numbers = np.array([key_to_text(date) for date in dates], dtype='datetime64[D]').astype(np.int64)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def covers(self, days, columns):
+        return self.days >= days and set(columns) <= set(self.columns)
+
+    def tail(self, days):
+        """Panel of the last `days` dates (views, nothing is copied)."""
+        if days >= len(self.dates):
+            return self
+        start = len(self.dates) - days
+        return MarketPanel(self.dates[start:], self.codes, self.names, self.present[start:],
+                           {name: matrix[start:] for name, matrix in self.columns.items()}, days)
+
+    def date_text(self, i):
+        return key_to_text(self.dates[i])
+
+    def nbytes(self):
+        return self.present.nbytes + sum(matrix.nbytes for matrix in self.columns.values())
+
+
+def _recent_dates(conn, days):
+    rows = conn.execute("SELECT DISTINCT date FROM daily_bars ORDER BY date DESC LIMIT ?", (days,)).fetchall()
+    return np.array(sorted(row[0] for row in rows), dtype=np.int64)
+
+
+def _read_bars(conn, columns, first_date=None, last_date=None, dates=None):
+    """(codes, dates, values) arrays of the bars from first_date to last_date (or on the given dates)."""
+    select = ", ".join(["b.code", "b.date"] + [f"b.{PANEL_COLUMNS[name]}" for name in columns])
+    if dates is not None:
+        # A few dates: idx_bars_date
+        sql = f"SELECT {select} FROM daily_bars b WHERE b.date IN ({','.join(['?'] * len(dates))})"
+        params = [int(date) for date in dates]
+    else:
+        # A long range: one primary key range scan per security
+        sql = f"SELECT {select} FROM securities s JOIN daily_bars b ON b.code = s.code AND b.date BETWEEN ? AND ?"
+        params = [int(first_date), int(last_date)]
+    rows = conn.execute(sql, params).fetchall()
+    _stats["rows_read"] += len(rows)
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.empty((0, len(columns)))
+    values = np.array(rows, dtype=float)
+    return values[:, 0].astype(np.int64), values[:, 1].astype(np.int64), values[:, 2:]
+
+
+def _names(conn, codes):
+    names = dict(conn.execute("SELECT code, name FROM securities").fetchall())
+    return np.array([names.get(int(code)) for code in codes], dtype=object)
+
+
+def _build(conn, dates, columns, old=None, keep_dates=()):
+    """
+    Panel over dates. Rows of old for keep_dates are copied; every other date
+    is read from the DB.
+    """
+    keep_dates = np.array(sorted(keep_dates), dtype=np.int64)
+    read_dates = np.setdiff1d(dates, keep_dates)
+    if len(read_dates) == 0:
+        codes_read = dates_read = np.array([], dtype=np.int64)
+        values = np.empty((0, len(columns)))
+    elif len(keep_dates) == 0:
+        codes_read, dates_read, values = _read_bars(conn, columns, read_dates[0], read_dates[-1])
+    else:
+        codes_read, dates_read, values = _read_bars(conn, columns, dates=read_dates)
+
+    codes = np.unique(codes_read)
+    if old is not None and len(keep_dates):
+        codes = np.union1d(codes, old.codes)
+    present = np.zeros((len(dates), len(codes)), dtype=bool)
+    matrices = {name: np.full((len(dates), len(codes)), np.nan) for name in columns}
+
+    if old is not None and len(keep_dates):
+        rows_new = np.searchsorted(dates, keep_dates)
+        rows_old = np.searchsorted(old.dates, keep_dates)
+        cols_new = np.searchsorted(codes, old.codes)
+        present[np.ix_(rows_new, cols_new)] = old.present[rows_old]
+        for name in columns:
+            matrices[name][np.ix_(rows_new, cols_new)] = old.columns[name][rows_old]
+
+    rows = np.searchsorted(dates, dates_read)
+    cols = np.searchsorted(codes, codes_read)
+    present[rows, cols] = True
+    for k, name in enumerate(columns):
+        matrices[name][rows, cols] = values[:, k]
+    return MarketPanel(dates, codes, _names(conn, codes), present, matrices)
+
+
+def _load(conn, version, days, columns):
+    """The worker's panel for version, with at least days and columns. Call with _lock held."""
+    global _panel, _panel_version
+    if _panel is not None:
+        if _panel_version == version and _panel.covers(days, columns):
+            _stats["hits"] += 1
+            return _panel
+        # Keep what was loaded before: grow, never shrink
+        days = max(days, _panel.days)
+        columns = list(dict.fromkeys(list(_panel.columns) + list(columns)))
+
+    start = time.perf_counter()
+    dates = _recent_dates(conn, days)
+    if _panel is not None and set(columns) == set(_panel.columns) and len(_panel.dates):
+        # Same columns, new data version: re-read only new dates and the last few
+        keep = set(_panel.dates[:-REFRESH_TAIL_DAYS].tolist()) & set(dates.tolist())
+        panel = _build(conn, dates, columns, old=_panel, keep_dates=keep)
+        _stats["refreshes"] += 1
+    else:
+        panel = _build(conn, dates, columns)
+        _stats["full_loads"] += 1
+    panel.days = days
+    elapsed = time.perf_counter() - start
+    _stats["load_seconds"] += elapsed
+    print(f"Market panel loaded: {len(panel.dates)} dates x {len(panel.codes)} securities, "
+          f"{len(panel.columns)} columns, {panel.nbytes() / 1e6:.1f} MB in {elapsed:.2f}s (data version {version})")
+    _panel, _panel_version = panel, version
+    return panel
+
+
+def get_panel(days=DEFAULT_PANEL_DAYS, columns=tuple(PANEL_COLUMNS)):
+    """
+    MarketPanel of the last `days` dates of the stock DB with (at least) the
+    given columns, None if there is no stock DB.
+    """
+    unknown = set(columns) - set(PANEL_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown panel columns: {sorted(unknown)}")
+    days = int(days)
+    conn = database.get_stock_db_connection()
+    if conn is None:
+        return None
+    try:
+        version = database.get_data_version()
+        with _lock:
+            panel = _load(conn, version, days, columns)
+    finally:
+        conn.close()
+    return panel.tail(days)
+
+
+def clear_panel():
+    global _panel, _panel_version
+    with _lock:
+        _panel, _panel_version = None, None
+
+
+def get_panel_stats():
+    with _lock:
+        stats = dict(_stats, data_version=_panel_version)
+        if _panel is not None:
+            stats.update(dates=len(_panel.dates), securities=len(_panel.codes),
+                         columns=list(_panel.columns), mb=round(_panel.nbytes() / 1e6, 1))
+    stats["load_seconds"] = round(stats["load_seconds"], 3)
+    return stats
@@ -0,0 +1,168 @@
+import importlib
+import math
+import pkgutil
+import threading
+
+from strategies.panel import get_panel, PANEL_COLUMNS
+
+# Registry of the screeners. A strategy module registers its scan function,
+# which takes a MarketPanel and the params:
+#
+#     @register('min_increase', 'Minimum N Day Increase', columns=('volume',),
+#               lookback=lambda p: p['days'] + 1,
+#               params=[Param('days', int, 5, 2, 10, label='Consecutive Days (N)')])
+#     def find_min_increase(panel, days):
+#         ...
+#
+# The declaration is all the app needs: query args are parsed and bounded by
+# the param schema, and the panel is loaded for the declared columns and
+# lookback. Several strategies run on one panel load (the union of their
+# columns over the longest lookback), which is what the run-all view does.
+# Modules of the strategies package are imported on first use, so a new
+# screener is just a new module.
+
+# Name of the run of every strategy at once
+ALL_STRATEGIES = 'all'
+
+STRATEGIES = {}
+_loaded = False
+_lock = threading.Lock()
+
+
+class Param:
+    """
+    A strategy parameter: keyword `name` of the scan function, read from the
+    query arg `arg` (default: name) as `type` and clamped to [min, max].
+    """
+    def __init__(self, name, type, default, min=None, max=None, label=None, arg=None, step=None):
+        self.name = name
+        self.type = type
+        self.default = default
+        self.min = min
+        self.max = max
+        self.label = label or name
+        self.arg = arg or name
+        self.step = step if step is not None else (1 if type is int else 0.1)
+
+    def parse(self, raw):
+        """Value of a query arg: the default if missing or not a number, else bounded."""
+        if raw is None or str(raw).strip() == '':
+            return self.default
+        try:
+            value = float(raw)
+        except ValueError:
+            return self.default
+        if not math.isfinite(value):
+            return self.default
+        if self.min is not None:
+            value = max(value, self.min)
+        if self.max is not None:
+            value = min(value, self.max)
+        return self.type(value)
+
+
+class Strategy:
+    def __init__(self, name, title, scan, params, columns, lookback, description=''):
+        unknown = set(columns) - set(PANEL_COLUMNS)
+        if unknown:
+            raise ValueError(f"Strategy {name} needs unknown panel columns: {sorted(unknown)}")
+        self.name = name
+        self.title = title
+        self.scan = scan
+        self.params = list(params)
+        self.columns = tuple(columns)
+        # Dates of history needed: a number, or a function of the params
+        self.lookback = lookback
+        self.description = description
+
+    def parse_params(self, args):
+        """Scan keyword arguments from the query args (a dict or request.args)."""
+        return {param.name: param.parse(args.get(param.arg)) for param in self.params}
+
+    def default_params(self):
+        return {param.name: param.default for param in self.params}
+
+    def lookback_days(self, params):
+        return int(self.lookback(params) if callable(self.lookback) else self.lookback)
+
+    def run(self, params, panel=None):
+        """
+        Results of the scan with params, on panel (any panel with the columns
+        and at least the lookback) or on a panel loaded for this strategy alone.
+        """
+        days = self.lookback_days(params)
+        if panel is None:
+            try:
+                panel = get_panel(days, self.columns)
+            except Exception as e:
+                print(f"Error in {self.title} strategy: {e}")
+                return []
+        if panel is None:
+            return []
+        return self.scan(panel.tail(days), **params)
+
+
+def register(name, title, columns, lookback, params=(), description=''):
+    """Decorator registering a scan function as strategy `name` (it is then also scan.strategy)."""
+    if name == ALL_STRATEGIES:
+        raise ValueError(f"'{ALL_STRATEGIES}' is reserved for the run of every strategy")
+
+    def wrap(scan):
+        strategy = Strategy(name, title, scan, params, columns, lookback, description)
+        STRATEGIES[name] = strategy
+        scan.strategy = strategy
+        return scan
+    return wrap
+
+
+def get_strategies():
+    """Registered strategies by name, after importing the modules of the strategies package."""
+    global _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                import strategies
+                for module in pkgutil.iter_modules(strategies.__path__):
+                    if module.name not in ('panel', 'registry'):
+                        importlib.import_module(f"strategies.{module.name}")
+                _loaded = True
+    return STRATEGIES
+
+
+def get_strategy(name):
+    return get_strategies().get(name)
+
+
+def run_strategies(runs):
+    """
+    {name: results} of the (strategy, params) runs, all on one panel load: the
+    union of their columns over the longest lookback.
+    """
+    runs = list(runs)
+    if not runs:
+        return {}
+    days = max(strategy.lookback_days(params) for strategy, params in runs)
+    columns = list(dict.fromkeys(column for strategy, _ in runs for column in strategy.columns))
+    try:
+        panel = get_panel(days, columns)
+    except Exception as e:
+        print(f"Error loading the market panel for the strategies: {e}")
+        return {strategy.name: [] for strategy, _ in runs}
+    if panel is None:
+        return {strategy.name: [] for strategy, _ in runs}
+    return {strategy.name: strategy.run(params, panel) for strategy, params in runs}
+
+
+def matches_by_stock(results):
+    """
+    Stocks found by any of the strategies of run_strategies results, with the
+    strategies that found each: most matches first, then SC_CODE order.
+    """
+    stocks = {}
+    for name, found in results.items():
+        for result in found:
+            stock = stocks.setdefault(result['SC_CODE'], {'SC_CODE': result['SC_CODE'],
+                                                          'SC_NAME': result['SC_NAME'], 'Matches': []})
+            if name not in stock['Matches']:
+                stock['Matches'].append(name)
+    return sorted(stocks.values(), key=lambda stock: (-len(stock['Matches']), stock['SC_CODE']))
@@ -0,0 +1,290 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import database
+
+# Cache of strategy results. The stock data changes once a day, so a result is
+# keyed on (strategy name, normalized params, data version of the stock DB)
+# and stays valid until the next ingestion writes a new data version; entries of
+# older versions are then dropped.
+#
+# Two tiers:
+#   memory  per worker LRU, bounded by the pickled size of the results
+#   disk    optional SQLite file shared by the gunicorn workers (and restarts),
+#           so a screener runs once per data version, not once per worker
+
+STRATEGY_CACHE_BYTES = int(os.environ.get('STRATEGY_CACHE_BYTES', 32 * 1024 * 1024))
+# Shared tier; set to '' to keep the cache per worker
+STRATEGY_CACHE_DB = os.environ.get('STRATEGY_CACHE_DB', 'strategy_cache.db')
+# Rows kept in the shared tier (all of the current data version)
+STRATEGY_CACHE_DISK_ENTRIES = 512
+# A run still marked in flight after this long is from a worker that died
+STRATEGY_RUN_STALE_S = 900
+# How long a failed run is reported to the other workers (until a retry)
+STRATEGY_RUN_FAILED_KEEP_S = 600
+
+_memory = OrderedDict()  # key -> (result, size)
+_memory_bytes = 0
+_version = None
+_lock = threading.Lock()
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+          "uncacheable": 0, "compute_seconds": 0.0}
+
+DISK_DDL = """
+    CREATE TABLE IF NOT EXISTS strategy_results (
+        key TEXT PRIMARY KEY,
+        data_version INTEGER NOT NULL,
+        result BLOB NOT NULL,
+        created REAL NOT NULL
+    )
+"""
+
+# Runs in flight (or failed) in some worker, so the other workers wait for them
+# instead of starting the same screener
+RUNS_DDL = """
+    CREATE TABLE IF NOT EXISTS strategy_runs (
+        key TEXT PRIMARY KEY,
+        data_version INTEGER NOT NULL,
+        owner TEXT NOT NULL,
+        state TEXT NOT NULL,
+        error TEXT,
+        updated REAL NOT NULL
+    )
+"""
+
+
+def normalize_params(params):
+    """Hashable form of the params: sorted items, numbers as floats (5 and 5.0 are the same run)."""
+    items = []
+    for key, value in sorted((params or {}).items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        items.append((key, value))
+    return tuple(items)
+
+
+def cache_key(name, params, version):
+    return (name, normalize_params(params), version)
+
+
+def _disk_key(key):
+    return repr(key)
+
+
+def _connect_disk():
+    conn = sqlite3.connect(STRATEGY_CACHE_DB, timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(DISK_DDL)
+    conn.execute(RUNS_DDL)
+    return conn
+
+
+def _disk_get(key):
+    if not STRATEGY_CACHE_DB:
+        return None
+    try:
+        conn = _connect_disk()
+        try:
+            row = conn.execute("SELECT result FROM strategy_results WHERE key = ?", (_disk_key(key),)).fetchone()
+        finally:
+            conn.close()
+        return pickle.loads(row[0]) if row else None
+    except (sqlite3.Error, pickle.UnpicklingError) as e:
+        print(f"Strategy cache (disk) read failed: {e}")
+        return None
+
+
+def _disk_put(key, blob):
+    if not STRATEGY_CACHE_DB:
+        return
+    try:
+        conn = _connect_disk()
+        try:
+            with conn:
+                conn.execute("DELETE FROM strategy_results WHERE data_version < ?", (key[2],))
+                conn.execute("INSERT OR REPLACE INTO strategy_results (key, data_version, result, created) "
+                             "VALUES (?, ?, ?, ?)", (_disk_key(key), key[2], blob, time.time()))
+                conn.execute("DELETE FROM strategy_results WHERE key NOT IN "
+                             "(SELECT key FROM strategy_results ORDER BY created DESC LIMIT ?)",
+                             (STRATEGY_CACHE_DISK_ENTRIES,))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Strategy cache (disk) write failed: {e}")
+
+
+def _check_version(version):
+    """
+    Drops the memory tier when a newer data version shows up. Call with _lock held.
+    (A thread still reading the previous snapshot does not flush the new entries.)
+    """
+    global _version, _memory_bytes
+    if _version is None or version > _version:
+        if _memory:
+            _stats["invalidations"] += 1
+        _memory.clear()
+        _memory_bytes = 0
+        _version = version
+
+
+def _memory_put(key, result, size):
+    global _memory_bytes
+    if size > STRATEGY_CACHE_BYTES:
+        return
+    if key in _memory:
+        _memory_bytes -= _memory.pop(key)[1]
+    _memory[key] = (result, size)
+    _memory_bytes += size
+    while _memory_bytes > STRATEGY_CACHE_BYTES:
+        _memory_bytes -= _memory.popitem(last=False)[1][1]
+        _stats["evictions"] += 1
+
+
+def _lookup(key):
+    version = key[2]
+    with _lock:
+        _check_version(version)
+        if key in _memory:
+            _memory.move_to_end(key)
+            _stats["hits"] += 1
+            return _memory[key][0]
+
+    result = _disk_get(key)
+    if result is not None:
+        blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with _lock:
+            _stats["disk_hits"] += 1
+            if version == _version:
+                _memory_put(key, result, len(blob))
+    return result
+
+
+def lookup(name, params, version=None):
+    """Cached result of the strategy run with params for this data version, None if there is none."""
+    if version is None:
+        version = database.get_data_version()
+        if version is None:
+            return None
+    return _lookup(cache_key(name, params, version))
+
+
+def cached_strategy(name, params, compute):
+    """
+    Result of compute() (the strategy run with params), from the cache if this
+    data version already has it. Without a stock DB version nothing is cached.
+    """
+    version = database.get_data_version()
+    if version is None:
+        with _lock:
+            _stats["uncacheable"] += 1
+        return compute()
+
+    key = cache_key(name, params, version)
+    result = _lookup(key)
+    if result is not None:
+        return result
+
+    start = time.perf_counter()
+    result = compute()
+    elapsed = time.perf_counter() - start
+    blob = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    with _lock:
+        _stats["misses"] += 1
+        _stats["compute_seconds"] += elapsed
+        if version == _version:
+            _memory_put(key, result, len(blob))
+    _disk_put(key, blob)
+    return result
+
+
+def claim_run(name, params, version, owner, retry=False):
+    """
+    Marks the run of the strategy with params as in flight by owner in the
+    shared tier. Returns None when owner may run it (also without a shared
+    tier), else (state, error) of the run another worker has: 'running', or
+    'failed' until STRATEGY_RUN_FAILED_KEEP_S has passed or retry is set.
+    """
+    if not STRATEGY_CACHE_DB or version is None:
+        return None
+    key = cache_key(name, params, version)
+    now = time.time()
+    try:
+        conn = _connect_disk()
+        try:
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM strategy_runs WHERE data_version < ?", (version,))
+                row = conn.execute("SELECT owner, state, error, updated FROM strategy_runs WHERE key = ?",
+                                   (_disk_key(key),)).fetchone()
+                if row is not None and row[0] != owner:
+                    state, error, updated = row[1:]
+                    if (state == 'running' and updated > now - STRATEGY_RUN_STALE_S) or \
+                            (state == 'failed' and not retry and updated > now - STRATEGY_RUN_FAILED_KEEP_S):
+                        conn.execute("COMMIT")
+                        return state, error
+                conn.execute("INSERT OR REPLACE INTO strategy_runs (key, data_version, owner, state, error, updated) "
+                             "VALUES (?, ?, ?, 'running', NULL, ?)", (_disk_key(key), version, owner, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Strategy cache (disk) run claim failed: {e}")
+    return None
+
+
+def finish_run(name, params, version, owner, error=None):
+    """
+    Ends owner's run in the shared tier: the marker goes (the result is in the
+    cache by now), or stays as 'failed' with the error.
+    """
+    if not STRATEGY_CACHE_DB or version is None:
+        return
+    key = _disk_key(cache_key(name, params, version))
+    try:
+        conn = _connect_disk()
+        try:
+            with conn:
+                if error is None:
+                    conn.execute("DELETE FROM strategy_runs WHERE key = ? AND owner = ?", (key, owner))
+                else:
+                    conn.execute("UPDATE strategy_runs SET state = 'failed', error = ?, updated = ? "
+                                 "WHERE key = ? AND owner = ?", (error, time.time(), key, owner))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Strategy cache (disk) run update failed: {e}")
+
+
+def clear_strategy_cache():
+    """Empties both tiers (e.g. after changing a strategy's code)."""
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+    if STRATEGY_CACHE_DB:
+        try:
+            conn = _connect_disk()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM strategy_results")
+                    conn.execute("DELETE FROM strategy_runs")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Strategy cache (disk) clear failed: {e}")
+
+
+def get_strategy_cache_stats():
+    with _lock:
+        stats = dict(_stats, entries=len(_memory), bytes=_memory_bytes, data_version=_version)
+    stats["compute_seconds"] = round(stats["compute_seconds"], 3)
+    stats["disk"] = STRATEGY_CACHE_DB or None
+    return stats
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import strategy_cache
+
+# Strategy runs in the background, so a slow screener (double_bottom over a
+# long lookback) does not hold a gunicorn worker for the whole request.
+#
+# Jobs run on a small thread pool per worker process. The job id is derived
+# from (strategy, normalized params, data version), so identical submissions
+# share one job; finished jobs are kept for STRATEGY_JOB_KEEP_S. A failed job
+# is reported as such until it is retried explicitly (submit(retry=True)).
+# The results go through strategy_cache as well, so a worker that did not run
+# the job still finds them once it is done (shared disk tier). Before starting
+# a job, a worker claims the run in that tier; when another worker already has
+# it, it waits for that one instead of running the screener again.
+
+STRATEGY_JOBS = os.environ.get('STRATEGY_JOBS', '1') == '1'
+STRATEGY_JOB_WORKERS = int(os.environ.get('STRATEGY_JOB_WORKERS', 2))
+# Queued + running jobs per worker process; further submissions are refused
+STRATEGY_JOB_QUEUE = int(os.environ.get('STRATEGY_JOB_QUEUE', 8))
+STRATEGY_JOB_KEEP_S = 600
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_jobs = {}
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_stats = {"submitted": 0, "deduplicated": 0, "elsewhere": 0, "rejected": 0, "completed": 0, "failed": 0,
+          "run_seconds": 0.0, "max_run_seconds": 0.0, "queue_seconds": 0.0}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class StrategyJob:
+    def __init__(self, job_id, name, params, version):
+        self.id = job_id
+        self.name = name
+        self.params = params
+        self.version = version
+        # Stand-in for a run claimed by another worker process
+        self.elsewhere = False
+        self.state = QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    @property
+    def active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    def to_dict(self, with_result=False):
+        now = time.time()
+        data = {
+            "id": self.id,
+            "strategy": self.name,
+            "params": self.params,
+            "state": self.state,
+            "queue_seconds": round((self.started or now) - self.submitted, 3),
+            "run_seconds": round((self.finished or now) - self.started, 3) if self.started else None,
+            "result_count": len(self.result) if self.result is not None else None,
+            "error": self.error,
+            "elsewhere": self.elsewhere,
+        }
+        if with_result:
+            data["result"] = self.result
+        return data
+
+
+def job_id_for(name, params, version):
+    return hashlib.sha1(repr(strategy_cache.cache_key(name, params, version)).encode()).hexdigest()[:16]
+
+
+def _owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _get_executor():
+    """This process's pool (a pool inherited through a fork has no threads)."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=STRATEGY_JOB_WORKERS, thread_name_prefix="strategy-job")
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def _prune():
+    """Drops finished jobs older than STRATEGY_JOB_KEEP_S. Call with _lock held."""
+    cutoff = time.time() - STRATEGY_JOB_KEEP_S
+    for job_id in [job_id for job_id, job in _jobs.items() if not job.active and job.finished < cutoff]:
+        del _jobs[job_id]
+
+
+def _run(job, compute):
+    job.started = time.time()
+    job.state = RUNNING
+    try:
+        result = strategy_cache.cached_strategy(job.name, job.params, compute)
+    except Exception as e:
+        print(f"Strategy job {job.id} ({job.name}) failed: {e}")
+        job.error = str(e)
+        result = None
+    strategy_cache.finish_run(job.name, job.params, job.version, _owner(), job.error)
+    job.finished = time.time()
+    run_seconds = job.finished - job.started
+    with _lock:
+        job.result = result
+        job.state = FAILED if job.error else DONE
+        _stats["failed" if job.error else "completed"] += 1
+        _stats["run_seconds"] += run_seconds
+        _stats["queue_seconds"] += job.started - job.submitted
+        _stats["max_run_seconds"] = max(_stats["max_run_seconds"], run_seconds)
+    print(f"Strategy job {job.id} ({job.name}) {job.state} in {run_seconds:.2f}s")
+
+
+def submit(name, params, compute, retry=False):
+    """
+    The job running compute() for the strategy with params: an existing one
+    for the same run (queued, running or recently finished, failed included
+    unless retry is set), else a new one. When another worker process has
+    claimed the run, a stand-in job with that run's state is returned and
+    nothing starts here.
+    Raises JobQueueFull when this worker already has STRATEGY_JOB_QUEUE jobs.
+    """
+    version = database.get_data_version()
+    job_id = job_id_for(name, params, version)
+    with _lock:
+        _prune()
+        job = _jobs.get(job_id)
+        if job is not None and not (retry and job.state == FAILED):
+            _stats["deduplicated"] += 1
+            return job
+        if sum(1 for job in _jobs.values() if job.active) >= STRATEGY_JOB_QUEUE:
+            _stats["rejected"] += 1
+            raise JobQueueFull(f"{STRATEGY_JOB_QUEUE} strategy jobs are already queued or running")
+        other = strategy_cache.claim_run(name, params, version, _owner(), retry)
+        if other is not None:
+            _stats["elsewhere"] += 1
+            job = StrategyJob(job_id, name, params, version)
+            job.state, job.error = other
+            job.elsewhere = True
+            if job.state == FAILED:
+                job.finished = job.submitted
+            return job
+        job = StrategyJob(job_id, name, params, version)
+        _jobs[job_id] = job
+        _stats["submitted"] += 1
+    _get_executor().submit(_run, job, compute)
+    return job
+
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def get_strategy_job_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["active"] = sum(1 for job in _jobs.values() if job.active)
+        stats["kept"] = len(_jobs)
+    for key in ("run_seconds", "max_run_seconds", "queue_seconds"):
+        stats[key] = round(stats[key], 3)
+    stats["workers"] = STRATEGY_JOB_WORKERS
+    return stats
@@ -0,0 +1,162 @@
+import os
+import io
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# Synthetic daily source files for offline testing and benchmarks:
+#   SCBSEALLDDMM.TXT  - BSE delivery data, pipe delimited, zero-padded 16 digit quantities
+#   YYYYMMDD_BSE.csv  - Samco BSE bhavcopy, comma delimited
+#
+# The files match the real layouts (see StockData/) closely enough to go through
+# bhav_parser and merge_and_accumulate unchanged. A fixed universe of securities
+# follows a seeded random walk, so the same seed always produces the same files.
+
+DEFAULT_SECURITIES = 4800
+GROUPS = np.array(['A', 'B', 'T', 'X', 'XT', 'Z', 'M', 'MT'])
+GROUP_WEIGHTS = np.array([0.12, 0.22, 0.10, 0.20, 0.12, 0.12, 0.06, 0.06])
+NAME_WORDS = np.array(['INDIA', 'INDUSTRIES', 'FINANCE', 'PHARMA', 'STEEL', 'TEXTILES', 'POWER',
+                       'CHEMICALS', 'INFRA', 'MOTORS', 'FOODS', 'CAPITAL', 'TECH', 'ENERGY', 'AGRO'])
+BSE_COLUMNS = ['DATE', 'SCRIP CODE', 'DELIVERY QTY', 'DELIVERY VAL', "DAY'S VOLUME", "DAY'S TURNOVER",
+               'DELV. PER.']
+SAMCO_COLUMNS = ['SC_CODE', 'SC_NAME', 'SC_GROUP', 'SC_TYPE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'LAST',
+                 'PREVCLOSE', 'NO_TRADES', 'NO_OF_SHRS', 'NET_TURNOV', 'TDCLOINDI']
+
+
+def trading_days_ending(end_date, count):
+    """The last `count` weekdays up to and including end_date, oldest first."""
+    days = []
+    current = end_date
+    while len(days) < count:
+        if current.weekday() < 5:
+            days.append(current)
+        current -= datetime.timedelta(days=1)
+    return days[::-1]
+
+
+class SyntheticBhavcopy:
+    """
+    Generates one trading day of BSE + Samco files at a time for a fixed
+    universe of n_securities. Days must be requested in date order: each call
+    moves the price random walk forward by one day.
+    """
+
+    def __init__(self, n_securities=DEFAULT_SECURITIES, seed=42):
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+        n = n_securities
+        self.codes = np.sort(rng.choice(np.arange(500001, 545000), size=n, replace=False))
+        words = rng.choice(NAME_WORDS, size=(n, 2))
+        self.names = np.array([f"SYN{i:05d} {a} {b} LTD" for i, (a, b) in enumerate(words)])
+        self.groups = rng.choice(GROUPS, size=n, p=GROUP_WEIGHTS)
+        self.close = np.round(np.exp(rng.normal(5.0, 1.5, size=n)).clip(1, 90000), 2)
+        # Typical traded volume per security, heavy-tailed like the real market
+        self.volume_scale = np.exp(rng.normal(8.5, 2.0, size=n)).clip(1, 5e7)
+
+    def _next_day(self, current_date):
+        rng = self.rng
+        n = len(self.codes)
+        prev_close = self.close
+        returns = rng.normal(0.0005, 0.02, size=n).clip(-0.2, 0.2)
+        close = np.round((prev_close * (1 + returns)).clip(0.5, None), 2)
+        open_ = np.round(prev_close * (1 + rng.normal(0, 0.005, size=n)), 2).clip(0.5, None)
+        high = np.round(np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, size=n))), 2)
+        low = np.round(np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, size=n))), 2).clip(0.01, None)
+        last = np.round(close * (1 + rng.normal(0, 0.001, size=n)), 2).clip(0.01, None)
+        self.close = close
+
+        shares = np.maximum(1, (self.volume_scale * rng.lognormal(0, 0.5, size=n)).astype(np.int64))
+        trades = np.maximum(1, (shares / rng.uniform(5, 50, size=n)).astype(np.int64))
+        turnover = np.maximum(1, (shares * close).astype(np.int64))
+        delivery_pct = np.round(rng.uniform(5, 100, size=n), 2)
+        delivery_qty = np.maximum(1, (shares * delivery_pct / 100).astype(np.int64))
+        delivery_val = np.maximum(1, (delivery_qty * close).astype(np.int64))
+
+        samco = pd.DataFrame({
+            'SC_CODE': self.codes,
+            'SC_NAME': self.names,
+            'SC_GROUP': self.groups,
+            'SC_TYPE': 'STK',
+            'OPEN': open_,
+            'HIGH': high,
+            'LOW': low,
+            'CLOSE': close,
+            'LAST': last,
+            'PREVCLOSE': prev_close,
+            'NO_TRADES': trades,
+            'NO_OF_SHRS': shares,
+            'NET_TURNOV': turnover,
+            'TDCLOINDI': '',
+        }, columns=SAMCO_COLUMNS)
+
+        bse = pd.DataFrame({
+            'DATE': current_date.strftime('%d%m%Y'),
+            'SCRIP CODE': self.codes,
+            'DELIVERY QTY': delivery_qty,
+            'DELIVERY VAL': delivery_val,
+            "DAY'S VOLUME": shares,
+            "DAY'S TURNOVER": turnover,
+            'DELV. PER.': delivery_pct,
+        }, columns=BSE_COLUMNS)
+        # Not every traded security has delivery data on a given day
+        bse = bse[rng.random(n) > 0.01]
+        return bse, samco
+
+    def day_files(self, current_date):
+        """
+        Generates the next trading day.
+        Returns (bse_file_name, bse_bytes, samco_file_name, samco_bytes).
+        """
+        bse, samco = self._next_day(current_date)
+
+        bse_text = io.StringIO()
+        bse_text.write('|'.join(BSE_COLUMNS) + '\n')
+        for col in ['DELIVERY QTY', 'DELIVERY VAL', "DAY'S VOLUME", "DAY'S TURNOVER"]:
+            bse[col] = bse[col].astype(str).str.zfill(16)
+        bse['DELV. PER.'] = bse['DELV. PER.'].map('{:06.2f}'.format)
+        bse.to_csv(bse_text, sep='|', header=False, index=False)
+
+        samco_text = io.StringIO()
+        samco.to_csv(samco_text, index=False)
+
+        bse_name = f"SCBSEALL{current_date.strftime('%d%m')}.TXT"
+        samco_name = f"{current_date.strftime('%Y%m%d')}_BSE.csv"
+        return bse_name, bse_text.getvalue().encode(), samco_name, samco_text.getvalue().encode()
+
+    def write_day(self, current_date, out_dir):
+        """Generates the next trading day into out_dir. Returns (bse_file_name, samco_path)."""
+        bse_name, bse_bytes, samco_name, samco_bytes = self.day_files(current_date)
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, bse_name), 'wb') as f:
+            f.write(bse_bytes)
+        samco_path = os.path.join(out_dir, samco_name)
+        with open(samco_path, 'wb') as f:
+            f.write(samco_bytes)
+        return bse_name, samco_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic BSE + Samco daily files for offline testing.")
+    parser.add_argument("--out", type=str, default="SyntheticData", help="Output directory")
+    parser.add_argument("--days", type=int, default=5, help="Number of trading days")
+    parser.add_argument("--end", type=str, default="2026-02-13", help="Last trading day YYYY-MM-DD")
+    parser.add_argument("--securities", type=int, default=DEFAULT_SECURITIES, help="Securities per day")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    end = datetime.datetime.strptime(args.end, "%Y-%m-%d")
+    days = trading_days_ending(end, args.days)
+    if len(days) > 1 and (days[-1] - days[0]).days >= 365:
+        # SCBSEALLDDMM.TXT has no year in its name
+        print("Warning: more than a year of days, older BSE files will be overwritten.")
+
+    generator = SyntheticBhavcopy(args.securities, seed=args.seed)
+    for current in days:
+        bse_name, samco_path = generator.write_day(current, args.out)
+        print(f"Wrote {bse_name} and {os.path.basename(samco_path)}")
+
+
+if __name__ == "__main__":
+    main()
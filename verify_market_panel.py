@@ -0,0 +1,100 @@
+import io
+import os
+import sys
+import contextlib
+import shutil
+import tempfile
+import numpy as np
+sys.path.append(os.getcwd())
+
+import database
+import daily_update
+from strategies import panel as market_panel
+from strategies.double_bottom import get_double_bottom_stocks
+from synthetic_bhavcopy import SyntheticBhavcopy, trading_days_ending
+
+# Offline check of the shared market panel: a stock DB is built from
+# synthetic bhavcopies in a temp dir, then grown and pruned through the
+# ingestion snapshot path while the panel is in use.
+
+DAYS = trading_days_ending(daily_update.datetime.datetime(2026, 2, 13), 14)
+
+
+def day_frame(generator, current):
+    _, bse_bytes, _, samco_bytes = generator.day_files(current)
+    return daily_update.parse_day_frame(io.BytesIO(bse_bytes), io.BytesIO(samco_bytes), current)
+
+
+def same_panel(a, b):
+    return (np.array_equal(a.dates, b.dates) and np.array_equal(a.codes, b.codes)
+            and np.array_equal(a.present, b.present) and list(a.names) == list(b.names)
+            and set(a.columns) == set(b.columns)
+            and all(np.array_equal(a[name], b[name], equal_nan=True) for name in a.columns))
+
+
+def test_market_panel():
+    print("Testing shared market panel...", flush=True)
+    work_dir = tempfile.mkdtemp(prefix="market_panel_")
+    database.DB_PATH = os.path.join(work_dir, "stock_data.db")
+    generator = SyntheticBhavcopy(200)
+    columns = tuple(market_panel.PANEL_COLUMNS)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for current in DAYS[:12]:
+                daily_update.upsert_stock_rows(day_frame(generator, current), database.DB_PATH)
+            panel = market_panel.get_panel(10, columns)
+
+        # 1. Dense matrices match the DB
+        conn = database.get_stock_db_connection()
+        code, date, close = conn.execute("SELECT code, date, close FROM daily_bars ORDER BY date DESC, code LIMIT 1").fetchone()
+        bars = conn.execute("SELECT COUNT(*) FROM daily_bars WHERE date >= ?", (int(panel.dates[0]),)).fetchone()[0]
+        conn.close()
+        i, j = panel.date_index[date], panel.code_index[code]
+        if len(panel) == 10 and panel['close'][i, j] == close and panel.present.sum() == bars:
+            print(f"Panel load: SUCCESS ({len(panel)} dates x {len(panel.codes)} securities, {bars} bars)", flush=True)
+        else:
+            print(f"Panel load: FAILED (dates={len(panel)}, bars={panel.present.sum()}/{bars})", flush=True)
+
+        # 2. Strategy requests on a loaded panel run no SQL at all
+        with contextlib.redirect_stdout(io.StringIO()):
+            get_double_bottom_stocks(min_days=2, max_days=8, lookback_days=10)
+        statements = []
+        conn = database.get_stock_db_connection()
+        conn.set_trace_callback(statements.append)
+        try:
+            get_double_bottom_stocks(min_days=2, max_days=8, lookback_days=10)
+        finally:
+            conn.set_trace_callback(None)
+        print(f"No SQL per request: {'SUCCESS' if not statements else 'FAILED'} ({statements})", flush=True)
+
+        # 3. A new day and a prune refresh the panel incrementally, same as a fresh load
+        before = market_panel.get_panel_stats()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for current in DAYS[12:]:
+                daily_update.upsert_stock_rows(day_frame(generator, current), database.DB_PATH)
+            daily_update.delete_stock_dates_before(database.DB_PATH, DAYS[4].strftime("%Y-%m-%d"))
+            refreshed = market_panel.get_panel(10, columns)
+            stats = market_panel.get_panel_stats()
+            market_panel.clear_panel()
+            fresh = market_panel.get_panel(10, columns)
+        rows_read = stats["rows_read"] - before["rows_read"]
+        if stats["refreshes"] == before["refreshes"] + 1 and same_panel(refreshed, fresh) \
+                and refreshed.dates[-1] == int(DAYS[-1].strftime("%Y%m%d")) and rows_read < fresh.present.sum():
+            print(f"Incremental refresh: SUCCESS (read {rows_read} of {fresh.present.sum()} bars, "
+                  f"data version {stats['data_version']})", flush=True)
+        else:
+            print(f"Incremental refresh: FAILED (stats={stats}, same={same_panel(refreshed, fresh)})", flush=True)
+    finally:
+        market_panel.clear_panel()
+        conn = getattr(database._stock_local, "conn", None)
+        if conn is not None:
+            conn.close_for_real()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_market_panel()
+    except Exception as e:
+        print(f"Test crashed: {e}", flush=True)
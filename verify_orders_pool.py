@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+sys.path.append(os.getcwd())
+
+import orders_db
+
+# Offline check of the pooled orders layer on a temporary SQLite orders.db.
+# The PostgreSQL side is only checked for the statements it would send.
+
+
+def test_orders_pool():
+    print("Testing orders pool...", flush=True)
+    work_dir = tempfile.mkdtemp(prefix="orders_pool_")
+    os.environ.pop('DATABASE_URL', None)
+    orders_db.ORDERS_DB_PATH = os.path.join(work_dir, "orders.db")
+    orders_db._pool = None
+
+    try:
+        # 1. CRUD through the pool
+        orders_db.init_orders_table()
+        orders_db.add_order("rahul", "500325", "RELIANCE", 10, "2026-01-02")
+        orders = orders_db.list_orders("rahul")
+        order_id = orders[0]["id"]
+        other_user = orders_db.delete_order(order_id, "snehashish")
+        fetched = orders_db.get_order(order_id, "rahul")
+        deleted = orders_db.delete_order(order_id, "rahul")
+        if len(orders) == 1 and fetched and not other_user and deleted and not orders_db.list_orders("rahul"):
+            print("Order CRUD: SUCCESS", flush=True)
+        else:
+            print(f"Order CRUD: FAILED (orders={orders}, other_user={other_user}, deleted={deleted})", flush=True)
+
+        stats = orders_db.get_orders_pool_stats()
+        if stats["created"] == 1 and stats["reused"] == stats["acquired"] - 1 and stats["in_use"] == 0:
+            print(f"Connection reuse: SUCCESS ({stats['acquired']} acquires, 1 connection)", flush=True)
+        else:
+            print(f"Connection reuse: FAILED ({stats})", flush=True)
+
+        # 2. Bounded: a second caller waits for the only connection, a third times out
+        pool = orders_db.OrdersPool(orders_db._connect_sqlite(orders_db.ORDERS_DB_PATH), orders_db.SQLITE,
+                                    max_size=1, timeout=0.5)
+        held = pool.acquire()
+        waited = []
+
+        def waiter():
+            conn = pool.acquire()
+            waited.append(conn)
+            pool.release(conn)
+
+        t = threading.Thread(target=waiter)
+        t.start()
+        time.sleep(0.2)
+        pool.release(held)
+        t.join()
+        held = pool.acquire()
+        try:
+            pool.acquire()
+            timed_out = False
+        except orders_db.OrdersPoolTimeout:
+            timed_out = True
+        pool.release(held, broken=True)
+        stats = pool.stats()
+        if waited and timed_out and stats["waits"] == 1 and stats["timeouts"] == 1 and stats["open"] == 0:
+            print(f"Bounded pool: SUCCESS (max_wait_s={stats['max_wait_s']}, discarded={stats['discarded']})",
+                  flush=True)
+        else:
+            print(f"Bounded pool: FAILED ({stats})", flush=True)
+
+        # 3. PostgreSQL statements
+        prepared = orders_db.prepare_sql("get_order")
+        converted = orders_db.POSTGRES.sql(orders_db.ORDER_QUERIES["list_orders"])
+        if prepared == "PREPARE get_order AS SELECT * FROM orders WHERE id = $1 AND username = $2" \
+                and "username = %s" in converted:
+            print("Postgres dialect: SUCCESS", flush=True)
+        else:
+            print(f"Postgres dialect: FAILED ({prepared} / {converted})", flush=True)
+    finally:
+        orders_db.get_orders_pool().close_all()
+        orders_db._pool = None
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_orders_pool()
+    except Exception as e:
+        print(f"Test crashed: {e}", flush=True)
@@ -0,0 +1,146 @@
+import os
+import sys
+import io
+import shutil
+import zipfile
+import datetime
+import tempfile
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.getcwd())
+
+import daily_update
+import backfill_history
+
+# Offline check of the raw file cache: a local HTTP stand-in serves the BSE ZIP
+# and the Samco bhavcopy page/CSV built from the files already in StockData/.
+
+SOURCE_DIR = "StockData"
+TEST_DATE = datetime.datetime(2026, 1, 2)
+
+requests_seen = []
+# Status the BSE ZIP of OTHER_DATE is answered with (no file, or a server error)
+OTHER_DATE = datetime.datetime(2026, 1, 5)
+other_date_status = [404]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        requests_seen.append(self.path)
+        name = os.path.basename(self.path)
+        if name == f"SCBSEALL{OTHER_DATE.strftime('%d%m')}.zip":
+            self.send_error(other_date_status[0])
+        elif name.endswith(".zip"):
+            txt_name = name.replace(".zip", ".TXT")
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w") as z:
+                z.write(os.path.join(SOURCE_DIR, txt_name), txt_name)
+            self._send(buffer.getvalue(), "application/zip")
+        elif name.endswith(".csv"):
+            with open(os.path.join(SOURCE_DIR, name), "rb") as f:
+                self._send(f.read(), "text/csv")
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        requests_seen.append(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        host = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+        csv_name = f"{TEST_DATE.strftime('%Y%m%d')}_BSE"
+        html = f'<html><body><a class="bhavcopy-table-body-link" href="{host}/csv/{csv_name}.csv">{csv_name}</a></body></html>'
+        self._send(html.encode(), "text/html")
+
+
+def test_raw_cache():
+    print("Testing raw file cache...", flush=True)
+    server = HTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{server.server_address[1]}"
+
+    work_dir = tempfile.mkdtemp(prefix="raw_cache_")
+    daily_update.STOCK_DATA_DIR = work_dir
+    daily_update.BSE_URL_TEMPLATE = host + "/BSEDATA/gross/{yyyy}/SCBSEALL{ddmm}.zip"
+    daily_update.SAMCO_URL = host + "/getBhavcopy"
+
+    try:
+        # 1. First run downloads (parsed in memory, archived in the background)
+        daily_update.process_date(TEST_DATE)
+        daily_update.wait_for_archives()
+        first = len(requests_seen)
+        entry = daily_update.get_raw_cache().entry(TEST_DATE)
+        if first == 3 and entry and entry.get("ingested"):
+            print(f"First run: SUCCESS ({first} requests, rows={entry['rows']})", flush=True)
+        else:
+            print(f"First run: FAILED (requests={first}, entry={entry})", flush=True)
+
+        # 2. Second run skips entirely
+        daily_update.process_date(TEST_DATE)
+        if len(requests_seen) == first:
+            print("Already ingested skip: SUCCESS", flush=True)
+        else:
+            print("Already ingested skip: FAILED", flush=True)
+
+        # 3. Reparse uses the cached files without any request
+        daily_update.process_date(TEST_DATE, reparse=True)
+        if len(requests_seen) == first:
+            print("Reparse from cache: SUCCESS", flush=True)
+        else:
+            print("Reparse from cache: FAILED", flush=True)
+
+        # 4. A cached file changed on disk is downloaded again
+        with open(os.path.join(work_dir, daily_update._samco_file_name(TEST_DATE)), "a") as f:
+            f.write("\n")
+        daily_update.process_date(TEST_DATE, reparse=True)
+        daily_update.wait_for_archives()
+        if len(requests_seen) == first * 2:
+            print("Checksum mismatch re-download: SUCCESS", flush=True)
+        else:
+            print(f"Checksum mismatch re-download: FAILED ({len(requests_seen) - first} new requests)", flush=True)
+
+        # 5. Streaming without archiving parses from memory and leaves no raw files behind
+        for name in os.listdir(work_dir):
+            if name.endswith((".TXT", ".csv")):
+                os.remove(os.path.join(work_dir, name))
+        daily_update.process_date(TEST_DATE, force=True, archive=False)
+        daily_update.wait_for_archives()
+        leftover = [n for n in os.listdir(work_dir) if n.endswith((".TXT", ".csv"))]
+        ingested = daily_update.get_raw_cache().is_ingested(TEST_DATE, daily_update.MERGE_VERSION)
+        if ingested and not leftover:
+            print("In-memory ingest without archive: SUCCESS", flush=True)
+        else:
+            print(f"In-memory ingest without archive: FAILED (ingested={ingested}, files={leftover})", flush=True)
+
+        # 6. A backfilled date only counts as unavailable when the source has no file (404);
+        # a server error leaves it pending for the next run
+        other_key = OTHER_DATE.strftime("%Y-%m-%d")
+        other_date_status[0] = 503
+        backfill_history.run_backfill(OTHER_DATE, OTHER_DATE, workers=1)
+        after_error = backfill_history.load_checkpoint()["unavailable"]
+        other_date_status[0] = 404
+        backfill_history.run_backfill(OTHER_DATE, OTHER_DATE, workers=1)
+        after_missing = backfill_history.load_checkpoint()["unavailable"]
+        if other_key not in after_error and other_key in after_missing:
+            print("Unavailable only on 404: SUCCESS", flush=True)
+        else:
+            print(f"Unavailable only on 404: FAILED (after 503 {after_error}, after 404 {after_missing})", flush=True)
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_raw_cache()
+    except Exception as e:
+        print(f"Test crashed: {e}", flush=True)
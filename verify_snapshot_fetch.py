@@ -0,0 +1,212 @@
+import io
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.getcwd())
+
+import database
+import daily_update
+import db_snapshots
+import stock_schema
+from synthetic_bhavcopy import SyntheticBhavcopy, trading_days_ending
+
+# Offline check of the snapshot publishing and fetching: a publisher StockData
+# dir is built from synthetic bhavcopies and served by a local HTTP stand-in
+# for GitHub (with Range support and an optional dropped first transfer).
+
+DAYS = trading_days_ending(daily_update.datetime.datetime(2026, 2, 13), 4)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    root = None
+    requests_seen = []
+    drop_next = set()
+
+    def do_GET(self):
+        name = self.path.lstrip("/")
+        path = os.path.join(self.root, name)
+        self.requests_seen.append((name, self.headers.get("Range")))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        body = data[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if name in self.drop_next:
+            # Simulate a dropped connection halfway through
+            self.drop_next.discard(name)
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def day_frame(generator, current):
+    _, bse_bytes, _, samco_bytes = generator.day_files(current)
+    return daily_update.parse_day_frame(io.BytesIO(bse_bytes), io.BytesIO(samco_bytes), current)
+
+
+def all_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT * FROM stocks ORDER BY Date, \"SCRIP CODE\"").fetchall()
+        version = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()[0]
+        return rows, version
+    finally:
+        conn.close()
+
+
+def fetch(base_url, db_path):
+    fetcher = db_snapshots.SnapshotFetcher(base_url, db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        mode = fetcher.sync()
+    return mode, fetcher.stats
+
+
+def test_snapshot_fetch():
+    print("Testing snapshot publish and fetch...", flush=True)
+    work_dir = tempfile.mkdtemp(prefix="snapshot_fetch_")
+    publish_dir = os.path.join(work_dir, "publisher")
+    snapshot_dir = os.path.join(publish_dir, db_snapshots.SNAPSHOT_DIRNAME)
+    os.makedirs(snapshot_dir)
+    db_path = os.path.join(publish_dir, daily_update.DB_FILENAME)
+    stale_path = os.path.join(work_dir, "stale.db")
+    generator = SyntheticBhavcopy(300)
+
+    StandInHandler.root = snapshot_dir
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    db_snapshots.RETRY_DELAY = 0
+    # Small chunks, so a dropped transfer leaves a part file to resume
+    db_snapshots.CHUNK_SIZE = 4096
+
+    try:
+        # Publisher: versions 1-2, full snapshot at 2, then one more day (3) and a prune (4)
+        with contextlib.redirect_stdout(io.StringIO()):
+            daily_update.STOCK_DATA_DIR = publish_dir
+            for current in DAYS[:2]:
+                daily_update.upsert_stock_rows(day_frame(generator, current), db_path)
+            daily_update.publish_stock_snapshot()
+            shutil.copy(db_path, stale_path)
+            daily_update.upsert_stock_rows(day_frame(generator, DAYS[2]), db_path)
+            daily_update.delete_stock_dates_before(db_path, DAYS[1].strftime("%Y-%m-%d"))
+        expected = all_rows(db_path)
+        manifest = db_snapshots.read_manifest(snapshot_dir)
+        snapshot_bytes = manifest["snapshot"]["bytes"]
+        delta_bytes = sum(d["bytes"] for d in manifest["deltas"][-2:])
+        print(f"Published: version {manifest['version']}, snapshot {snapshot_bytes} bytes "
+              f"(DB {os.path.getsize(db_path)}), last 2 deltas {delta_bytes} bytes", flush=True)
+        conn = sqlite3.connect(db_path)
+        kept, counted = stock_schema.get_bars_total(conn), stock_schema.bar_count(conn)
+        conn.close()
+        if kept == counted == manifest["deltas"][-1]["bars_total"]:
+            print(f"Kept bar total: SUCCESS ({kept} bars, no full count per write)", flush=True)
+        else:
+            print(f"Kept bar total: FAILED (meta {kept}, counted {counted})", flush=True)
+
+        # 1. Cold instance: full snapshot (first transfer dropped, then resumed) plus deltas 3-4
+        cold_path = os.path.join(work_dir, "cold", "stock_data.db")
+        os.makedirs(os.path.dirname(cold_path))
+        StandInHandler.drop_next.add(db_snapshots.SNAPSHOT_FILENAME)
+        mode, stats = fetch(base_url, cold_path)
+        if mode == "full" and stats["resumed"] == 1 and all_rows(cold_path) == expected:
+            print(f"Cold start (full + deltas, resumed): SUCCESS ({stats['bytes']} bytes)", flush=True)
+        else:
+            print(f"Cold start (full + deltas, resumed): FAILED (mode={mode}, stats={stats})", flush=True)
+
+        # 2. Instance two versions behind: only the two deltas
+        StandInHandler.requests_seen.clear()
+        mode, stats = fetch(base_url, stale_path)
+        fetched = {name for name, _ in StandInHandler.requests_seen}
+        if mode == "delta" and db_snapshots.SNAPSHOT_FILENAME not in fetched and stats["bytes"] < snapshot_bytes \
+                and all_rows(stale_path) == expected:
+            print(f"Stale instance (deltas only): SUCCESS ({stats['bytes']} bytes, {sorted(fetched)})", flush=True)
+        else:
+            print(f"Stale instance (deltas only): FAILED (mode={mode}, stats={stats}, fetched={fetched})", flush=True)
+
+        mode, _ = fetch(base_url, stale_path)
+        print(f"Up to date instance: {'SUCCESS' if mode == 'current' else 'FAILED'} (mode={mode})", flush=True)
+
+        # 3. Concurrent fetchers of one DB (one per gunicorn worker) download it once
+        workers_path = os.path.join(work_dir, "workers", "stock_data.db")
+        os.makedirs(os.path.dirname(workers_path))
+        StandInHandler.requests_seen.clear()
+        modes = []
+        threads = [threading.Thread(target=lambda: modes.append(
+            db_snapshots.SnapshotFetcher(base_url, workers_path).sync())) for _ in range(4)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        downloads = [name for name, _ in StandInHandler.requests_seen if name == db_snapshots.SNAPSHOT_FILENAME]
+        if sorted(modes) == ["current"] * 3 + ["full"] and len(downloads) == 1 and all_rows(workers_path) == expected:
+            print("Concurrent fetchers: SUCCESS (one download, the others found it current)", flush=True)
+        else:
+            print(f"Concurrent fetchers: FAILED (modes={modes}, downloads={len(downloads)})", flush=True)
+
+        # 4. A corrupted delta fails its checksum and falls back to the full snapshot
+        behind_path = os.path.join(work_dir, "behind.db")
+        shutil.copy(os.path.join(work_dir, "cold", "stock_data.db"), behind_path)
+        conn = sqlite3.connect(behind_path)
+        conn.execute("UPDATE meta SET value = 2 WHERE key = 'data_version'")
+        conn.commit()
+        conn.close()
+        delta_path = os.path.join(snapshot_dir, manifest["deltas"][-1]["name"])
+        with open(delta_path, "r+b") as f:
+            f.seek(20)
+            f.write(b"\x00\x00\x00")
+        mode, stats = fetch(base_url, behind_path)
+        good_version = manifest["deltas"][-1]["from_version"]
+        if stats["checksum_errors"] and mode == "full" and all_rows(behind_path)[1] == good_version:
+            print(f"Checksum failure: SUCCESS (fell back to the snapshot, stopped at version {good_version})",
+                  flush=True)
+        else:
+            print(f"Checksum failure: FAILED (mode={mode}, stats={stats})", flush=True)
+
+        # 5. Requests wait for the background fetch instead of downloading themselves
+        database.DB_PATH = os.path.join(work_dir, "app", "StockData", "stock_data.db")
+        database.SNAPSHOT_URL = base_url
+        with contextlib.redirect_stdout(io.StringIO()):
+            conn = database.get_stock_db_connection()
+        bars = conn.execute("SELECT COUNT(*) FROM daily_bars").fetchone()[0] if conn else None
+        fetch_stats = database.get_stock_db_stats()["fetch"]
+        if conn is not None and bars and fetch_stats["state"] == "ready":
+            print(f"Request waits for startup fetch: SUCCESS ({bars} bars, {fetch_stats['seconds']}s)", flush=True)
+        else:
+            print(f"Request waits for startup fetch: FAILED ({fetch_stats})", flush=True)
+    finally:
+        server.shutdown()
+        conn = getattr(database._stock_local, "conn", None)
+        if conn is not None:
+            conn.close_for_real()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_snapshot_fetch()
+    except Exception as e:
+        print(f"Test crashed: {e}", flush=True)
@@ -0,0 +1,142 @@
+import io
+import os
+import sys
+import contextlib
+import shutil
+import sqlite3
+import tempfile
+import threading
+sys.path.append(os.getcwd())
+
+import database
+import daily_update
+import db_snapshots
+import stock_schema
+
+# Offline check of the pooled read-only stock DB connections: a small DB is
+# built in a temp dir and database.DB_PATH is pointed at it.
+
+
+def build_db(path):
+    conn = sqlite3.connect(path)
+    stock_schema.ensure_schema(conn)
+    conn.execute("INSERT INTO securities (code, name, sc_group, sc_type, last_date) VALUES (500002, 'ABB', 'A', 'STK', 20260102)")
+    conn.execute("INSERT INTO daily_bars (code, date, close) VALUES (500002, 20260101, 10.0), (500002, 20260102, 11.0)")
+    conn.commit()
+    conn.close()
+
+
+def test_pool():
+    print("Testing stock DB connection pool...", flush=True)
+    work_dir = tempfile.mkdtemp(prefix="stock_db_pool_")
+    database.DB_PATH = os.path.join(work_dir, "stock_data.db")
+    build_db(database.DB_PATH)
+
+    try:
+        # 1. Repeated open/close on one thread reuses the connection
+        before = database.get_stock_db_stats()
+        for _ in range(20):
+            conn = database.get_stock_db_connection()
+            conn.execute("SELECT close FROM daily_bars WHERE code = ?", (500002,)).fetchall()
+            conn.close()
+        stats = database.get_stock_db_stats()
+        opened = stats["opened"] - before["opened"]
+        reused = stats["reused"] - before["reused"]
+        if opened == 1 and reused == 19:
+            print(f"Reuse on one thread: SUCCESS (opened={opened}, reused={reused})", flush=True)
+        else:
+            print(f"Reuse on one thread: FAILED (opened={opened}, reused={reused})", flush=True)
+
+        # 2. Read-only: writes are rejected
+        conn = database.get_stock_db_connection()
+        try:
+            conn.execute("DELETE FROM daily_bars")
+            print("Read-only connection: FAILED (write accepted)", flush=True)
+        except sqlite3.Error as e:
+            print(f"Read-only connection: SUCCESS ({e})", flush=True)
+        pragmas = {p: conn.execute(f"PRAGMA {p}").fetchone()[0] for p in ("query_only", "cache_size", "mmap_size")}
+        print(f"Pragmas: {pragmas}", flush=True)
+
+        # 3. Each thread gets its own connection
+        seen = []
+
+        def worker():
+            c = database.get_stock_db_connection()
+            seen.append(id(c))
+            c.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if len(set(seen)) == 3 and id(conn) not in seen:
+            print("Per-thread connections: SUCCESS", flush=True)
+        else:
+            print("Per-thread connections: FAILED", flush=True)
+
+        # 4. reload_stock_db() and a replaced file both reopen the connection
+        database.reload_stock_db()
+        reopened = database.get_stock_db_connection()
+        replacement = database.DB_PATH + ".new"
+        build_db(replacement)
+        sqlite3.connect(replacement).execute("UPDATE daily_bars SET close = 99").connection.commit()
+        os.replace(replacement, database.DB_PATH)
+        swapped = database.get_stock_db_connection()
+        close = swapped.execute("SELECT MAX(close) FROM daily_bars").fetchone()[0]
+        if reopened is not conn and swapped is not reopened and close == 99:
+            print(f"Reload and file swap: SUCCESS (reloads={database.get_stock_db_stats()['reloads']})", flush=True)
+        else:
+            print(f"Reload and file swap: FAILED (close={close})", flush=True)
+
+        # 5. A version written in place by ingestion is picked up by a running reader
+        version = database.get_data_version()
+        inode = os.stat(database.DB_PATH).st_ino
+        with contextlib.redirect_stdout(io.StringIO()):
+            deleted = daily_update.delete_stock_dates_before(database.DB_PATH, "2026-01-02")
+        conn = database.get_stock_db_connection()
+        bars = conn.execute("SELECT COUNT(*) FROM daily_bars").fetchone()[0]
+        conn.close()
+        new_version = database.get_data_version()
+        in_place = os.stat(database.DB_PATH).st_ino == inode
+        if deleted == 1 and bars == 1 and new_version == version + 1 and in_place:
+            print(f"In-place write: SUCCESS (data version {version} -> {new_version})", flush=True)
+        else:
+            print(f"In-place write: FAILED (deleted={deleted}, bars={bars}, versions={version}/{new_version}, "
+                  f"in place={in_place})", flush=True)
+
+        # 6. A DB of an older schema is refused, not migrated in place by the worker;
+        #    the writers' migrate_file swaps in a migrated copy
+        legacy = database.DB_PATH + ".legacy"
+        conn = sqlite3.connect(legacy)
+        conn.execute('CREATE TABLE stocks ("SCRIP CODE" INTEGER, SC_NAME TEXT, Date TEXT, CLOSE REAL)')
+        conn.execute("INSERT INTO stocks VALUES (500002, 'ABB', '2026-01-02', 12.0)")
+        conn.commit()
+        conn.close()
+        os.replace(legacy, database.DB_PATH)
+        with open(database.DB_PATH, "rb") as f:
+            before = f.read()
+        refused = database.get_stock_db_connection()
+        with open(database.DB_PATH, "rb") as f:
+            untouched = f.read() == before
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrated = db_snapshots.migrate_file(database.DB_PATH)
+        conn = database.get_stock_db_connection()
+        close = conn.execute("SELECT close FROM daily_bars").fetchone()[0] if conn is not None else None
+        if refused is None and untouched and migrated and close == 12.0:
+            print("Old schema refused, migrated on a copy: SUCCESS", flush=True)
+        else:
+            print(f"Old schema refused, migrated on a copy: FAILED (refused={refused is None}, "
+                  f"untouched={untouched}, migrated={migrated}, close={close})", flush=True)
+    finally:
+        conn = getattr(database._stock_local, "conn", None)
+        if conn is not None:
+            conn.close_for_real()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_pool()
+    except Exception as e:
+        print(f"Test crashed: {e}", flush=True)
@@ -0,0 +1,99 @@
+import io
+import os
+import sys
+import contextlib
+import shutil
+import tempfile
+sys.path.append(os.getcwd())
+
+import database
+import daily_update
+import strategy_cache
+from verify_stock_db_pool import build_db
+
+# Offline check of the strategy result cache against a small temp stock DB,
+# with a counting stand-in for the strategy.
+
+
+class CountingStrategy:
+    def __init__(self):
+        self.runs = 0
+
+    def __call__(self):
+        self.runs += 1
+        return [{'SC_CODE': 500002, 'run': self.runs, 'Volumes': list(range(100))}]
+
+
+def reset_memory():
+    """Empties this process's tier only, like a fresh gunicorn worker."""
+    with strategy_cache._lock:
+        strategy_cache._memory.clear()
+        strategy_cache._memory_bytes = 0
+        strategy_cache._version = None
+
+
+def test_strategy_cache():
+    print("Testing strategy result cache...", flush=True)
+    work_dir = tempfile.mkdtemp(prefix="strategy_cache_")
+    database.DB_PATH = os.path.join(work_dir, "stock_data.db")
+    strategy_cache.STRATEGY_CACHE_DB = os.path.join(work_dir, "strategy_cache.db")
+    build_db(database.DB_PATH)
+    strategy = CountingStrategy()
+
+    try:
+        # 1. Same strategy and params (5 and 5.0 alike) run once
+        results = [strategy_cache.cached_strategy('min_increase', {'days': days}, strategy) for days in (5, 5.0, 5)]
+        stats = strategy_cache.get_strategy_cache_stats()
+        if strategy.runs == 1 and results[0] is results[2] and stats["hits"] == 2:
+            print(f"Hits for the same params: SUCCESS ({stats['hits']} hits, 1 run)", flush=True)
+        else:
+            print(f"Hits for the same params: FAILED (runs={strategy.runs}, stats={stats})", flush=True)
+
+        strategy_cache.cached_strategy('min_increase', {'days': 6}, strategy)
+        print(f"Other params: {'SUCCESS' if strategy.runs == 2 else 'FAILED'} (runs={strategy.runs})", flush=True)
+
+        # 2. Another worker finds the results in the shared tier
+        reset_memory()
+        result = strategy_cache.cached_strategy('min_increase', {'days': 5}, strategy)
+        stats = strategy_cache.get_strategy_cache_stats()
+        if strategy.runs == 2 and result[0]['run'] == 1 and stats["disk_hits"] == 1:
+            print("Shared disk tier: SUCCESS", flush=True)
+        else:
+            print(f"Shared disk tier: FAILED (runs={strategy.runs}, stats={stats})", flush=True)
+
+        # 3. New data invalidates both tiers
+        with contextlib.redirect_stdout(io.StringIO()):
+            daily_update.delete_stock_dates_before(database.DB_PATH, "2026-01-02")
+        result = strategy_cache.cached_strategy('min_increase', {'days': 5}, strategy)
+        stats = strategy_cache.get_strategy_cache_stats()
+        if strategy.runs == 3 and result[0]['run'] == 3 and stats["invalidations"] == 1:
+            print(f"Invalidated by new data: SUCCESS (data version {stats['data_version']})", flush=True)
+        else:
+            print(f"Invalidated by new data: FAILED (runs={strategy.runs}, stats={stats})", flush=True)
+
+        # 4. The memory tier stays within its byte budget, least recently used out first
+        strategy_cache.STRATEGY_CACHE_DB = ''
+        reset_memory()
+        size = len(strategy_cache.pickle.dumps(strategy(), protocol=strategy_cache.pickle.HIGHEST_PROTOCOL))
+        strategy_cache.STRATEGY_CACHE_BYTES = size * 3
+        before = strategy_cache.get_strategy_cache_stats()["evictions"]
+        for days in (1, 2, 3, 1, 4):
+            strategy_cache.cached_strategy('min_increase', {'days': days}, strategy)
+        stats = strategy_cache.get_strategy_cache_stats()
+        kept = sorted(dict(key[1])['days'] for key in strategy_cache._memory)
+        if stats["evictions"] - before == 1 and kept == [1.0, 3.0, 4.0] and stats["bytes"] <= size * 3:
+            print(f"LRU eviction: SUCCESS (kept days {kept}, {stats['bytes']} bytes)", flush=True)
+        else:
+            print(f"LRU eviction: FAILED (kept={kept}, stats={stats})", flush=True)
+    finally:
+        conn = getattr(database._stock_local, "conn", None)
+        if conn is not None:
+            conn.close_for_real()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_strategy_cache()
+    except Exception as e:
+        print(f"Test crashed: {e}", flush=True)
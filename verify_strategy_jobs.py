@@ -0,0 +1,142 @@
+import io
+import os
+import sys
+import contextlib
+import shutil
+import tempfile
+import threading
+import time
+sys.path.append(os.getcwd())
+
+import database
+import strategy_cache
+import strategy_jobs
+from verify_stock_db_pool import build_db
+
+# Offline check of the background strategy jobs, with stand-in strategies
+# that block until released.
+
+
+class BlockingStrategy:
+    def __init__(self, fail=False):
+        self.release = threading.Event()
+        self.runs = 0
+        self.fail = fail
+
+    def __call__(self):
+        self.runs += 1
+        self.release.wait(10)
+        if self.fail:
+            raise ValueError("bad data")
+        return [{'SC_CODE': 500002}]
+
+
+def wait_for(job, timeout=10):
+    deadline = time.time() + timeout
+    while job.active and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_strategy_jobs():
+    print("Testing background strategy jobs...", flush=True)
+    work_dir = tempfile.mkdtemp(prefix="strategy_jobs_")
+    database.DB_PATH = os.path.join(work_dir, "stock_data.db")
+    strategy_cache.STRATEGY_CACHE_DB = os.path.join(work_dir, "strategy_cache.db")
+    strategy_jobs.STRATEGY_JOB_QUEUE = 3
+    build_db(database.DB_PATH)
+    strategies = []
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            # 1. Identical concurrent submissions share one job and one run
+            slow = BlockingStrategy()
+            strategies.append(slow)
+            jobs = []
+            threads = [threading.Thread(target=lambda: jobs.append(
+                strategy_jobs.submit('double_bottom', {'min_days': 10}, slow))) for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            queued_state = jobs[0].state
+            slow.release.set()
+            wait_for(jobs[0])
+        if len({job.id for job in jobs}) == 1 and slow.runs == 1 and jobs[0].state == strategy_jobs.DONE \
+                and queued_state in (strategy_jobs.QUEUED, strategy_jobs.RUNNING):
+            info = jobs[0].to_dict()
+            print(f"Deduplicated submissions: SUCCESS (1 run, queued {info['queue_seconds']}s, "
+                  f"ran {info['run_seconds']}s)", flush=True)
+        else:
+            print(f"Deduplicated submissions: FAILED (ids={[job.id for job in jobs]}, runs={slow.runs})", flush=True)
+
+        # 2. A finished run is also in the cache for the other workers
+        cached = strategy_cache.lookup('double_bottom', {'min_days': 10})
+        print(f"Result cached: {'SUCCESS' if cached == jobs[0].result else 'FAILED'}", flush=True)
+
+        # 3. The queue is bounded
+        with contextlib.redirect_stdout(io.StringIO()):
+            blocked = BlockingStrategy()
+            strategies.append(blocked)
+            running = [strategy_jobs.submit('min_increase', {'days': days}, blocked) for days in (1, 2, 3)]
+            try:
+                strategy_jobs.submit('min_increase', {'days': 4}, blocked)
+                rejected = False
+            except strategy_jobs.JobQueueFull:
+                rejected = True
+            blocked.release.set()
+            for job in running:
+                wait_for(job)
+        stats = strategy_jobs.get_strategy_job_stats()
+        print(f"Bounded queue: {'SUCCESS' if rejected and stats['rejected'] == 1 else 'FAILED'} ({stats})", flush=True)
+
+        # 4. A failing strategy marks its job failed; polling gets the failure,
+        # only an explicit retry runs it again
+        with contextlib.redirect_stdout(io.StringIO()):
+            broken = BlockingStrategy(fail=True)
+            strategies.append(broken)
+            broken.release.set()
+            job = wait_for(strategy_jobs.submit('bullish_reversal', {}, broken))
+            polled = [strategy_jobs.submit('bullish_reversal', {}, broken) for _ in range(5)]
+            runs_polled = broken.runs
+            retried = wait_for(strategy_jobs.submit('bullish_reversal', {}, broken, retry=True))
+        if job.state == strategy_jobs.FAILED and job.error == "bad data" and runs_polled == 1 \
+                and all(p is job for p in polled) and retried.state == strategy_jobs.FAILED and broken.runs == 2:
+            print("Failed job: SUCCESS (error kept, polling does not re-run, retry does)", flush=True)
+        else:
+            print(f"Failed job: FAILED ({job.to_dict()}, runs={broken.runs})", flush=True)
+
+        # 5. A run claimed by another worker process is not started here
+        version = database.get_data_version()
+        other = "otherhost:1"
+        with contextlib.redirect_stdout(io.StringIO()):
+            elsewhere = BlockingStrategy()
+            strategies.append(elsewhere)
+            elsewhere.release.set()
+            strategy_cache.claim_run('min_increase', {'days': 9}, version, other)
+            waiting = strategy_jobs.submit('min_increase', {'days': 9}, elsewhere)
+            strategy_cache.finish_run('min_increase', {'days': 9}, version, other, "other worker failed")
+            failed_there = strategy_jobs.submit('min_increase', {'days': 9}, elsewhere)
+            runs_before_retry = elsewhere.runs
+            retried = wait_for(strategy_jobs.submit('min_increase', {'days': 9}, elsewhere, retry=True))
+        if waiting.elsewhere and waiting.state == strategy_jobs.RUNNING and failed_there.state == strategy_jobs.FAILED \
+                and failed_there.error == "other worker failed" and runs_before_retry == 0 \
+                and retried.state == strategy_jobs.DONE and elsewhere.runs == 1:
+            print("Shared in-flight marker: SUCCESS (other worker's run awaited, its failure reported)", flush=True)
+        else:
+            print(f"Shared in-flight marker: FAILED ({waiting.to_dict()}, {failed_there.to_dict()}, "
+                  f"runs={elsewhere.runs})", flush=True)
+    finally:
+        for strategy in strategies:
+            strategy.release.set()
+        conn = getattr(database._stock_local, "conn", None)
+        if conn is not None:
+            conn.close_for_real()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_strategy_jobs()
+    except Exception as e:
+        print(f"Test crashed: {e}", flush=True)
@@ -0,0 +1,104 @@
+import io
+import os
+import sys
+import contextlib
+import shutil
+import tempfile
+sys.path.append(os.getcwd())
+
+import database
+import daily_update
+from strategies import panel as market_panel
+from strategies import registry
+from strategies.registry import Param, register, get_strategies, run_strategies
+from synthetic_bhavcopy import SyntheticBhavcopy, trading_days_ending
+
+# Offline check of the strategy registry: param schemas, one panel load for
+# several strategies, and a screener plugged in at runtime. The stock DB is
+# built from synthetic bhavcopies in a temp dir.
+
+DAYS = trading_days_ending(daily_update.datetime.datetime(2026, 2, 13), 35)
+ARGS = {'lookback': '30', 'min_days': '5', 'max_days': '10', 'days': '2'}
+
+
+def day_frame(generator, current):
+    _, bse_bytes, _, samco_bytes = generator.day_files(current)
+    return daily_update.parse_day_frame(io.BytesIO(bse_bytes), io.BytesIO(samco_bytes), current)
+
+
+def test_param_schema():
+    print("Testing strategy param schemas...", flush=True)
+    days = Param('days', int, 5, 2, 10)
+    tolerance = Param('tolerance_pct', float, 3.0, 0.1, 10, arg='tolerance')
+    parsed = [days.parse(raw) for raw in ('7', '5.5', 'abc', '', None, '1000', 'nan')]
+    parsed += [tolerance.parse(raw) for raw in ('2.5', '4', '0')]
+    expected = [7, 5, 5, 5, 5, 10, 5, 2.5, 4.0, 0.1]
+    if parsed == expected and [type(value) for value in parsed] == [int] * 7 + [float] * 3:
+        print("Parse and bounds: SUCCESS", flush=True)
+    else:
+        print(f"Parse and bounds: FAILED ({parsed} != {expected})", flush=True)
+
+
+def test_registry():
+    print("Testing strategy registry...", flush=True)
+    work_dir = tempfile.mkdtemp(prefix="strategy_registry_")
+    database.DB_PATH = os.path.join(work_dir, "stock_data.db")
+    generator = SyntheticBhavcopy(200)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for current in DAYS:
+                daily_update.upsert_stock_rows(day_frame(generator, current), database.DB_PATH)
+
+        # 1. Every strategy on one panel load, same results as each run alone
+        strategies = get_strategies()
+        runs = [(strategy, strategy.parse_params(ARGS)) for strategy in strategies.values()]
+        market_panel.clear_panel()
+        before = market_panel.get_panel_stats()
+        with contextlib.redirect_stdout(io.StringIO()):
+            together = run_strategies(runs)
+        stats = market_panel.get_panel_stats()
+        alone = {strategy.name: strategy.run(params) for strategy, params in runs}
+        loads = stats["full_loads"] - before["full_loads"] + stats["refreshes"] - before["refreshes"]
+        if loads == 1 and together == alone and set(together) >= {'min_increase', 'bullish_reversal', 'double_bottom'}:
+            print(f"One pass: SUCCESS ({', '.join(f'{name} {len(found)}' for name, found in together.items())})", flush=True)
+        else:
+            print(f"One pass: FAILED (loads={loads}, same={together == alone}, strategies={list(together)})", flush=True)
+
+        # 2. A screener plugged in at runtime runs with the others
+        @register('close_above', 'Close Above', columns=('close',), lookback=1,
+                  params=[Param('min_close', float, 100.0, 0, None, arg='min_close')])
+        def find_close_above(panel, min_close=100.0):
+            close = panel['close'][-1]
+            return [{'SC_CODE': code, 'SC_NAME': panel.names[col]}
+                    for col, code in enumerate(panel.codes.tolist()) if close[col] > min_close]
+
+        try:
+            strategy = get_strategies()['close_above']
+            params = strategy.parse_params({'min_close': '500'})
+            results = run_strategies(runs + [(strategy, params)])
+            try:
+                register('all', 'All', columns=(), lookback=1)(find_close_above)
+                reserved = False
+            except ValueError:
+                reserved = True
+            if results['close_above'] and all(results[name] == together[name] for name in together) and reserved:
+                print(f"Plugin: SUCCESS ({len(results['close_above'])} closes above 500)", flush=True)
+            else:
+                print(f"Plugin: FAILED (found {len(results['close_above'])}, reserved name refused: {reserved})", flush=True)
+        finally:
+            registry.STRATEGIES.pop('close_above', None)
+    finally:
+        market_panel.clear_panel()
+        conn = getattr(database._stock_local, "conn", None)
+        if conn is not None:
+            conn.close_for_real()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_param_schema()
+        test_registry()
+    except Exception as e:
+        print(f"Test crashed: {e}", flush=True)